@@ -0,0 +1,88 @@
+import string
+from functools import lru_cache
+
+# Canonical geocode cache keys. Two spellings of one address should share a
+# key so the second costs a cache hit rather than a paid lookup: case,
+# punctuation and spacing are dropped, common abbreviations are expanded,
+# the PIN code is moved to the end and repeated segments (e.g. a city the
+# address already names, appended again by centre_address) are kept once.
+# The key is only used for caching; the geocoder still sees the address as
+# written.
+
+# Segment separators become commas, every other punctuation mark a space;
+# the rest of the work is done on whitespace-split tokens.
+_PUNCT = str.maketrans({c: "," if c in ";|\n" else " " for c in string.punctuation.replace(",", "") + "\n"})
+
+ABBREVIATIONS = {
+    "rd": "road",
+    "st": "street",
+    "ln": "lane",
+    "nr": "near",
+    "opp": "opposite",
+    "bldg": "building",
+    "apt": "apartment",
+    "apts": "apartments",
+    "hsg": "housing",
+    "soc": "society",
+    "ngr": "nagar",
+    "mkt": "market",
+    "sec": "sector",
+    "sect": "sector",
+    "hwy": "highway",
+    "stn": "station",
+    "rly": "railway",
+    "hosp": "hospital",
+    "govt": "government",
+    "sch": "school",
+    "clg": "college",
+    "univ": "university",
+    "jn": "junction",
+    "dist": "district",
+    "distt": "district",
+    "tq": "taluk",
+    "tal": "taluk",
+    "po": "post office",
+}
+# Words that carry no location: "near" mirrors simplify_address, the rest
+# label the PIN code or the country every address shares.
+DROP = frozenset({"near", "pin", "pincode", "code", "india"})
+
+
+@lru_cache(maxsize=65536)
+def canonical_key(address):
+    # Returns "" for blank input.
+    segments = []
+    seen = set()
+    pin = None
+    for raw in (address or "").lower().translate(_PUNCT).split(","):
+        words = []
+        initials = False
+        for w in raw.split():
+            if w.isdigit():
+                # PIN codes: "411001" or "411 001", wherever they appear.
+                if len(w) == 6:
+                    pin = w
+                    continue
+                if len(w) == 3 and words and len(words[-1]) == 3 and words[-1].isdigit():
+                    pin = words.pop() + w
+                    continue
+            elif len(w) == 1 and initials:
+                # Dotted initials ("m.g.", "m. g.") rejoin as one word ("mg").
+                words[-1] += w
+                continue
+            initials = len(w) == 1 and w.isalpha()
+            w = ABBREVIATIONS.get(w, w)
+            if w not in DROP:
+                words.append(w)
+            else:
+                initials = False
+        segment = " ".join(words)
+        if segment and segment not in seen:
+            seen.add(segment)
+            segments.append(segment)
+    # Comma placement varies too much to keep; segments only matter for
+    # spotting repeats.
+    key = " ".join(segments)
+    if pin:
+        key += f" {pin}"
+    return key
@@ -1,72 +1,205 @@
-import requests
+import os
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain
+from urllib.parse import urlencode
+import http_client
+import instrument
 from models import Centre
 
-def fetch_centres(state_id, district_id, city_name, start=0, length=100):
-    url = "https://iapt.manageexam.com/Centre/Centre/GetCompletedCentres"
+BASE_URL = os.getenv("IAPT_BASE_URL", "https://iapt.manageexam.com")
+PAGE_SIZE = int(os.getenv("IAPT_PAGE_SIZE", "100"))
+PAGE_WORKERS = int(os.getenv("IAPT_PAGE_WORKERS", "4"))
+
+
+class CentreFetchError(Exception):
+    pass
+
+
+# The DataTables column/order/search parameters never change, so they are
+# encoded once and reused for every request.
+DATATABLES_QUERY = urlencode({
+    "columns[0][data]": "Code",
+    "columns[0][name]": "",
+    "columns[0][searchable]": "true",
+    "columns[0][orderable]": "true",
+    "columns[0][search][value]": "",
+    "columns[0][search][regex]": "false",
+    "columns[1][data]": "Name",
+    "columns[1][name]": "",
+    "columns[1][searchable]": "true",
+    "columns[1][orderable]": "true",
+    "columns[1][search][value]": "",
+    "columns[1][search][regex]": "false",
+    "columns[2][data]": "Address",
+    "columns[2][name]": "",
+    "columns[2][searchable]": "true",
+    "columns[2][orderable]": "true",
+    "columns[2][search][value]": "",
+    "columns[2][search][regex]": "false",
+    "columns[3][data]": "CoordinatorName",
+    "columns[3][name]": "",
+    "columns[3][searchable]": "true",
+    "columns[3][orderable]": "true",
+    "columns[3][search][value]": "",
+    "columns[3][search][regex]": "false",
+    "columns[4][data]": "Subject",
+    "columns[4][name]": "",
+    "columns[4][searchable]": "false",
+    "columns[4][orderable]": "true",
+    "columns[4][search][value]": "",
+    "columns[4][search][regex]": "false",
+    "order[0][column]": 0,
+    "order[0][dir]": "asc",
+    "search[value]": "",
+    "search[regex]": "false",
+})
+
+HEADERS = {
+    "User-Agent": "IAPT-Centre-Finder/1.0",
+    "Accept": "*/*",
+    "Content-Type": "application/json"
+}
+
+
+def _request_page(state_id, district_id, city_name, start=0, length=100, draw=1, headers=HEADERS):
+    # Returns the raw response: 200, or 304 for a conditional request.
+    import requests  # already loaded by http_client; kept out of module import
+    url = f"{BASE_URL}/Centre/Centre/GetCompletedCentres"
 
     params = {
         "StateId": state_id,
         "DistrictId": district_id,
         "CityId": city_name,
-        "draw": 1,
+        "draw": draw,
         "start": start,
         "length": length,
-        "columns[0][data]": "Code",
-        "columns[0][name]": "",
-        "columns[0][searchable]": "true",
-        "columns[0][orderable]": "true",
-        "columns[0][search][value]": "",
-        "columns[0][search][regex]": "false",
-        "columns[1][data]": "Name",
-        "columns[1][name]": "",
-        "columns[1][searchable]": "true",
-        "columns[1][orderable]": "true",
-        "columns[1][search][value]": "",
-        "columns[1][search][regex]": "false",
-        "columns[2][data]": "Address",
-        "columns[2][name]": "",
-        "columns[2][searchable]": "true",
-        "columns[2][orderable]": "true",
-        "columns[2][search][value]": "",
-        "columns[2][search][regex]": "false",
-        "columns[3][data]": "CoordinatorName",
-        "columns[3][name]": "",
-        "columns[3][searchable]": "true",
-        "columns[3][orderable]": "true",
-        "columns[3][search][value]": "",
-        "columns[3][search][regex]": "false",
-        "columns[4][data]": "Subject",
-        "columns[4][name]": "",
-        "columns[4][searchable]": "false",
-        "columns[4][orderable]": "true",
-        "columns[4][search][value]": "",
-        "columns[4][search][regex]": "false",
-        "order[0][column]": 0,
-        "order[0][dir]": "asc",
-        "search[value]": "",
-        "search[regex]": "false",
     }
 
-    headers = {
-        "User-Agent": "IAPT-Centre-Finder/1.0",
-        "Accept": "*/*",
-        "Content-Type": "application/json"
-    }
+    try:
+        response = http_client.get(url, params=params, headers=headers, query=DATATABLES_QUERY)
+    except requests.RequestException as e:
+        raise CentreFetchError(f"Failed to fetch centres: {e}") from e
+    if response.status_code not in (200, 304):
+        raise CentreFetchError(f"Failed to fetch centres (HTTP {response.status_code}). Response:\n{response.text}")
+    return response
+
+
+def request_centres(state_id, district_id, city_name, start=0, length=100, draw=1):
+    return _request_page(state_id, district_id, city_name, start, length, draw).json()
+
+
+def parse_centres(data):
+    return _parse_rows(data.get("data", []))
+
+
+def _parse_rows(rows):
+    centres = []
+    for c in rows:
+        centre = Centre(
+            code=c.get("Code"),
+            name=c.get("Name"),
+            address=c.get("Address"),
+            coordinator_name=c.get("CoordinatorName"),
+            subject=c.get("Subject")
+        )
+        centres.append(centre)
+    return centres
+
+
+def _request_rows(state_id, district_id, city_name, start, end, length, draw, throttle=None):
+    # Rows [start, end), one request at a time, advancing by the rows each
+    # response actually holds.
+    while start < end:
+        if throttle:
+            throttle()
+        rows = request_centres(state_id, district_id, city_name, start, min(length, end - start), draw)
+        rows = rows.get("data", [])[:end - start]
+        if not rows:
+            return
+        start += len(rows)
+        yield rows
+
+
+def iter_centres(state_id, district_id, city_name, page_size=PAGE_SIZE, workers=PAGE_WORKERS, first=None,
+                 throttle=None, progress=None):
+    # Yields every Centre for the city, page by page. The first page tells us
+    # recordsFiltered/recordsTotal; the remaining pages are requested in
+    # parallel before the first one is yielded, and yielded in order as soon
+    # as each one is ready. `first` is an already fetched first page.
+    # `throttle()` is called before every request (e.g. a rate limiter's
+    # acquire) and `progress(received, total)` after every page.
+    if first is None:
+        if throttle:
+            throttle()
+        first = request_centres(state_id, district_id, city_name, 0, page_size, draw=1)
+    rows = first.get("data", [])
+    total = first.get("recordsFiltered", first.get("recordsTotal"))
+    total = len(rows) if total is None else int(total)
+    # A server that caps `length` sends fewer rows than asked for; that
+    # count is then the page size for the rest of the city.
+    step = min(page_size, len(rows))
+    starts = range(len(rows), total, step) if step else range(0)
+
+    def requested(start, length, draw):
+        if throttle:
+            throttle()
+        return request_centres(state_id, district_id, city_name, start, length, draw)
+
+    received = len(rows)
+    if progress:
+        progress(received, total)
+    if not starts:
+        yield from _parse_rows(rows)
+        return
+
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(starts)))) as pool:
+        pages = [
+            (start, pool.submit(requested, start, step, draw))
+            for draw, start in enumerate(starts, start=2)
+        ]
+        try:
+            yield from _parse_rows(rows)
+            draw = len(starts) + 2
+            for start, page in pages:
+                rows = page.result().get("data", [])[:step]
+                end = min(start + step, total)
+                # A short page (a tighter cap, or rows removed meanwhile):
+                # fetch what it left out before moving on.
+                more = _request_rows(state_id, district_id, city_name, start + len(rows), end, step, draw, throttle)
+                for rows in chain((rows,), more):
+                    received += len(rows)
+                    yield from _parse_rows(rows)
+                if progress:
+                    progress(received, total)
+        finally:
+            for _start, page in pages:
+                page.cancel()
+
+
+def fetch_if_changed(state_id, district_id, city_name, etag=None, last_modified=None, page_size=PAGE_SIZE,
+                     workers=PAGE_WORKERS, progress=None):
+    # Conditional fetch keyed on the first page's validators. Returns
+    # (centres, etag, last_modified), with centres None when the server
+    # answered 304 Not Modified. Servers without ETag/Last-Modified support
+    # simply always return the full list.
+    headers = dict(HEADERS)
+    if etag:
+        headers["If-None-Match"] = etag
+    if last_modified:
+        headers["If-Modified-Since"] = last_modified
+    response = _request_page(state_id, district_id, city_name, 0, page_size, 1, headers)
+    etag = response.headers.get("ETag", etag)
+    last_modified = response.headers.get("Last-Modified", last_modified)
+    if response.status_code == 304:
+        return None, etag, last_modified
+    centres = list(iter_centres(state_id, district_id, city_name, page_size, workers, first=response.json(),
+                                progress=progress))
+    return centres, etag, last_modified
+
 
-    response = requests.get(url, params=params, headers=headers)
-    if response.status_code == 200:
-        data = response.json()
-        centres = []
-        for c in data.get("data", []):
-            centre = Centre(
-                code=c.get("Code"),
-                name=c.get("Name"),
-                address=c.get("Address"),
-                coordinator_name=c.get("CoordinatorName"),
-                subject=c.get("Subject")
-            )
-            centres.append(centre)
-        return centres
-    else:
-        print(f"❌ Failed to fetch centres (HTTP {response.status_code}). Response:\n{response.text}")
+def fetch_centres(state_id, district_id, city_name, page_size=PAGE_SIZE, workers=PAGE_WORKERS):
+    try:
+        return list(iter_centres(state_id, district_id, city_name, page_size, workers))
+    except CentreFetchError as e:
+        instrument.event("centre_fetch_failed", f"❌ {e}", level="error", city=city_name)
         return []
@@ -0,0 +1,77 @@
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+class Job:
+    # Handle passed to a background function. `post` schedules a callback on
+    # the Tk thread; once the job is cancelled its posts are dropped.
+
+    def __init__(self, runner):
+        self.runner = runner
+        self.cancel_event = threading.Event()
+
+    @property
+    def cancelled(self):
+        return self.cancel_event.is_set()
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    def post(self, callback, *args):
+        self.runner.queue.put((self, callback, args))
+
+
+class BackgroundRunner:
+    # Runs blocking work on a thread pool and delivers results back to the
+    # Tk main loop by polling a queue with `after()`, so widgets are only
+    # touched from the UI thread. Starting a new job cancels the previous one.
+
+    def __init__(self, widget, workers=2, poll_ms=50):
+        self.widget = widget
+        self.pool = ThreadPoolExecutor(max_workers=workers)
+        self.queue = queue.Queue()
+        self.poll_ms = poll_ms
+        self.current = None
+        self.widget.after(self.poll_ms, self._poll)
+
+    def submit(self, fn, *args, on_done=None, on_error=None):
+        # Calls fn(job, *args) off the UI thread.
+        self.cancel()
+        job = Job(self)
+        self.current = job
+
+        def run():
+            try:
+                result = fn(job, *args)
+            except Exception as e:
+                if on_error:
+                    job.post(on_error, e)
+                return
+            if on_done:
+                job.post(on_done, result)
+
+        self.pool.submit(run)
+        return job
+
+    def cancel(self):
+        if self.current is not None:
+            self.current.cancel()
+            self.current = None
+
+    def _poll(self):
+        # Rescheduled even when a callback raises (Tk reports the error),
+        # so later results are still delivered.
+        try:
+            while True:
+                job, callback, args = self.queue.get_nowait()
+                if not job.cancelled and callback:
+                    callback(*args)
+        except queue.Empty:
+            pass
+        finally:
+            self.widget.after(self.poll_ms, self._poll)
+
+    def shutdown(self):
+        self.cancel()
+        self.pool.shutdown(wait=False, cancel_futures=True)
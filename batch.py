@@ -0,0 +1,332 @@
+import csv
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import gazetteer
+from address import canonical_key
+from crawl_centres import CRAWL_RATE, fetch_city
+from geocode_cache import STATUS_ERROR
+from snapshot import city_key, load_snapshot
+from spatial import CentreIndex
+from utils import (
+    GEOCODE_FALLBACK,
+    GEOCODE_RATE,
+    GEOCODE_WORKERS,
+    centre_address,
+    centre_arrays,
+    find_nearest_centres,
+    geocode_many,
+    load_geocode_cache,
+)
+
+FETCH_WORKERS = 4
+TOP_K = 3
+PROGRESS_INTERVAL = 2.0  # seconds between progress lines
+# Ranked while some of the city's centre lookups had failed transiently;
+# redone on the next run, once the error entries have expired.
+STATUS_PARTIAL = "partial"
+
+
+def file_format(path):
+    return "jsonl" if path.lower().endswith((".jsonl", ".ndjson", ".json")) else "csv"
+
+
+def read_rows(path):
+    # Yields dicts with lower-cased keys. Rows without an "id" column are
+    # numbered by position, so reruns over the same file line up.
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        if file_format(path) == "jsonl":
+            rows = (json.loads(line) for line in f if line.strip())
+        else:
+            rows = csv.DictReader(f)
+        for n, row in enumerate(rows, start=1):
+            row = {str(k).strip().lower(): v for k, v in row.items() if k is not None}
+            row["id"] = str(row.get("id") or n)
+            yield row
+
+
+def done_ids(path):
+    # IDs already written by an interrupted run. A torn line (crash
+    # mid-write) is ignored and that row is redone, and so is a "partial"
+    # row; its new record is appended and the last record for an ID wins.
+    if not os.path.exists(path):
+        return set()
+    ids = set()
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        if file_format(path) == "jsonl":
+            for line in f:
+                try:
+                    record = json.loads(line)
+                    if record.get("status") != STATUS_PARTIAL:
+                        ids.add(str(record["id"]))
+                except (json.JSONDecodeError, KeyError, AttributeError):
+                    continue
+        else:
+            for row in csv.DictReader(f):
+                if row.get("status") and row["status"] != STATUS_PARTIAL:
+                    ids.add(row["id"])
+    return ids
+
+
+def resolve_scope(catalog, state, district, city):
+    # State and district may be given by ID or name; the city goes through
+    # the same matching as the interactive CLI. Returns a city_key, None for
+    # rows without a city, or raises ValueError.
+    state, district, city = ((v or "").strip() for v in (state, district, city))
+    if not city:
+        return None
+    state_id = None
+    if state:
+        state_id = state if catalog.state_name(state) else next(
+            (sid for sid in catalog.state_ids() if catalog.state_name(sid).lower() == state.lower()), None
+        )
+        if state_id is None:
+            raise ValueError(f"unknown state {state!r}")
+    dist = None
+    if district:
+        candidates = catalog.districts_of(state_id) if state_id else catalog.districts.values()
+        dist = next((d for d in candidates if d.district_id == district or d.name.lower() == district.lower()), None)
+        if dist is None:
+            raise ValueError(f"unknown district {district!r}")
+    if dist is not None:
+        name = catalog.match_city(dist.district_id, city)
+        if not name:
+            raise ValueError(f"unknown city {city!r} in {dist.name}")
+        return city_key(dist.state_id, dist.district_id, name)
+    matches = [m for m in catalog.suggest(city, limit=1, state_id=state_id) if m.score == 1.0]
+    if not matches:
+        raise ValueError(f"unknown city {city!r}")
+    return city_key(matches[0].state_id, matches[0].district_id, matches[0].city)
+
+
+class ResultWriter:
+    # Appends one record per input row and flushes it, so an interrupted run
+    # loses at most the row being written. CSV flattens the nearest centres
+    # into centre_<n>_* columns.
+
+    def __init__(self, path, top_k=TOP_K):
+        self.path = path
+        self.format = file_format(path)
+        self.top_k = top_k
+        exists = os.path.exists(path) and os.path.getsize(path) > 0
+        torn = False
+        if exists:
+            with open(path, "rb") as f:
+                f.seek(-1, os.SEEK_END)
+                torn = f.read(1) != b"\n"
+        self.file = open(path, "a", encoding="utf-8", newline="")
+        if torn:
+            self.file.write("\n")
+        self.written = 0
+        if self.format == "csv":
+            fields = ["id", "address", "state", "district", "city", "status", "lat", "lon", "precision"]
+            for n in range(1, top_k + 1):
+                fields += [f"centre_{n}_code", f"centre_{n}_name", f"centre_{n}_address", f"centre_{n}_distance_km"]
+            self.csv = csv.DictWriter(self.file, fields, extrasaction="ignore")
+            if not exists:
+                self.csv.writeheader()
+
+    def write(self, row, status, user_coords=None, nearest=(), precision=None):
+        lat, lon = user_coords if user_coords else (None, None)
+        if self.format == "jsonl":
+            record = dict(row, status=status, lat=lat, lon=lon, precision=precision, nearest=[
+                dict(c.to_dict(), distance_km=round(d, 3)) for c, d in nearest
+            ])
+            self.file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        else:
+            record = dict(row, status=status, lat=lat, lon=lon, precision=precision)
+            for n, (c, d) in enumerate(nearest, start=1):
+                record.update({
+                    f"centre_{n}_code": c.code,
+                    f"centre_{n}_name": c.name,
+                    f"centre_{n}_address": c.address,
+                    f"centre_{n}_distance_km": round(d, 3),
+                })
+            self.csv.writerow(record)
+        self.file.flush()
+        self.written += 1
+
+    def close(self):
+        self.file.close()
+
+
+def _user_coords(row):
+    try:
+        return float(row["lat"]), float(row["lon"])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def run_batch(input_path, output_path, catalog, top_k=TOP_K, workers=GEOCODE_WORKERS, rate=GEOCODE_RATE,
+              fetch_workers=FETCH_WORKERS, fetch_rate=CRAWL_RATE):
+    # 1. Rows are grouped by city; each city's centres come from the snapshot
+    #    or are fetched once, with a bounded pool.
+    # 2. Every centre and user address goes through one geocode_many batch
+    #    (bounded workers, one rate limit).
+    # 3. A row is written as soon as its own address and all of its city's
+    #    centres are resolved. Rows without a city are ranked at the end
+    #    against every centre loaded. Addresses the geocoder cannot resolve
+    #    fall back to a city or district gazetteer centroid (see the
+    #    "precision" column); a state centroid is never used. Rows of a city
+    #    where some centre lookups failed transiently are written as
+    #    "partial" and redone by the next run.
+    skip = done_ids(output_path)
+    rows = [r for r in read_rows(input_path) if r["id"] not in skip]
+    print(f"📍 {len(rows)} rows to process ({len(skip)} already in '{output_path}')")
+    writer = ResultWriter(output_path, top_k)
+    try:
+        _run(rows, writer, catalog, top_k, workers, rate, fetch_workers, fetch_rate)
+    finally:
+        writer.close()
+    return writer.written
+
+
+def _run(rows, writer, catalog, top_k, workers, rate, fetch_workers, fetch_rate):
+    started = time.monotonic()
+    groups = {}
+    for row in rows:
+        try:
+            key = resolve_scope(catalog, row.get("state"), row.get("district"), row.get("city"))
+        except ValueError as e:
+            writer.write(row, f"unknown_location: {e}")
+            continue
+        groups.setdefault(key, []).append(row)
+
+    snapshot = load_snapshot() or {}
+    cities = {key: snapshot[key] for key in groups if key in snapshot}
+    fetch = [key for key in groups if key is not None and key not in cities]
+    if fetch:
+        print(f"🔄 Fetching centres for {len(fetch)} cities ...")
+        with ThreadPoolExecutor(max_workers=fetch_workers) as pool:
+            futures = {pool.submit(fetch_city, *key, fetch_rate): key for key in fetch}
+            for future in as_completed(futures):
+                key = futures[future]
+                try:
+                    cities[key] = future.result()
+                except Exception as e:
+                    # Left out of the output so a rerun retries them.
+                    print(f"❌ {key[2]} ({key[0]}/{key[1]}): {e}; skipping {len(groups.pop(key))} rows")
+
+    # Address key -> waiting centres / cities / rows.
+    centres_by_key = {}
+    keys_for_city = {}
+    city_waiting = {}
+    rows_by_key = {}
+    addresses = []
+    for key, centres in cities.items():
+        district = catalog.district(key[1])
+        pending = set()
+        for c in centres:
+            addr = None if c.coords else centre_address(c, key[2], district.name, catalog.state_name(key[0]))
+            akey = canonical_key(addr) if addr else None
+            if akey:
+                centres_by_key.setdefault(akey, []).append(c)
+                keys_for_city.setdefault(akey, set()).add(key)
+                pending.add(akey)
+                addresses.append(addr)
+        city_waiting[key] = pending
+    user = {}
+    for key, group in groups.items():
+        for row in group:
+            coords = _user_coords(row)
+            addr = (row.get("address") or "").strip()
+            akey = canonical_key(addr) if addr else None
+            if coords:
+                user[row["id"]] = coords
+            elif akey:
+                rows_by_key.setdefault(akey, []).append((key, row))
+                addresses.append(addr)
+            else:
+                user[row["id"]] = None
+    cache = load_geocode_cache()
+    state = {"last": 0.0}
+    arrays = {}
+    incomplete = set()  # cities with a centre whose lookup failed transiently
+
+    def failed(akey):
+        entry = cache.entry(akey, count=False) if hasattr(cache, "entry") else None
+        return entry is not None and entry.status == STATUS_ERROR
+
+    def fallback(key, row):
+        if not GEOCODE_FALLBACK:
+            return None
+        place = gazetteer.default().locate(row.get("address"))
+        if not gazetteer.rankable(place) and key is not None:
+            place = gazetteer.default().resolve(*key)
+        return place if gazetteer.rankable(place) else None
+
+    def emit(key, row):
+        coords, precision = user.get(row["id"]), gazetteer.PRECISION_EXACT
+        if coords is None:
+            place = fallback(key, row)
+            if place is None:
+                if failed(canonical_key(row.get("address") or "")):
+                    return  # transient failure: left out so a rerun retries it
+                writer.write(row, "address_not_found")
+                return
+            coords, precision = place
+        if key is None:
+            nearest = state["index"].nearest(coords, top_k)
+        else:
+            # A city's rows are only emitted once its centres are placed, so
+            # its ranking arrays are built on the first row and reused.
+            if key not in arrays:
+                arrays[key] = centre_arrays(cities[key])
+            nearest = find_nearest_centres(coords, cities[key], top_k=top_k, arrays=arrays[key])
+        status = STATUS_PARTIAL if key in incomplete else "ok" if nearest else "no_centres"
+        writer.write(row, status, coords, nearest, precision)
+
+    def city_ready(key):
+        return not city_waiting.get(key)
+
+    def finish_city(key):
+        place = gazetteer.default().resolve(*key) if GEOCODE_FALLBACK else None
+        if gazetteer.rankable(place):
+            for c in cities[key]:
+                if not c.coords:
+                    c.coords, c.precision = place
+        for row in groups[key]:
+            if row["id"] in user:
+                emit(key, row)
+
+    # Rows whose inputs are all already known go out before any lookup.
+    for key in groups:
+        if key is not None and city_ready(key):
+            finish_city(key)
+
+    def on_result(done, total, akey, coords):
+        for c in centres_by_key.get(akey, ()):
+            c.coords = coords
+            c.precision = gazetteer.PRECISION_EXACT if coords else None
+        if not coords and akey in centres_by_key and failed(akey):
+            incomplete.update(keys_for_city.get(akey, ()))
+        for key in keys_for_city.get(akey, ()):
+            city_waiting[key].discard(akey)
+            if city_ready(key):
+                finish_city(key)
+        for key, row in rows_by_key.get(akey, ()):
+            user[row["id"]] = coords
+            if key is not None and city_ready(key):
+                emit(key, row)
+        now = time.monotonic()
+        if now - state["last"] >= PROGRESS_INTERVAL or done == total:
+            state["last"] = now
+            elapsed = now - started
+            print(f"  ↳ geocoded {done}/{total} addresses, {writer.written} rows written "
+                  f"({writer.written / max(elapsed, 1e-9):.1f} rows/s)")
+
+    if addresses:
+        print(f"🌐 Geocoding {len(addresses)} addresses ...")
+        geocode_many(addresses, cache, workers=workers, rate=rate, progress=on_result)
+
+    # Rows without a city: rank against every centre loaded in this run.
+    loose = groups.get(None, ())
+    if loose:
+        state["index"] = CentreIndex(c for centres in cities.values() for c in centres)
+        for row in loose:
+            emit(None, row)
+
+    elapsed = time.monotonic() - started
+    print(f"✅ {writer.written} rows written in {elapsed:.1f}s ({writer.written / max(elapsed, 1e-9):.1f} rows/s)")
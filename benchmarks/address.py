@@ -0,0 +1,94 @@
+# Geocode cache hit rate with the old key (strip + lower) vs
+# address.canonical_key, replaying an address corpus through a cold cache.
+# Run from the repository root: python -m benchmarks.address [--corpus FILE]
+# A corpus file has one address per line, e.g. exported from real runs.
+# Without one, a corpus is synthesized from mock_upstream centres, each
+# address written several ways (abbreviations, punctuation, PIN placement,
+# duplicated city/state suffixes) the way centre data and users vary them.
+import argparse
+import random
+import sqlite3
+import time
+
+from address import canonical_key
+from catalog import LocationCatalog
+from geocode_cache import GEOCODE_CACHE_DB
+from mock_upstream import synthetic_centres
+from models import Centre
+from utils import centre_address, normalize
+
+VARIANTS = [
+    lambda a, r: a,
+    lambda a, r: a.replace("ROAD", "RD.").replace("NEAR", "NR."),
+    lambda a, r: a.replace(", ", ",").replace(" NEAR ", "  near "),
+    lambda a, r: a.title(),
+    lambda a, r: a.replace("WARD", "Ward No.").replace(", India", ""),
+    lambda a, r: a + f" - {r}",
+    lambda a, r: a.replace(", India", f", {r}, India"),
+]
+
+
+def synthetic_corpus(size, seed=0):
+    rng = random.Random(seed)
+    catalog = LocationCatalog.load()
+    places = [(d, city) for d in catalog.districts.values() for city in d.cities]
+    corpus = []
+    while len(corpus) < size:
+        d, city = rng.choice(places)
+        state = catalog.state_name(d.state_id)
+        pin = f"{rng.randint(110, 855)}{rng.randint(0, 999):03d}"
+        for c in synthetic_centres(d.state_id, d.district_id, city, 3):
+            base = centre_address(Centre(c["Code"], c["Name"], c["Address"], None, None), city, d.name, state)
+            if rng.random() < 0.3:
+                base = base.replace(f", {city},", f", {city}, {city},")
+            corpus.append(rng.choice(VARIANTS)(base, pin))
+    return corpus[:size]
+
+
+def cache_corpus(path=GEOCODE_CACHE_DB):
+    with sqlite3.connect(path) as conn:
+        return [row[0] for row in conn.execute("SELECT key FROM geocode ORDER BY updated_at")]
+
+
+def replay(corpus, key_fn):
+    seen = set()
+    hits = 0
+    start = time.perf_counter()
+    for address in corpus:
+        key = key_fn(address)
+        if key in seen:
+            hits += 1
+        else:
+            seen.add(key)
+    elapsed = time.perf_counter() - start
+    return hits, len(seen), elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Geocode cache hit rate: old vs canonical keys.")
+    parser.add_argument("--corpus", help="file with one address per line")
+    parser.add_argument("--from-cache", action="store_true", help=f"use the keys stored in {GEOCODE_CACHE_DB}")
+    parser.add_argument("--size", type=int, default=50_000, help="synthetic corpus size")
+    args = parser.parse_args()
+
+    if args.corpus:
+        with open(args.corpus, "r", encoding="utf-8") as f:
+            corpus = [line.strip() for line in f if line.strip()]
+    elif args.from_cache:
+        corpus = cache_corpus()
+    else:
+        corpus = synthetic_corpus(args.size)
+
+    print(f"{len(corpus)} addresses")
+    print(f"{'key':<16} {'unique':>8} {'hits':>8} {'hit rate':>9} {'us/key':>8}")
+    results = {}
+    for label, key_fn in (("strip+lower", normalize), ("canonical", canonical_key.__wrapped__)):
+        hits, unique, elapsed = replay(corpus, key_fn)
+        results[label] = unique
+        print(f"{label:<16} {unique:>8} {hits:>8} {hits / len(corpus):>8.1%} {elapsed / len(corpus) * 1e6:>8.2f}")
+    saved = results["strip+lower"] - results["canonical"]
+    print(f"Paid lookups avoided: {saved} ({saved / max(results['strip+lower'], 1):.1%} of the old misses)")
+
+
+if __name__ == "__main__":
+    main()
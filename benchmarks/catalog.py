@@ -0,0 +1,62 @@
+# Location loading and lookup: raw json.load + linear scans (the old CLI/GUI
+# path) vs LocationCatalog from its compiled form.
+# Run from the repository root: python -m benchmarks.catalog
+import json
+import time
+import tracemalloc
+
+from catalog import LOCATIONS_FILE, LocationCatalog
+
+REPEAT = 20
+
+
+def old_load():
+    with open(LOCATIONS_FILE, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def old_lookups(states):
+    for sid, state in states.items():
+        for dist in state["districts"]:
+            did = dist["DistrictId"]
+            found = next(d for d in state["districts"] if d["DistrictId"] == did)
+            for city in found["cities"]:
+                city_map = {c.strip().lower(): c for c in found["cities"]}
+                assert city.strip().lower() in city_map
+
+
+def new_lookups(catalog):
+    for sid in catalog.state_ids():
+        for dist in catalog.districts_of(sid):
+            found = catalog.district(dist.district_id)
+            for city in found.cities:
+                assert catalog.match_city(found.district_id, city)
+
+
+def measure(label, load, lookups):
+    start = time.perf_counter()
+    for _ in range(REPEAT):
+        data = load()
+    load_ms = (time.perf_counter() - start) / REPEAT * 1e3
+
+    tracemalloc.start()
+    data = load()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    start = time.perf_counter()
+    lookups(data)
+    lookup_ms = (time.perf_counter() - start) * 1e3
+    print(f"{label:<28} load {load_ms:7.2f} ms   resident {current / 1024:8.1f} KiB   "
+          f"peak {peak / 1024:8.1f} KiB   all lookups {lookup_ms:7.2f} ms")
+
+
+def main():
+    LocationCatalog.load()  # make sure the compiled form exists
+    measure("json.load + linear scans", old_load, old_lookups)
+    measure("LocationCatalog (json)", LocationCatalog.from_json, new_lookups)
+    measure("LocationCatalog (compiled)", LocationCatalog.load, new_lookups)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+# Scalar vs NumPy nearest-centre ranking.
+# Run from the repository root: python -m benchmarks.distance
+import random
+import sys
+import time
+
+import distances
+from models import Centre
+from utils import find_nearest_centres
+
+SIZES = (1_000, 100_000, 1_000_000)
+QUERIES = 5
+
+
+def synthetic_centres(n, seed=0):
+    rng = random.Random(seed)
+    return [
+        Centre(i, f"Centre {i}", "", "", "", coords=(rng.uniform(8, 35), rng.uniform(69, 96)))
+        for i in range(n)
+    ]
+
+
+def timed(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat
+
+
+def main():
+    if not distances.available():
+        print("NumPy is not installed; only the scalar path can run.")
+        sys.exit(1)
+    user = (19.07, 72.88)
+    print(f"{'centres':>10} {'scalar ms':>12} {'numpy ms':>12} {'prebuilt ms':>12} {'speedup':>8}")
+    for n in SIZES:
+        centres = synthetic_centres(n)
+        scalar = timed(lambda: find_nearest_centres(user, centres, 3, vectorize=False), QUERIES)
+        vector = timed(lambda: find_nearest_centres(user, centres, 3, vectorize=True), QUERIES)
+        arrays = distances.CentreArrays(centres)
+        prebuilt = timed(lambda: arrays.nearest(user, 3), QUERIES)
+        print(f"{n:>10} {scalar * 1e3:>12.2f} {vector * 1e3:>12.2f} {prebuilt * 1e3:>12.2f} {scalar / prebuilt:>7.1f}x")
+
+    centres = synthetic_centres(100_000)
+    arrays = distances.CentreArrays(centres)
+    users = [(random.uniform(8, 35), random.uniform(69, 96)) for _ in range(100)]
+    batch = timed(lambda: arrays.nearest_many(users, 3), 1)
+    print(f"\n100 users x 100000 centres (batched): {batch * 1e3:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
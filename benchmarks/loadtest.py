@@ -0,0 +1,128 @@
+# Load test for server.py: concurrent /nearest and /centres queries,
+# reporting throughput and p50/p90/p99 latency per endpoint.
+# Run from the repository root: python -m benchmarks.loadtest
+# With no --url an in-process server is started over synthetic geocoded
+# centres for every city in locations.json, so no network is needed.
+import argparse
+import random
+import threading
+import time
+from collections import defaultdict
+
+import requests
+
+from catalog import LocationCatalog
+from models import Centre
+from snapshot import city_key
+
+# Rough bounding box of India.
+LAT_RANGE = (8.0, 35.0)
+LON_RANGE = (69.0, 96.0)
+
+
+def synthetic_cities(catalog, per_city, seed=0):
+    rng = random.Random(seed)
+    cities = {}
+    for district in catalog.districts.values():
+        for city in district.cities:
+            cities[city_key(district.state_id, district.district_id, city)] = [
+                Centre(
+                    f"{district.district_id}-{city}-{i}", f"{city} CENTRE {i}", f"{i} MAIN ROAD",
+                    f"COORDINATOR {i}", "PHYSICS",
+                    (rng.uniform(*LAT_RANGE), rng.uniform(*LON_RANGE)),
+                )
+                for i in range(per_city)
+            ]
+    return cities
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return float("nan")
+    i = min(len(sorted_values) - 1, max(0, round(p / 100 * len(sorted_values)) - 1))
+    return sorted_values[i]
+
+
+def run(base_url, paths, concurrency, duration):
+    latencies = defaultdict(list)
+    errors = defaultdict(int)
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def worker(seed):
+        rng = random.Random(seed)
+        session = requests.Session()
+        local = defaultdict(list)
+        failed = defaultdict(int)
+        while time.perf_counter() < deadline:
+            name, path = rng.choice(paths)(rng)
+            start = time.perf_counter()
+            try:
+                ok = session.get(base_url + path, timeout=10).status_code == 200
+            except requests.RequestException:
+                ok = False
+            local[name].append(time.perf_counter() - start)
+            if not ok:
+                failed[name] += 1
+        with lock:
+            for name, values in local.items():
+                latencies[name] += values
+            for name, n in failed.items():
+                errors[name] += n
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return latencies, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the nearest-centre HTTP service.")
+    parser.add_argument("--url", default=None, help="target an already running server")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds")
+    parser.add_argument("--centres-per-city", type=int, default=20)
+    args = parser.parse_args()
+
+    catalog = LocationCatalog.load()
+    keys = [
+        (d.state_id, d.district_id, city)
+        for d in catalog.districts.values() for city in d.cities
+    ]
+    server = None
+    base_url = args.url
+    if base_url is None:
+        from server import CentreService, start_in_background
+        service = CentreService(catalog, synthetic_cities(catalog, args.centres_per_city), geocode=False)
+        server, base_url = start_in_background(service)
+        print(f"In-process server with {len(service.index)} centres in {len(keys)} cities")
+
+    def nearest(rng):
+        lat, lon = rng.uniform(*LAT_RANGE), rng.uniform(*LON_RANGE)
+        return "/nearest", f"/nearest?lat={lat:.5f}&lon={lon:.5f}&k=3"
+
+    def centres(rng):
+        state_id, district_id, city = rng.choice(keys)
+        return "/centres", "/centres?" + requests.compat.urlencode(
+            {"state": state_id, "district": district_id, "city": city}
+        )
+
+    try:
+        latencies, errors = run(base_url, [nearest, nearest, nearest, centres], args.concurrency, args.duration)
+    finally:
+        if server is not None:
+            server.shutdown()
+
+    total = sum(len(v) for v in latencies.values())
+    print(f"{total} requests in {args.duration:.0f}s with {args.concurrency} clients: {total / args.duration:.0f} req/s")
+    print(f"{'endpoint':<10} {'count':>7} {'errors':>6} {'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8}")
+    for name in sorted(latencies):
+        values = sorted(latencies[name])
+        p50, p90, p99 = (percentile(values, p) * 1e3 for p in (50, 90, 99))
+        print(f"{name:<10} {len(values):>7} {errors[name]:>6} {p50:>8.2f} {p90:>8.2f} {p99:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
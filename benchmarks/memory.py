@@ -0,0 +1,72 @@
+# Memory held by 100k centres: the old dict-backed Centre, the __slots__
+# Centre, and the columnar CentreTable.
+# Run from the repository root: python -m benchmarks.memory
+import gc
+import random
+import time
+import tracemalloc
+
+from models import Centre, CentreTable
+from utils import find_nearest_centres
+
+N = 100_000
+SUBJECTS = ["PHYSICS", "CHEMISTRY", "BIOLOGY", "ASTRONOMY"]
+
+
+class DictCentre:
+    # Centre as it was before __slots__, for comparison.
+    def __init__(self, code, name, address, coordinator_name, subject, coords=None):
+        self.code = code
+        self.name = name
+        self.address = address
+        self.coordinator_name = coordinator_name
+        self.subject = subject
+        self.coords = coords
+
+
+def rows(n, seed=0):
+    rng = random.Random(seed)
+    for i in range(n):
+        yield (
+            f"C{i:06d}",
+            f"CENTRE {i}",
+            f"{rng.randint(1, 999)} MAIN ROAD, WARD {rng.randint(1, 40)}",
+            f"COORDINATOR {i}",
+            # Built fresh per row, as JSON decoding does.
+            "".join(rng.choice(SUBJECTS)),
+            rng.uniform(8, 35),
+            rng.uniform(69, 96),
+            f"CITY {i % 1000}",
+        )
+
+
+def measure(label, build):
+    data = list(rows(N))
+    gc.collect()
+    tracemalloc.start()
+    obj = build(data)
+    current, _peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    start = time.perf_counter()
+    find_nearest_centres((19.07, 72.88), obj, top_k=3, vectorize=False)
+    rank_ms = (time.perf_counter() - start) * 1e3
+    print(f"{label:<24} {current / 2**20:8.2f} MiB  ({current / N:6.1f} B/centre)   scalar top-3 {rank_ms:7.1f} ms")
+    return obj
+
+
+def main():
+    print(f"{N} centres; string payloads are shared across variants, so this is per-record overhead.")
+    measure("dict Centre list", lambda d: [DictCentre(*r[:5], coords=(r[5], r[6])) for r in d])
+    measure("__slots__ Centre list", lambda d: [Centre(*r[:5], coords=(r[5], r[6])) for r in d])
+
+    def table(d):
+        t = CentreTable()
+        for r in d:
+            t.append(Centre(*r[:5], coords=(r[5], r[6])), "1", "1", r[7])
+        return t
+
+    measure("CentreTable", table)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,271 @@
+# End-to-end fetch -> geocode -> rank benchmark against the local mock
+# upstream (mock_upstream.py) and the deterministic fake geocoder, so it
+# needs no network and no API key and runs the same way every time.
+# Run from the repository root: python -m benchmarks.pipeline [--sizes 100,10000]
+# Each stage reports wall time, throughput and the process's peak RSS while
+# it ran; the full report is written as JSON (--output) and can be diffed
+# against an earlier one with --baseline.
+import argparse
+import json
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import api
+import geocode
+import mock_upstream
+from address import canonical_key
+from catalog import LOCATIONS_FILE, LocationCatalog
+from geocode_cache import GeocodeCache
+from snapshot import city_key, load_snapshot, save_snapshot
+from spatial import CentreIndex
+from utils import centre_address, find_nearest_centres, geocode_many, geocode_with_cache, haversine, simplify_address
+
+SIZES = (100, 10_000, 1_000_000)
+PER_CITY = 1000  # centres the mock returns per city; size / PER_CITY cities are fetched
+FETCH_WORKERS = 8
+GEOCODE_WORKERS = 32
+QUERIES = 20
+SINGLE_LOOKUPS = 1000  # geocode_with_cache calls per dataset
+REPORT_FILE = "pipeline_report.json"
+
+
+class RssSampler:
+    # Peak resident set size between start() and stop(), sampled from
+    # /proc/self/statm. Elsewhere only the process-wide high-water mark
+    # (ru_maxrss) is available, which never goes down between stages.
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.page = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+        self.proc = os.path.exists("/proc/self/statm")
+        self.peak = 0
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def rss(self):
+        if self.proc:
+            with open("/proc/self/statm", "rb") as f:
+                return int(f.read().split()[1]) * self.page
+        scale = 1 if sys.platform == "darwin" else 1024
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+
+    def _run(self):
+        while not self.stopped.wait(self.interval):
+            self.peak = max(self.peak, self.rss())
+
+    def start(self):
+        self.peak = self.rss()
+        self.stopped.clear()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+        return max(self.peak, self.rss())
+
+
+class Report:
+    def __init__(self, options):
+        self.sampler = RssSampler()
+        self.stages = []
+        self.meta = {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "commit": git_commit(),
+            "started_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "options": options,
+        }
+
+    def stage(self, dataset, name, fn, items=None):
+        # Runs fn() once; `items` is a count or a function of fn's result.
+        self.sampler.start()
+        start = time.perf_counter()
+        try:
+            result = fn()
+        finally:
+            elapsed = time.perf_counter() - start
+            peak = self.sampler.stop()
+        count = items(result) if callable(items) else items
+        record = {
+            "dataset": dataset,
+            "stage": name,
+            "seconds": round(elapsed, 6),
+            "items": count,
+            "per_second": round(count / elapsed, 1) if count and elapsed > 0 else None,
+            "peak_rss_mb": round(peak / 2**20, 1),
+        }
+        self.stages.append(record)
+        print_stage(record)
+        return result
+
+    def to_dict(self):
+        return {"meta": self.meta, "stages": self.stages}
+
+
+def git_commit():
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=5)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return out.stdout.strip() or None
+
+
+def print_stage(r, baseline=None):
+    rate = f"{r['per_second']:>12,.0f}" if r["per_second"] else f"{'-':>12}"
+    line = f"{str(r['dataset']):>9} {r['stage']:<18} {r['seconds'] * 1000:>11.1f} {rate} {r['peak_rss_mb']:>9.1f}"
+    if baseline:
+        line += f" {(r['seconds'] / baseline['seconds'] - 1) * 100:>+8.1f}%" if baseline["seconds"] else ""
+    print(line)
+
+
+def pick_cities(catalog, count):
+    # The first `count` cities in catalog order, so every run fetches the
+    # same ones.
+    out = []
+    for sid in catalog.state_ids():
+        for d in catalog.districts_of(sid):
+            for city in d.cities:
+                out.append(city_key(sid, d.district_id, city))
+                if len(out) == count:
+                    return out
+    return out
+
+
+def bench_catalog(report):
+    def parse():
+        with open(LOCATIONS_FILE, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    states = report.stage("catalog", "locations_json", parse, items=lambda s: len(s))
+    report.stage("catalog", "catalog_build", lambda: LocationCatalog.from_states(states), items=len(states))
+    return report.stage("catalog", "catalog_load", LocationCatalog.load, items=len(states))
+
+
+def bench_dataset(report, catalog, size, args, workdir):
+    per_city = min(size, args.per_city)
+    keys = pick_cities(catalog, -(-size // per_city))
+    if len(keys) * per_city < size:
+        print(f"⚠️ locations.json only has {len(keys)} cities; dataset {size} is capped at {len(keys) * per_city}")
+
+    server, base_url = mock_upstream.start_in_background(centres_per_city=per_city, latency=args.upstream_latency)
+    old_base = api.BASE_URL
+    api.BASE_URL = base_url
+    try:
+        def fetch():
+            with ThreadPoolExecutor(max_workers=args.fetch_workers) as pool:
+                return dict(zip(keys, pool.map(lambda k: api.fetch_centres(*k), keys)))
+
+        cities = report.stage(size, "fetch_centres", fetch, items=lambda c: sum(map(len, c.values())))
+    finally:
+        api.BASE_URL = old_base
+        server.shutdown()
+        server.server_close()
+    centres = [c for centres in cities.values() for c in centres]
+
+    def build_addresses():
+        out = []
+        for key, group in cities.items():
+            district = catalog.district(key[1])
+            state = catalog.state_name(key[0])
+            out.extend(centre_address(c, key[2], district.name, state) for c in group)
+        return out
+
+    addresses = report.stage(size, "centre_address", build_addresses, items=len(centres))
+    report.stage(size, "simplify_address", lambda: [simplify_address(a) for a in addresses], items=len(addresses))
+    canonical_key.cache_clear()
+    report.stage(size, "canonical_key", lambda: [canonical_key(a) for a in addresses], items=len(addresses))
+    canonical_key.cache_clear()
+
+    path = os.path.join(workdir, f"geocode_cache.{size}.sqlite")
+    backend = geocode.FakeBackend(latency=args.geocoder_latency)
+    cache = GeocodeCache(path)
+    results = report.stage(size, "geocode_cold", lambda: geocode_many(
+        addresses, cache, workers=args.geocode_workers, rate=0, geocoder=backend.lookup
+    ), items=len(addresses))
+    cache.close()
+    print(f"{'':>9} ↳ {backend.calls} geocoder calls for {len(addresses)} addresses")
+
+    # A fresh cache object: every hit is read back from disk.
+    cache = GeocodeCache(path)
+    report.stage(size, "geocode_warm", lambda: geocode_many(
+        addresses, cache, workers=args.geocode_workers, rate=0, geocoder=backend.lookup
+    ), items=len(addresses))
+    sample = addresses[:SINGLE_LOOKUPS]
+    report.stage(size, "geocode_with_cache", lambda: [
+        geocode_with_cache(a, cache, geocoder=backend.lookup) for a in sample
+    ], items=len(sample))
+    cache.close()
+    for c, coords in zip(centres, results):
+        c.coords = coords
+
+    snapshot = os.path.join(workdir, f"snapshot.{size}.json")
+    report.stage(size, "snapshot_save", lambda: save_snapshot(cities, snapshot), items=len(centres))
+    report.stage(size, "snapshot_load", lambda: load_snapshot(snapshot), items=len(centres))
+
+    rng = random.Random(size)
+    users = [(rng.uniform(8, 35), rng.uniform(69, 96)) for _ in range(args.queries)]
+    located = [c for c in centres if c.coords]
+    report.stage(size, "haversine", lambda: [haversine(users[0], c.coords) for c in located], items=len(located))
+    report.stage(size, "find_nearest", lambda: [
+        find_nearest_centres(u, centres, top_k=3) for u in users
+    ], items=len(users))
+    index = report.stage(size, "index_build", lambda: CentreIndex(centres), items=len(located))
+    report.stage(size, "index_nearest", lambda: [index.nearest(u, 3) for u in users], items=len(users))
+
+
+def load_baseline(path):
+    with open(path, "r", encoding="utf-8") as f:
+        stages = json.load(f)["stages"]
+    return {(str(r["dataset"]), r["stage"]): r for r in stages}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end fetch -> geocode -> rank benchmark.")
+    parser.add_argument("--sizes", default=",".join(map(str, SIZES)), help="comma-separated centre counts")
+    parser.add_argument("--per-city", type=int, default=PER_CITY, help="centres per city served by the mock")
+    parser.add_argument("--upstream-latency", type=float, default=0.0, help="seconds added to each upstream request")
+    parser.add_argument("--geocoder-latency", type=float, default=0.0, help="seconds per fake geocoder call")
+    parser.add_argument("--fetch-workers", type=int, default=FETCH_WORKERS)
+    parser.add_argument("--geocode-workers", type=int, default=GEOCODE_WORKERS)
+    parser.add_argument("--queries", type=int, default=QUERIES, help="user locations ranked per dataset")
+    parser.add_argument("--output", default=REPORT_FILE, help="JSON report path ('-' for stdout)")
+    parser.add_argument("--baseline", help="earlier JSON report to compare against")
+    args = parser.parse_args()
+    sizes = [int(s) for s in args.sizes.split(",") if s.strip()]
+
+    report = Report({k: v for k, v in vars(args).items() if k not in ("output", "baseline")})
+    print(f"{'dataset':>9} {'stage':<18} {'ms':>11} {'items/s':>12} {'rss MB':>9}")
+    catalog = bench_catalog(report)
+    with tempfile.TemporaryDirectory(prefix="pipeline-bench-") as workdir:
+        for size in sizes:
+            bench_dataset(report, catalog, size, args, workdir)
+
+    payload = json.dumps(report.to_dict(), indent=2)
+    if args.output == "-":
+        print(payload)
+    else:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(payload + "\n")
+        print(f"✅ Report written to '{args.output}'")
+
+    if args.baseline:
+        baseline = load_baseline(args.baseline)
+        print(f"\nCompared with '{args.baseline}' (time change):")
+        for r in report.stages:
+            previous = baseline.get((str(r["dataset"]), r["stage"]))
+            if previous:
+                print_stage(r, previous)
+
+
+if __name__ == "__main__":
+    main()
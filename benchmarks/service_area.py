@@ -0,0 +1,66 @@
+# Point lookups: precomputed NearestGrid vs find_nearest_centres and
+# CentreIndex, over synthetic centres scattered across a district-sized box.
+# Run from the repository root: python -m benchmarks.service_area
+# "agree" is the share of random points the grid assigns to the exactly
+# nearest centre; "worst km" is the largest extra distance when it does not.
+import random
+import time
+
+from service_area import NearestGrid
+from spatial import CentreIndex
+from models import Centre
+from utils import find_nearest_centres, haversine
+
+BOX = (18.0, 73.0, 19.0, 74.0)  # about 110 x 105 km
+CENTRES = (20, 200, 2000)
+STEPS = (0.02, 0.005)
+POINTS = 20_000
+
+
+def synthetic_centres(n, seed=0):
+    rng = random.Random(seed)
+    south, west, north, east = BOX
+    return [
+        Centre(i, f"Centre {i}", "", "", "", coords=(rng.uniform(south, north), rng.uniform(west, east)))
+        for i in range(n)
+    ]
+
+
+def per_lookup_us(fn, points):
+    start = time.perf_counter()
+    for p in points:
+        fn(p)
+    return (time.perf_counter() - start) / len(points) * 1e6
+
+
+def main():
+    rng = random.Random(1)
+    south, west, north, east = BOX
+    points = [(rng.uniform(south, north), rng.uniform(west, east)) for _ in range(POINTS)]
+    print(f"{'centres':>8} {'step':>6} {'cells':>8} {'build s':>8} {'grid us':>8} {'index us':>9} "
+          f"{'scan us':>8} {'agree':>7} {'worst km':>9}")
+    for n in CENTRES:
+        centres = synthetic_centres(n)
+        index = CentreIndex(centres)
+        scan = per_lookup_us(lambda p: find_nearest_centres(p, centres), points[:2000])
+        indexed = per_lookup_us(lambda p: index.nearest(p, 1), points)
+        exact = [index.nearest(p, 1)[0] for p in points]
+        for step in STEPS:
+            start = time.perf_counter()
+            grid = NearestGrid(index, BOX, step)
+            build = time.perf_counter() - start
+            lookup = per_lookup_us(grid.nearest, points)
+            agree = 0
+            worst = 0.0
+            for p, (best, d) in zip(points, exact):
+                centre, _ = grid.nearest(p)
+                if centre is best:
+                    agree += 1
+                else:
+                    worst = max(worst, haversine(p, centre.coords) - d)
+            print(f"{n:>8} {step:>6} {len(grid):>8} {build:>8.2f} {lookup:>8.2f} {indexed:>9.2f} "
+                  f"{scan:>8.1f} {agree / len(points):>7.2%} {worst:>9.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+# Cold-start cost of the entry points, from `python -X importtime`.
+# Run from the repository root: python -m benchmarks.startup [--modules cli,gui]
+# Each module is imported in a fresh interpreter --runs times (after one
+# discarded run that writes the .pyc files); the median cumulative import
+# time is reported with the heaviest modules it pulled in, and whether any
+# of the modules that should only load on first use came in anyway.
+# "to prompt" adds LocationCatalog.load(), i.e. what the CLI does before its
+# first question.
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+
+MODULES = ("cli", "gui", "server")
+RUNS = 5
+TOP = 8
+# Only needed on first use: the network, a geocoder backend, NumPy ranking
+# or the legacy pickle cache migration.
+LAZY = ("requests", "urllib3", "geopy", "asyncio", "numpy", "hashlib", "pickle", "refresh_locations")
+
+PROBE = (
+    "import sys, time\n"
+    "start = time.perf_counter()\n"
+    "import {module}\n"
+    "imported = time.perf_counter()\n"
+    "from catalog import LocationCatalog\n"
+    "LocationCatalog.load()\n"
+    "ready = time.perf_counter()\n"
+    "print(imported - start, ready - start, ','.join(m for m in {lazy!r} if m in sys.modules))\n"
+)
+
+
+def parse_importtime(stderr):
+    # -> [(name, self_us, cumulative_us, depth)], in import order.
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative, name = line[len("import time:"):].split("|", 2)
+        depth = (len(name) - len(name.lstrip())) // 2
+        rows.append((name.strip(), int(self_us), int(cumulative), depth))
+    return rows
+
+
+def run_once(module):
+    start = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", PROBE.format(module=module, lazy=LAZY)],
+        capture_output=True, text=True,
+    )
+    wall = time.perf_counter() - start
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else "failed")
+    imported, ready, loaded = proc.stdout.split(" ")
+    rows = parse_importtime(proc.stderr)
+    total = next((cum for name, _, cum, depth in rows if name == module and depth == 0), 0)
+    return {
+        "importtime_ms": total / 1000,
+        "import_ms": float(imported) * 1000,
+        "prompt_ms": float(ready) * 1000,
+        "process_ms": wall * 1000,
+        "lazy_loaded": [m for m in loaded.strip().split(",") if m],
+        "rows": rows,
+    }
+
+
+def heaviest(rows, module, top):
+    # Modules imported on behalf of `module`, by self time.
+    start = next((i for i, (name, _, _, depth) in enumerate(rows) if name == module and depth == 0), None)
+    if start is None:
+        return []
+    # importtime prints a module after its dependencies, so its subtree is
+    # the run of deeper lines just before it.
+    first = start
+    while first > 0 and rows[first - 1][3] > 0:
+        first -= 1
+    subtree = rows[first:start + 1]
+    return sorted(subtree, key=lambda r: r[1], reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Entry-point import and start-up time.")
+    parser.add_argument("--modules", default=",".join(MODULES))
+    parser.add_argument("--runs", type=int, default=RUNS)
+    parser.add_argument("--top", type=int, default=TOP, help="heaviest imports listed per module")
+    args = parser.parse_args()
+
+    print(f"{'module':<8} {'importtime ms':>14} {'import ms':>10} {'to prompt ms':>13} {'process ms':>11}")
+    details = []
+    for module in filter(None, (m.strip() for m in args.modules.split(","))):
+        try:
+            run_once(module)
+            runs = [run_once(module) for _ in range(max(1, args.runs))]
+        except RuntimeError as e:
+            print(f"{module:<8} ⚠️ skipped: {e}")
+            continue
+        median = lambda key: statistics.median(r[key] for r in runs)
+        print(f"{module:<8} {median('importtime_ms'):>14.1f} {median('import_ms'):>10.1f} "
+              f"{median('prompt_ms'):>13.1f} {median('process_ms'):>11.1f}")
+        details.append((module, runs[-1]))
+
+    for module, run in details:
+        print(f"\n{module}: heaviest imports (self ms / cumulative ms)")
+        for name, self_us, cumulative, _ in heaviest(run["rows"], module, args.top):
+            print(f"  {self_us / 1000:>7.1f} {cumulative / 1000:>8.1f}  {name}")
+        if run["lazy_loaded"]:
+            print(f"  ⚠️ loaded at start-up: {', '.join(run['lazy_loaded'])}")
+        else:
+            print("  ✅ no network/geocoding/NumPy modules loaded at start-up")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+import bisect
+import json
+import marshal
+import os
+import sys
+from collections import namedtuple
+
+import instrument
+
+LOCATIONS_FILE = "locations.json"
+COMPILED_SUFFIX = ".bin"
+COMPILED_VERSION = 2
+
+District = namedtuple("District", ["district_id", "name", "state_id", "cities"])
+
+
+def _norm(s):
+    return s.strip().lower()
+
+
+class LocationCatalog:
+    # In-memory view of locations.json, built once. States and districts are
+    # looked up by ID in O(1), each district gets a normalized city map for
+    # select_city, and a sorted (normalized name, ...) list over every city
+    # serves prefix autocomplete via bisect. The per-district maps and the
+    # prefix index are built on first use. All names are interned.
+
+    def __init__(self, rows=(), intern=True):
+        # `rows` is the compact form: (state_id, state_name, ((district_id,
+        # district_name, (city, ...)), ...)) per state. Rows read back by
+        # marshal are already interned, so the compiled path skips that step.
+        self.state_names = {}
+        self.state_districts = {}
+        self.districts = {}
+        self.city_maps = {}
+        self.prefix_keys = None
+        self.prefix_entries = None
+        self.fuzzy = None
+        for row in rows:
+            self._add_state(row, intern)
+
+    @staticmethod
+    def compact(states):
+        # locations.json structure -> compact rows.
+        return tuple(
+            (str(sid), state["state_name"], tuple(
+                (str(d["DistrictId"]), d["DistrictName"], tuple(d.get("cities", ())))
+                for d in state.get("districts", [])
+            ))
+            for sid, state in states.items()
+        )
+
+    @classmethod
+    def from_states(cls, states):
+        return cls(cls.compact(states))
+
+    def _add_state(self, row, intern=True):
+        sid, name, districts = row
+        if intern:
+            sid = sys.intern(sid)
+            name = sys.intern(name)
+        self.state_names[sid] = name
+        ids = []
+        for did, dname, cities in districts:
+            if intern:
+                did = sys.intern(did)
+                dname = sys.intern(dname)
+                cities = tuple(map(sys.intern, cities))
+            self.districts[did] = District(did, dname, sid, cities)
+            ids.append(did)
+        self.state_districts[sid] = tuple(ids)
+
+    def _remove_state(self, sid):
+        for did in self.state_districts.pop(sid, ()):
+            self.districts.pop(did, None)
+            self.city_maps.pop(did, None)
+        self.state_names.pop(sid, None)
+
+    def _city_map(self, district):
+        city_map = self.city_maps.get(district.district_id)
+        if city_map is None:
+            city_map = {_norm(c): c for c in reversed(district.cities)}
+            self.city_maps[district.district_id] = city_map
+        return city_map
+
+    def _build_prefix_index(self):
+        entries = []
+        for did, district in self.districts.items():
+            for pos, city in enumerate(district.cities):
+                entries.append((_norm(city), district.state_id, did, pos, city))
+        entries.sort()
+        self.prefix_keys = [e[0] for e in entries]
+        self.prefix_entries = entries
+
+    def replace_states(self, states, state_ids):
+        # Reloads just the given subtrees from a fresh locations structure.
+        for sid in state_ids:
+            self._remove_state(sid)
+            if sid in states:
+                self._add_state(self.compact({sid: states[sid]})[0])
+        self.prefix_keys = self.prefix_entries = None
+        self.fuzzy = None
+
+    # Lookups
+
+    def state_ids(self):
+        return list(self.state_names)
+
+    def state_name(self, state_id):
+        return self.state_names.get(state_id)
+
+    def districts_of(self, state_id):
+        return [self.districts[did] for did in self.state_districts.get(state_id, ())]
+
+    def district(self, district_id):
+        return self.districts.get(district_id)
+
+    def match_city(self, district_id, text):
+        # Exact normalized match, else a name that is a prefix of `text` or
+        # starts with it; ties go to the earliest city in the district list.
+        district = self.districts.get(district_id)
+        if district is None:
+            return None
+        city_map = self._city_map(district)
+        ntext = _norm(text)
+        if ntext in city_map:
+            return city_map[ntext]
+        if not ntext:
+            return district.cities[0] if district.cities else None
+        order = {c: pos for pos, c in enumerate(district.cities)}
+        candidates = [city_map[ntext[:i]] for i in range(1, len(ntext)) if ntext[:i] in city_map]
+        candidates += [entry[4] for entry in self._prefixed(ntext) if entry[2] == district_id]
+        return min(candidates, key=order.get) if candidates else None
+
+    def _prefixed(self, nprefix):
+        if self.prefix_keys is None:
+            self._build_prefix_index()
+        lo = bisect.bisect_left(self.prefix_keys, nprefix)
+        hi = bisect.bisect_left(self.prefix_keys, nprefix + "￿", lo)
+        return self.prefix_entries[lo:hi]
+
+    def complete(self, prefix, limit=10):
+        # Nationwide city autocomplete: [(city, state_id, district_id), ...].
+        return [(e[4], e[1], e[2]) for e in self._prefixed(_norm(prefix))[:limit]]
+
+    def suggest(self, text, limit=5, state_id=None, district_id=None):
+        # Ranked fuzzy matches: [fuzzy.Match(city, state_id, district_id, score)].
+        if self.fuzzy is None:
+            from fuzzy import CityMatcher
+            self.fuzzy = CityMatcher.from_catalog(self)
+        return self.fuzzy.search(text, limit, state_id=state_id, district_id=district_id)
+
+    # Serialization
+
+    def to_states(self):
+        return {
+            sid: {
+                "state_name": name,
+                "districts": [
+                    {"DistrictId": d.district_id, "DistrictName": d.name, "cities": list(d.cities)}
+                    for d in self.districts_of(sid)
+                ],
+            }
+            for sid, name in self.state_names.items()
+        }
+
+    @classmethod
+    def from_json(cls, path=LOCATIONS_FILE):
+        with open(path, "r", encoding="utf-8") as f:
+            return cls.from_states(json.load(f))
+
+    @classmethod
+    def load(cls, path=LOCATIONS_FILE):
+        # Loads the compiled form when it was built from the current source
+        # file, otherwise parses the JSON and rebuilds it.
+        st = os.stat(path)
+        source = (st.st_mtime_ns, st.st_size)
+        compiled = path + COMPILED_SUFFIX
+        try:
+            with open(compiled, "rb") as f:
+                payload = marshal.loads(f.read())
+            if payload.get("version") == COMPILED_VERSION and tuple(payload.get("source", ())) == source:
+                return cls(payload["rows"], intern=False)
+        except (OSError, EOFError, ValueError, TypeError):
+            pass
+        catalog = cls.from_json(path)
+        catalog.save_compiled(compiled, source)
+        return catalog
+
+    def save_compiled(self, path, source):
+        rows = tuple(
+            (sid, name, tuple((d.district_id, d.name, d.cities) for d in self.districts_of(sid)))
+            for sid, name in self.state_names.items()
+        )
+        payload = {"version": COMPILED_VERSION, "source": source, "rows": rows}
+        tmp = path + ".tmp"
+        try:
+            with open(tmp, "wb") as f:
+                f.write(marshal.dumps(payload))
+            os.replace(tmp, path)
+        except OSError as e:
+            instrument.event("catalog_compile_failed", f"⚠️ Could not write compiled catalog '{path}': {e}",
+                             level="warning", path=path)
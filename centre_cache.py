@@ -0,0 +1,197 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+import api
+import instrument
+from models import Centre
+
+CENTRE_CACHE_DB = "centre_cache.sqlite"
+
+MAX_AGE = float(os.getenv("CENTRE_CACHE_MAX_AGE", str(24 * 3600)))  # served without revalidating
+MAX_STALE = float(os.getenv("CENTRE_CACHE_MAX_STALE", str(30 * 24 * 3600)))  # served while revalidating
+REVALIDATE_WORKERS = 2
+
+# fetched_at: last time the list was confirmed current (a 200 or a 304);
+# full_fetched_at: last unconditional fetch of every page.
+CityEntry = namedtuple("CityEntry", ["centres", "etag", "last_modified", "fetched_at", "full_fetched_at"])
+
+
+class CentreCache:
+    # Per-city centre lists on disk (SQLite, WAL) keyed by (StateId,
+    # DistrictId, CityId), with the same list kept in memory once read.
+    #
+    # Younger than max_age: served as is. Between max_age and max_stale:
+    # served immediately while one background refresh per city revalidates
+    # it, sending the stored ETag/Last-Modified so an unchanged list costs a
+    # single 304. Older than max_stale, or missing: fetched in full before
+    # returning. Only the first page carries validators, so a 304 does not
+    # count towards that: once the last unconditional fetch is older than
+    # max_stale the list is fetched in full again, which bounds how long a
+    # change confined to later pages can go unnoticed.
+
+    def __init__(self, path=CENTRE_CACHE_DB, max_age=MAX_AGE, max_stale=MAX_STALE, workers=REVALIDATE_WORKERS):
+        self.path = path
+        self.max_age = max_age
+        self.max_stale = max_stale
+        self.memo = {}
+        self.inflight = set()
+        self.counters = {"fresh": 0, "stale": 0, "misses": 0, "not_modified": 0, "updated": 0, "errors": 0}
+        self.lock = threading.Lock()
+        self.pool = ThreadPoolExecutor(max_workers=workers)
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS centres ("
+            " state_id TEXT NOT NULL,"
+            " district_id TEXT NOT NULL,"
+            " city TEXT NOT NULL,"
+            " payload TEXT NOT NULL,"
+            " etag TEXT,"
+            " last_modified TEXT,"
+            " fetched_at REAL NOT NULL,"
+            " full_fetched_at REAL,"
+            " PRIMARY KEY (state_id, district_id, city))"
+        )
+        columns = [row[1] for row in self.conn.execute("PRAGMA table_info(centres)")]
+        if "full_fetched_at" not in columns:
+            # Older rows may only ever have been revalidated since; treating
+            # them as never fully fetched forces one full fetch each.
+            self.conn.execute("ALTER TABLE centres ADD COLUMN full_fetched_at REAL")
+        self.conn.commit()
+
+    def _entry(self, key):
+        with self.lock:
+            entry = self.memo.get(key)
+            if entry is None:
+                row = self.conn.execute(
+                    "SELECT payload, etag, last_modified, fetched_at, full_fetched_at FROM centres"
+                    " WHERE state_id = ? AND district_id = ? AND city = ?", key
+                ).fetchone()
+                if row is not None:
+                    centres = [Centre.from_dict(c) for c in json.loads(row[0])]
+                    entry = self.memo[key] = CityEntry(centres, row[1], row[2], row[3], row[4] or 0.0)
+            return entry
+
+    def _save(self, key, entry, payload=True):
+        with self.lock, instrument.timer("cache_save", cache="centre"):
+            self.memo[key] = entry
+            if payload:
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO centres"
+                    " (state_id, district_id, city, payload, etag, last_modified, fetched_at, full_fetched_at)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    key + (json.dumps([c.to_dict() for c in entry.centres], ensure_ascii=False),
+                           entry.etag, entry.last_modified, entry.fetched_at, entry.full_fetched_at),
+                )
+            else:
+                self.conn.execute(
+                    "UPDATE centres SET etag = ?, last_modified = ?, fetched_at = ?"
+                    " WHERE state_id = ? AND district_id = ? AND city = ?",
+                    (entry.etag, entry.last_modified, entry.fetched_at) + key,
+                )
+            self.conn.commit()
+
+    def _count(self, name):
+        instrument.count("centre_cache", result=name)
+        with self.lock:
+            self.counters[name] += 1
+
+    def _refresh(self, key, entry=None, progress=None):
+        # Conditional when we hold an entry whose last full fetch is within
+        # max_stale; returns the new entry. `progress` as in api.iter_centres.
+        conditional = entry is not None and time.time() - entry.full_fetched_at <= self.max_stale
+        etag, last_modified = (entry.etag, entry.last_modified) if conditional else (None, None)
+        centres, etag, last_modified = api.fetch_if_changed(*key, etag=etag, last_modified=last_modified,
+                                                            progress=progress)
+        now = time.time()
+        if centres is None:
+            entry = entry._replace(etag=etag, last_modified=last_modified, fetched_at=now)
+            self._save(key, entry, payload=False)
+            self._count("not_modified")
+        else:
+            entry = CityEntry(centres, etag, last_modified, now, now)
+            self._save(key, entry)
+            self._count("updated")
+        return entry
+
+    def _revalidate(self, key, entry):
+        try:
+            self._refresh(key, entry)
+        except api.CentreFetchError as e:
+            self._count("errors")
+            instrument.event("centre_refresh_failed", f"⚠️ Background refresh of {key[2]} failed; keeping cached centres: {e}",
+                             level="warning", city=key[2])
+        finally:
+            with self.lock:
+                self.inflight.discard(key)
+
+    def fetch(self, state_id, district_id, city, progress=None):
+        # Returns the city's centres; raises api.CentreFetchError only when
+        # nothing usable is cached. `progress(received, total)` follows a
+        # fetch the caller waits for, page by page.
+        key = (str(state_id), str(district_id), city)
+        entry = self._entry(key)
+        now = time.time()
+        # A list last fetched in full more than max_stale ago is as old as
+        # that, however recently page 1 was revalidated.
+        age = max(now - entry.fetched_at, now - entry.full_fetched_at) if entry else None
+        if entry is not None and now - entry.fetched_at <= self.max_age and age <= self.max_stale:
+            self._count("fresh")
+            return entry.centres
+        if entry is not None and age <= self.max_stale:
+            self._count("stale")
+            with self.lock:
+                start = key not in self.inflight
+                self.inflight.add(key)
+            if start:
+                self.pool.submit(self._revalidate, key, entry)
+            return entry.centres
+        self._count("misses")
+        try:
+            return self._refresh(key, progress=progress).centres
+        except api.CentreFetchError:
+            if entry is None:
+                raise
+            self._count("errors")
+            instrument.event("centre_refresh_failed", f"⚠️ Could not refresh {city}; using centres cached {(now - entry.fetched_at) / 86400:.0f} days ago.",
+                             level="warning", city=city, age_s=round(now - entry.fetched_at))
+            return entry.centres
+
+    def get(self, state_id, district_id, city, progress=None):
+        # fetch(), reporting failures the way api.fetch_centres does.
+        try:
+            return self.fetch(state_id, district_id, city, progress)
+        except api.CentreFetchError as e:
+            instrument.event("centre_fetch_failed", f"❌ {e}", level="error", city=city)
+            return []
+
+    def stats(self):
+        with self.lock:
+            out = dict(self.counters)
+        served = out["fresh"] + out["stale"] + out["misses"]
+        out["upstream_avoided"] = (out["fresh"] + out["not_modified"]) / served if served else 0.0
+        return out
+
+    def close(self, wait=True):
+        self.pool.shutdown(wait=wait)
+        with self.lock:
+            self.conn.close()
+
+
+_default = None
+_default_lock = threading.Lock()
+
+
+def default():
+    # Process-wide cache, opened on first use.
+    global _default
+    with _default_lock:
+        if _default is None:
+            _default = CentreCache()
+        return _default
@@ -1,79 +1,130 @@
-import json
-from api import fetch_centres
+import argparse
+
+import centre_cache
+import geocode
+import instrument
+from catalog import LocationCatalog
+from snapshot import city_key, load_snapshot
+from gazetteer import PRECISION_EXACT
 from utils import (
-    simplify_address,
     load_geocode_cache,
-    save_geocode_cache,
-    normalize,
-    geocode_with_cache,
-    find_nearest_centres,
+    locate,
+    GeocodedCentres,
 )
 
-def select_state(states_dict):
+def select_state(catalog):
     print("Select State:")
-    for sid, st in states_dict.items():
-        print(f"  {sid}: {st.get('state_name')}")
+    for sid in catalog.state_ids():
+        print(f"  {sid}: {catalog.state_name(sid)}")
     choice = input("Enter State ID: ").strip()
-    if choice not in states_dict:
+    if catalog.state_name(choice) is None:
         print("Invalid state ID.")
         return None
     return choice
 
-def select_district(districts_list):
+def select_district(catalog, state_id):
     print("Select District:")
-    for dist in districts_list:
-        print(f"  {dist['DistrictId']}: {dist['DistrictName']}")
+    for dist in catalog.districts_of(state_id):
+        print(f"  {dist.district_id}: {dist.name}")
     choice = input("Enter District ID: ").strip()
-    for dist in districts_list:
-        if dist["DistrictId"] == choice:
-            return dist
+    dist = catalog.district(choice)
+    if dist is not None and dist.state_id == state_id:
+        return dist
     print("Invalid district ID.")
     return None
 
-def select_city(city_list):
+def select_city(catalog, district):
     print("Available Cities:")
-    for city in city_list:
+    for city in district.cities:
         print(f"  - {city}")
     choice = input("Enter City name (approx): ").strip()
-    nchoice = normalize(choice)
-    city_map = {normalize(city): city for city in city_list}
-    if nchoice in city_map:
-        return city_map[nchoice]
-    for norm, orig in city_map.items():
-        if norm.startswith(nchoice) or nchoice.startswith(norm):
-            return orig
-    print("City not recognized.")
-    return None
+    city = catalog.match_city(district.district_id, choice)
+    if city:
+        return city
+    suggestions = catalog.suggest(choice, district_id=district.district_id)
+    if not suggestions:
+        print("City not recognized.")
+        return None
+    print("Did you mean:")
+    for idx, match in enumerate(suggestions, start=1):
+        print(f"  {idx}: {match.city} ({match.score:.2f})")
+    pick = input("Enter number (blank for 1): ").strip() or "1"
+    if not pick.isdigit() or not 1 <= int(pick) <= len(suggestions):
+        print("City not recognized.")
+        return None
+    return suggestions[int(pick) - 1].city
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Find the nearest IAPT centres.")
+    parser.add_argument("--batch", metavar="INPUT", help="CSV or JSONL of users (id, address, state, district, city, or lat/lon)")
+    parser.add_argument("--output", help="CSV or JSONL results file; an existing file is resumed")
+    parser.add_argument("--top-k", type=int, default=3, help="nearest centres to list")
+    parser.add_argument("--workers", type=int, default=None, help="concurrent geocoding lookups")
+    parser.add_argument("--rate", type=float, default=None, help="geocoding requests per second")
+    parser.add_argument("--fetch-workers", type=int, default=None, help="cities fetched concurrently")
+    parser.add_argument("--geocoder", choices=sorted(geocode.BACKENDS), default=None,
+                        help="geocoder backend (default: $GEOCODER_BACKEND or google)")
+    parser.add_argument("--metrics", metavar="FILE", default=instrument.OUTPUT,
+                        help="collect timers/counters/events and write them as JSON at exit")
+    parser.add_argument("--profile", choices=instrument.PROFILE_MODES, default=instrument.PROFILE,
+                        help="run under cProfile or tracemalloc and print the top entries")
+    parser.add_argument("--profile-output", metavar="FILE", default=instrument.PROFILE_OUTPUT,
+                        help="where to dump the profile (pstats or tracemalloc snapshot)")
+    return parser.parse_args()
+
+def run_batch(args, catalog):
+    import batch
+    output = args.output or args.batch.rsplit(".", 1)[0] + ".nearest." + batch.file_format(args.batch)
+    options = {"top_k": args.top_k}
+    for name in ("workers", "rate", "fetch_workers"):
+        if getattr(args, name) is not None:
+            options[name] = getattr(args, name)
+    batch.run_batch(args.batch, output, catalog, **options)
 
 def main():
-    with open("locations.json", "r", encoding="utf-8") as f:
-        states = json.load(f)
+    args = parse_args()
+    if args.metrics:
+        instrument.enable(args.metrics)
+    with instrument.profiling(args.profile, args.profile_output):
+        run(args)
+
+def run(args):
+    if args.geocoder:
+        geocode.set_backend(args.geocoder)
+    catalog = LocationCatalog.load()
+    if args.batch:
+        run_batch(args, catalog)
+        return
 
-    state_id = select_state(states)
+    state_id = select_state(catalog)
     if not state_id:
         return
-    state = states[state_id]
+    state_name = catalog.state_name(state_id)
 
-    districts = state.get("districts", [])
-    if not districts:
+    if not catalog.districts_of(state_id):
         print("No districts for selected state.")
         return
 
-    district = select_district(districts)
+    district = select_district(catalog, state_id)
     if not district:
         return
 
-    cities = district.get("cities", [])
-    if not cities:
+    if not district.cities:
         print("No cities in selected district.")
         return
 
-    city = select_city(cities)
+    city = select_city(catalog, district)
     if not city:
         return
 
-    print(f"\nFetching centres for {state['state_name']} / {district['DistrictName']} / {city} ...")
-    centres = fetch_centres(state_id, district["DistrictId"], city, length=100)
+    snapshot = load_snapshot()
+    key = city_key(state_id, district.district_id, city)
+    if snapshot and key in snapshot:
+        print(f"\nLoaded centres for {state_name} / {district.name} / {city} from snapshot.")
+        centres = snapshot[key]
+    else:
+        print(f"\nFetching centres for {state_name} / {district.name} / {city} ...")
+        centres = centre_cache.default().get(state_id, district.district_id, city)
     if not centres:
         print("No centres found.")
         return
@@ -83,36 +134,27 @@ def main():
 
     geocode_cache = load_geocode_cache()
 
-    state_name = state["state_name"]
-    district_name = district["DistrictName"]
-
-    valid_count = 0
-    for c in centres:
-        addr = c.address
-        if not addr or not addr.strip():
-            c.coords = None
-            continue
-
-        clean = simplify_address(addr)
-        full_addr = f"{clean}, {city}, {district_name}, {state_name}, India"
-        coords = geocode_with_cache(full_addr, geocode_cache)
-        if coords:
-            valid_count += 1
-        c.coords = coords
-
-    save_geocode_cache(geocode_cache)
+    # Centres geocode in the background while the user types their address.
+    located = GeocodedCentres(centres, city, district.name, state_name, geocode_cache).start()
 
     user_addr = input("\nEnter your current address or location: ").strip()
-    user_coords = geocode_with_cache(user_addr, geocode_cache)
-    if not user_coords:
+    place = locate(user_addr, geocode_cache, state_name, district.name, city)
+    if not place:
+        located.cancel()
         print("Could not geocode your location. Exiting.")
         return
 
-    print(f"Your coordinates: {user_coords}")
+    user_coords = place.coords
+    if place.precision == PRECISION_EXACT:
+        print(f"Your coordinates: {user_coords}")
+    else:
+        print(f"⚠️ Could not geocode your address; using the {place.precision} centre {user_coords} instead.")
 
-    save_geocode_cache(geocode_cache)
+    while not located.wait(1.0):
+        print(f"Geocoding centres: {located.done}/{located.total}")
+    print(f"Centres geocoded: {located.valid}/{total}")
 
-    nearest = find_nearest_centres(user_coords, centres, top_k=3)
+    nearest = located.nearest(user_coords, top_k=args.top_k)
     if not nearest:
         print("No centres with valid coordinates.")
         return
@@ -126,6 +168,8 @@ def main():
         print(f"  Coordinator: {getattr(c, 'coordinator_name', 'N/A')}")
         print(f"  Subject: {getattr(c, 'subject', 'N/A')}")
         print(f"  Distance: {dist:.2f} km")
+        if getattr(c, "precision", PRECISION_EXACT) not in (None, PRECISION_EXACT):
+            print(f"  (approximate: located at its {c.precision} centre)")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,166 @@
+import argparse
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urlparse
+
+import api
+import geocode
+import instrument
+from gazetteer import PRECISION_EXACT
+from models import Centre
+from snapshot import SNAPSHOT_FILE, city_key, save_snapshot
+from utils import TokenBucket, centre_address, geocode_many, load_geocode_cache
+
+LOCATIONS_FILE = "locations.json"
+CRAWL_WORKERS = 4
+CRAWL_RATE = 4.0  # requests per second per host
+
+_buckets = {}
+_buckets_lock = threading.Lock()
+
+
+def host_bucket(url, rate):
+    host = urlparse(url).netloc
+    with _buckets_lock:
+        if host not in _buckets:
+            _buckets[host] = TokenBucket(rate)
+        return _buckets[host]
+
+
+def progress_file(output):
+    return output + ".partial.jsonl"
+
+
+def load_progress(path):
+    # Cities already fetched by an interrupted run, one JSON line per city.
+    done = {}
+    if not os.path.exists(path):
+        return done
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                r = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # torn line from a crash; that city is refetched
+            done[city_key(r["state_id"], r["district_id"], r["city"])] = [Centre.from_dict(c) for c in r["centres"]]
+    return done
+
+
+def open_progress(path):
+    # Appends to the progress log, first ending a torn last line so the next
+    # record starts on a line of its own.
+    torn = False
+    if os.path.exists(path) and os.path.getsize(path) > 0:
+        with open(path, "rb") as f:
+            f.seek(-1, os.SEEK_END)
+            torn = f.read(1) != b"\n"
+    log = open(path, "a", encoding="utf-8")
+    if torn:
+        log.write("\n")
+    return log
+
+
+def iter_cities(states):
+    for state_id, state in states.items():
+        for dist in state.get("districts", []):
+            for city in dist.get("cities", []):
+                yield state_id, state["state_name"], dist["DistrictId"], dist["DistrictName"], city
+
+
+def fetch_city(state_id, district_id, city, rate):
+    # Every page request, not just each city, takes a token from the host's
+    # bucket, so large cities cannot burst past `rate`.
+    bucket = host_bucket(api.BASE_URL, rate)
+    return list(api.iter_centres(state_id, district_id, city, throttle=bucket.acquire))
+
+
+def crawl(states, output=SNAPSHOT_FILE, workers=CRAWL_WORKERS, rate=CRAWL_RATE, geocode=True):
+    partial = progress_file(output)
+    results = load_progress(partial)
+    names = {}
+    todo = []
+    for state_id, state_name, district_id, district_name, city in iter_cities(states):
+        key = city_key(state_id, district_id, city)
+        names[key] = (state_name, district_name)
+        if key not in results:
+            todo.append(key)
+
+    instrument.event("crawl_started", f"📍 {len(names)} cities, {len(results)} already fetched, {len(todo)} to go",
+                     cities=len(names), done=len(results), todo=len(todo))
+    failed = 0
+    with open_progress(partial) as log, ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(fetch_city, *key, rate): key for key in todo}
+        for n, future in enumerate(as_completed(futures), start=1):
+            state_id, district_id, city = key = futures[future]
+            try:
+                centres = future.result()
+            except Exception as e:
+                failed += 1
+                instrument.event("crawl_city_failed", f"❌ {city} ({state_id}/{district_id}): {e}", level="error",
+                                 state_id=state_id, district_id=district_id, city=city)
+                continue
+            results[key] = centres
+            log.write(json.dumps({
+                "state_id": state_id,
+                "district_id": district_id,
+                "city": city,
+                "centres": [c.to_dict() for c in centres],
+            }, ensure_ascii=False) + "\n")
+            log.flush()
+            instrument.count("crawl_centres", len(centres))
+            instrument.event("crawl_city", f"  ↳ [{n}/{len(todo)}] {city}: {len(centres)} centres", city=city,
+                             centres=len(centres))
+
+    if failed:
+        instrument.event("crawl_incomplete", f"⚠️ {failed} cities failed; run again to resume. Snapshot not written.",
+                         level="warning", failed=failed)
+        return None
+
+    if geocode:
+        # One batch across every city so the geocoder pool stays saturated.
+        todo = []
+        addresses = []
+        for key, centres in results.items():
+            state_name, district_name = names.get(key, ("", ""))
+            for c in centres:
+                if not c.coords:
+                    todo.append(c)
+                    addresses.append(centre_address(c, key[2], district_name, state_name))
+        instrument.event("crawl_geocoding", f"🌐 Geocoding {len(todo)} centres ...", centres=len(todo))
+        for c, coords in zip(todo, geocode_many(addresses, load_geocode_cache())):
+            c.coords = coords
+            c.precision = PRECISION_EXACT if coords else None
+
+    save_snapshot(results, output)
+    os.remove(partial)
+    total = sum(len(c) for c in results.values())
+    instrument.event("crawl_saved", f"\n✅ {total} centres from {len(results)} cities saved to '{output}'.",
+                     centres=total, cities=len(results))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Crawl every city in locations.json into a centre snapshot.")
+    parser.add_argument("--locations", default=LOCATIONS_FILE)
+    parser.add_argument("--output", default=SNAPSHOT_FILE)
+    parser.add_argument("--workers", type=int, default=CRAWL_WORKERS)
+    parser.add_argument("--rate", type=float, default=CRAWL_RATE, help="requests per second per host")
+    parser.add_argument("--base-url", default=None, help="override the IAPT host, e.g. a mock_upstream server")
+    parser.add_argument("--no-geocode", action="store_true")
+    parser.add_argument("--geocoder", choices=sorted(geocode.BACKENDS), default=None,
+                        help="geocoder backend (default: $GEOCODER_BACKEND or google)")
+    args = parser.parse_args()
+    if args.geocoder:
+        geocode.set_backend(args.geocoder)
+
+    if args.base_url:
+        api.BASE_URL = args.base_url
+    with open(args.locations, "r", encoding="utf-8") as f:
+        states = json.load(f)
+    crawl(states, args.output, args.workers, args.rate, geocode=not args.no_geocode)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional; utils falls back to the scalar path
+    np = None
+
+EARTH_RADIUS_KM = 6371.0
+
+
+def available():
+    return np is not None
+
+
+def haversine_many(points, lats, lons):
+    # Great-circle distances (km) from one (lat, lon) point, or an (m, 2)
+    # array of points, to every centre. Returns shape (n,) or (m, n).
+    pts = np.asarray(points, dtype=np.float64)
+    single = pts.ndim == 1
+    pts = np.radians(pts.reshape(-1, 2))
+    lat1 = pts[:, 0:1]
+    lon1 = pts[:, 1:2]
+    lat2 = np.radians(np.asarray(lats, dtype=np.float64))[None, :]
+    lon2 = np.radians(np.asarray(lons, dtype=np.float64))[None, :]
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    d = 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
+    return d[0] if single else d
+
+
+def top_k_indices(dist, top_k):
+    # Partial selection instead of a full sort. Everything tied with the k-th
+    # distance is kept, then the survivors are stable-sorted so ties resolve
+    # in input order, exactly as list.sort does in the scalar path.
+    n = len(dist)
+    k = min(top_k, n)
+    if k <= 0:
+        return np.empty(0, dtype=np.intp)
+    if k < n:
+        kth = np.partition(dist, k - 1)[k - 1]
+        candidates = np.flatnonzero(dist <= kth)
+    else:
+        candidates = np.arange(n)
+    order = np.argsort(dist[candidates], kind="stable")[:k]
+    return candidates[order]
+
+
+class CentreArrays:
+    # Geocoded centres with their coordinates held in contiguous float64
+    # arrays, so ranking is a handful of vector ops instead of a Python loop.
+
+    def __init__(self, centres):
+        self.centres = [c for c in centres if getattr(c, "coords", None)]
+        self.table = self.rows = None
+        coords = np.array([c.coords for c in self.centres], dtype=np.float64).reshape(-1, 2)
+        self.lats = np.ascontiguousarray(coords[:, 0])
+        self.lons = np.ascontiguousarray(coords[:, 1])
+
+    @classmethod
+    def from_table(cls, table):
+        # Reads a models.CentreTable's packed coordinate columns directly;
+        # row views are only made for the centres a query returns.
+        arrays = cls.__new__(cls)
+        lats = np.frombuffer(table.lat, dtype=np.float64)
+        arrays.centres = None
+        arrays.table = table
+        arrays.rows = np.flatnonzero(~np.isnan(lats))
+        arrays.lats = lats[arrays.rows]
+        arrays.lons = np.frombuffer(table.lon, dtype=np.float64)[arrays.rows]
+        return arrays
+
+    def __len__(self):
+        return len(self.lats)
+
+    def _centre(self, i):
+        if self.centres is None:
+            return self.table[int(self.rows[i])]
+        return self.centres[i]
+
+    def nearest(self, user_coords, top_k=1):
+        dist = haversine_many(user_coords, self.lats, self.lons)
+        return [(self._centre(i), float(dist[i])) for i in top_k_indices(dist, top_k)]
+
+    def nearest_many(self, points, top_k=1):
+        dist = haversine_many(points, self.lats, self.lons).reshape(-1, len(self))
+        return [
+            [(self._centre(i), float(row[i])) for i in top_k_indices(row, top_k)]
+            for row in dist
+        ]
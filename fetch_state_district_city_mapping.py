@@ -1,8 +1,19 @@
-import requests
+import argparse
+import asyncio
 import json
+import os
 import time
+import http_client
+import instrument
+
+BASE_URL = os.getenv("IAPT_BASE_URL", "https://iapt.manageexam.com")
+OUTPUT_FILE = "state_districts_cities.json"
+CONCURRENCY = 8
+RATE = 4.0  # starting requests per second; adapts between MIN_RATE and MAX_RATE
+MIN_RATE = 0.5
+MAX_RATE = 20.0
+ATTEMPTS = 4
 
-BASE_URL = "https://iapt.manageexam.com"
 HEADERS = {
     "accept": "*/*",
     "content-type": "application/json",
@@ -51,99 +62,265 @@ STATE_IDS = {
 }
 
 
+class FetchError(Exception):
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after  # seconds the server asked us to wait, if any
+
+
+def _get_list(url, params, retries=http_client.MAX_RETRIES):
+    resp = http_client.get(url, params=params, headers=HEADERS, retries=retries)
+    if resp.status_code != 200:
+        raise FetchError(f"HTTP {resp.status_code}", http_client.retry_after(resp))
+    data = resp.json()
+    if isinstance(data, dict) and "data" in data:
+        return data["data"]
+    elif isinstance(data, list):
+        return data
+    else:
+        return []
+
+
 def fetch_districts(state_id):
-    url = f"{BASE_URL}/Centre/Centre/GetCentreDistricts"
     try:
-        resp = requests.get(url, params={"stateId": state_id}, headers=HEADERS)
-        if resp.status_code == 200:
-            data = resp.json()
-            if isinstance(data, dict) and "data" in data:
-                return data["data"]
-            elif isinstance(data, list):
-                return data
-            else:
-                return []
-        else:
-            print(f"⚠️ Failed to fetch districts for state {state_id}: HTTP {resp.status_code}")
+        return _get_list(f"{BASE_URL}/Centre/Centre/GetCentreDistricts", {"stateId": state_id})
+    except FetchError as e:
+        instrument.event("mapping_fetch_failed", f"⚠️ Failed to fetch districts for state {state_id}: {e}",
+                         level="warning", state_id=state_id)
     except Exception as e:
-        print(f"❌ Exception fetching districts for state {state_id}: {e}")
+        instrument.event("mapping_fetch_failed", f"❌ Exception fetching districts for state {state_id}: {e}",
+                         level="error", state_id=state_id)
     return []
 
 
 def fetch_cities(district_id):
-    url = f"{BASE_URL}/Centre/Home/GetCentreCities"
     try:
-        resp = requests.get(url, params={"districtId": district_id}, headers=HEADERS)
-        if resp.status_code == 200:
-            data = resp.json()
-            if isinstance(data, dict) and "data" in data:
-                return data["data"]
-            elif isinstance(data, list):
-                return data
-            else:
-                return []
-        else:
-            print(f"⚠️ Failed to fetch cities for district {district_id}: HTTP {resp.status_code}")
+        return _get_list(f"{BASE_URL}/Centre/Home/GetCentreCities", {"districtId": district_id})
+    except FetchError as e:
+        instrument.event("mapping_fetch_failed", f"⚠️ Failed to fetch cities for district {district_id}: {e}",
+                         level="warning", district_id=district_id)
     except Exception as e:
-        print(f"❌ Exception fetching cities for district {district_id}: {e}")
+        instrument.event("mapping_fetch_failed", f"❌ Exception fetching cities for district {district_id}: {e}",
+                         level="error", district_id=district_id)
     return []
 
 
-def main():
-    mapping = {}
-
-    for state_id, state_name in STATE_IDS.items():
-        print(f"\n📍 Fetching districts for {state_name} (ID: {state_id})...")
-        state_data = {
-            "state_name": state_name,
-            "districts": []
-        }
-
-        districts = fetch_districts(state_id)
-        if not districts:
-            print(f"⚠️ No districts found for state {state_name} ({state_id})")
-            continue
-
-        for dist in districts:
-            # Use actual keys for district info
+def city_names(cities):
+    names = []
+    for c in cities or []:
+        if isinstance(c, dict):
+            name = c.get("Text") or c.get("text")
+            if name:
+                names.append(name)
+        elif isinstance(c, str):
+            names.append(c)
+    return names
+
+
+class AdaptiveRateLimiter:
+    # Paces requests at `rate` per second. Every success nudges the rate up
+    # (additive increase); every error halves it (multiplicative decrease),
+    # so the crawler backs off when the server struggles instead of sleeping
+    # a fixed amount between calls.
+
+    def __init__(self, rate=RATE, min_rate=MIN_RATE, max_rate=MAX_RATE, increase=0.5):
+        self.rate = rate
+        self.min_rate = min_rate
+        self.max_rate = max(max_rate, rate)
+        self.increase = increase
+        self.next_at = 0.0
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self.lock:
+            now = time.monotonic()
+            wait = self.next_at - now
+            self.next_at = max(now, self.next_at) + 1.0 / self.rate
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def success(self):
+        self.rate = min(self.max_rate, self.rate + self.increase)
+
+    def failure(self):
+        self.rate = max(self.min_rate, self.rate / 2)
+
+    def defer(self, seconds):
+        # Honours a Retry-After: no request goes out for `seconds`.
+        self.next_at = max(self.next_at, time.monotonic() + seconds)
+
+
+def checkpoint_file(output):
+    return output + ".partial.jsonl"
+
+
+def load_checkpoint(path):
+    # Replays the append-only progress log of an interrupted run.
+    districts, cities = {}, {}
+    if not os.path.exists(path):
+        return districts, cities
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                r = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # torn line from a crash; that entry is refetched
+            if "state_id" in r:
+                districts[str(r["state_id"])] = r["districts"]
+            else:
+                cities[str(r["district_id"])] = r["cities"]
+    return districts, cities
+
+
+def open_checkpoint(path):
+    # Appends to the log, first ending a torn last line so the next entry
+    # starts on a line of its own.
+    torn = False
+    if os.path.exists(path) and os.path.getsize(path) > 0:
+        with open(path, "rb") as f:
+            f.seek(-1, os.SEEK_END)
+            torn = f.read(1) != b"\n"
+    log = open(path, "a", encoding="utf-8")
+    if torn:
+        log.write("\n")
+    return log
+
+
+class MappingCrawler:
+    def __init__(self, checkpoint, concurrency=CONCURRENCY, rate=RATE):
+        self.checkpoint = checkpoint
+        self.concurrency = concurrency
+        self.rate = rate
+        self.districts, self.cities = load_checkpoint(checkpoint)
+        self.failures = 0
+
+    def record(self, entry):
+        self.log.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        self.log.flush()
+
+    async def fetch(self, url, params):
+        last = None
+        for _ in range(ATTEMPTS):
+            async with self.semaphore:
+                await self.limiter.acquire()
+                try:
+                    # http_client's own retries are off (the limiter paces
+                    # retries), so its Retry-After handling is redone here.
+                    data = await asyncio.to_thread(_get_list, url, params, 0)
+                except Exception as e:
+                    self.limiter.failure()
+                    delay = getattr(e, "retry_after", None)
+                    if delay:
+                        self.limiter.defer(min(http_client.BACKOFF_MAX, delay))
+                    last = e
+                    continue
+            self.limiter.success()
+            return data
+        raise last
+
+    async def crawl_district(self, district_id, district_name):
+        if district_id in self.cities:
+            return
+        try:
+            cities = await self.fetch(f"{BASE_URL}/Centre/Home/GetCentreCities", {"districtId": district_id})
+        except Exception as e:
+            self.failures += 1
+            instrument.event("mapping_fetch_failed", f"❌ Cities for district {district_name} ({district_id}): {e}",
+                             level="error", district_id=district_id)
+            return
+        names = city_names(cities)
+        if not names:
+            instrument.event("mapping_empty", f"    ⚠️ No cities found for district {district_name}", level="warning",
+                             district_id=district_id)
+        self.cities[district_id] = names
+        self.record({"district_id": district_id, "cities": names})
+
+    async def crawl_state(self, state_id, state_name):
+        key = str(state_id)
+        if key not in self.districts:
+            try:
+                districts = await self.fetch(f"{BASE_URL}/Centre/Centre/GetCentreDistricts", {"stateId": state_id})
+            except Exception as e:
+                self.failures += 1
+                instrument.event("mapping_fetch_failed", f"❌ Districts for {state_name} ({state_id}): {e}",
+                                 level="error", state_id=key)
+                return
+            self.districts[key] = districts
+            self.record({"state_id": key, "districts": districts})
+            instrument.event("mapping_state", f"📍 {state_name}: {len(districts)} districts", state_id=key,
+                             districts=len(districts))
+
+        tasks = []
+        for dist in self.districts[key]:
             district_id = dist.get("Value")
             district_name = dist.get("Text")
-
             if district_id is None or district_name is None:
-                print(f"⚠️ Missing district ID or name, skipping district: {dist}")
+                instrument.event("mapping_skipped", f"⚠️ Missing district ID or name, skipping district: {dist}",
+                                 level="warning", state_id=key)
                 continue
+            tasks.append(self.crawl_district(str(district_id), district_name))
+        await asyncio.gather(*tasks)
 
-            print(f"  ↳ District: {district_name} (ID: {district_id})")
-
-            cities = fetch_cities(district_id)
-            city_names = []
-            if cities:
-                for c in cities:
-                    if isinstance(c, dict):
-                        name = c.get("Text") or c.get("text")
-                        if name:
-                            city_names.append(name)
-                    elif isinstance(c, str):
-                        city_names.append(c)
-            else:
-                print(f"    ⚠️ No cities found for district {district_name}")
+    async def run(self, states):
+        self.semaphore = asyncio.Semaphore(self.concurrency)
+        self.limiter = AdaptiveRateLimiter(self.rate)
+        with open_checkpoint(self.checkpoint) as self.log:
+            await asyncio.gather(*(self.crawl_state(sid, name) for sid, name in states.items()))
 
-            state_data["districts"].append({
-                "DistrictId": district_id,
-                "DistrictName": district_name,
-                "cities": city_names
-            })
+    def mapping(self, states):
+        mapping = {}
+        for state_id, state_name in states.items():
+            districts = self.districts.get(str(state_id))
+            if not districts:
+                instrument.event("mapping_empty", f"⚠️ No districts found for state {state_name} ({state_id})",
+                                 level="warning", state_id=str(state_id))
+                continue
+            state_data = {"state_name": state_name, "districts": []}
+            for dist in districts:
+                district_id = dist.get("Value")
+                district_name = dist.get("Text")
+                if district_id is None or district_name is None:
+                    continue
+                state_data["districts"].append({
+                    "DistrictId": district_id,
+                    "DistrictName": district_name,
+                    "cities": self.cities.get(str(district_id), []),
+                })
+            mapping[state_id] = state_data
+        return mapping
 
-            time.sleep(0.3)
 
-        mapping[state_id] = state_data
-        time.sleep(0.5)
+def crawl(output=OUTPUT_FILE, concurrency=CONCURRENCY, rate=RATE, states=STATE_IDS):
+    checkpoint = checkpoint_file(output)
+    crawler = MappingCrawler(checkpoint, concurrency, rate)
+    asyncio.run(crawler.run(states))
+    if crawler.failures:
+        instrument.event("mapping_incomplete", f"\n⚠️ {crawler.failures} requests failed; run again to resume from '{checkpoint}'.",
+                         level="warning", failures=crawler.failures)
+        return None
 
-    with open("state_districts_cities.json", "w", encoding="utf-8") as f:
+    mapping = crawler.mapping(states)
+    tmp = output + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
         json.dump(mapping, f, indent=2, ensure_ascii=False)
+    os.replace(tmp, output)
+    os.remove(checkpoint)
+    instrument.event("mapping_saved", f"\n✅ All data saved to '{output}'.", states=len(mapping))
+    return mapping
 
-    print("\n✅ All data saved to 'state_districts_cities.json'.")
 
+def main():
+    global BASE_URL
+    parser = argparse.ArgumentParser(description="Crawl the state/district/city mapping from the IAPT site.")
+    parser.add_argument("--output", default=OUTPUT_FILE)
+    parser.add_argument("--concurrency", type=int, default=CONCURRENCY)
+    parser.add_argument("--rate", type=float, default=RATE, help="starting requests per second")
+    parser.add_argument("--base-url", default=None, help="override the IAPT host, e.g. a mock_upstream server")
+    args = parser.parse_args()
+    if args.base_url:
+        BASE_URL = args.base_url
+    crawl(args.output, args.concurrency, args.rate)
 
 
-main()
+if __name__ == "__main__":
+    main()
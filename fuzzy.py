@@ -0,0 +1,81 @@
+import heapq
+import re
+from collections import defaultdict, namedtuple
+
+Match = namedtuple("Match", ["city", "state_id", "district_id", "score"])
+
+_NON_ALNUM = re.compile(r"[^a-z0-9]+")
+_REPEATS = re.compile(r"([a-z])\1+")
+# Spelling variants common in romanized Indian place names.
+_FOLDS = (("th", "t"), ("dh", "d"), ("bh", "b"), ("kh", "k"), ("gh", "g"),
+          ("ph", "f"), ("ee", "i"), ("oo", "u"), ("w", "v"), ("z", "j"), ("y", "i"))
+
+
+def fold(name):
+    s = _NON_ALNUM.sub(" ", name.lower()).strip()
+    for a, b in _FOLDS:
+        s = s.replace(a, b)
+    return _REPEATS.sub(r"\1", s)
+
+
+def trigrams(folded):
+    padded = f"  {folded} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class CityMatcher:
+    # Typo-tolerant city lookup over a trigram inverted index. Names are
+    # folded first (case, punctuation, doubled letters, th/t style variants),
+    # then scored by the Dice coefficient of their trigram sets, with a bonus
+    # for prefix matches so partially typed names rank well.
+
+    def __init__(self, entries):
+        # `entries` yields (city, state_id, district_id).
+        self.entries = []
+        self.folded = []
+        self.sizes = []
+        self.index = defaultdict(list)
+        for city, state_id, district_id in entries:
+            i = len(self.entries)
+            f = fold(city)
+            grams = trigrams(f)
+            self.entries.append((city, state_id, district_id))
+            self.folded.append(f)
+            self.sizes.append(len(grams))
+            for g in grams:
+                self.index[g].append(i)
+
+    @classmethod
+    def from_catalog(cls, catalog):
+        return cls(
+            (city, district.state_id, district.district_id)
+            for district in catalog.districts.values()
+            for city in district.cities
+        )
+
+    def search(self, query, limit=5, state_id=None, district_id=None, min_score=0.3):
+        q = fold(query)
+        if not q:
+            return []
+        qgrams = trigrams(q)
+        shared = defaultdict(int)
+        for g in qgrams:
+            for i in self.index.get(g, ()):
+                shared[i] += 1
+
+        scored = []
+        for i, n in shared.items():
+            city, sid, did = self.entries[i]
+            if (state_id is not None and sid != state_id) or (district_id is not None and did != district_id):
+                continue
+            folded = self.folded[i]
+            if folded == q:
+                score = 1.0
+            else:
+                score = 2.0 * n / (len(qgrams) + self.sizes[i])
+                if folded.startswith(q):
+                    score = min(0.99, score + 0.3)
+            if score >= min_score:
+                scored.append((score, city, i))
+        best = heapq.nlargest(limit, scored, key=lambda x: (x[0], -x[2]))
+        return [Match(city, *self.entries[i][1:], round(score, 3)) for score, city, i in best]
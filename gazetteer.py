@@ -0,0 +1,265 @@
+import argparse
+import json
+import os
+import threading
+from collections import namedtuple
+
+import instrument
+from catalog import LocationCatalog, LOCATIONS_FILE
+
+GAZETTEER_FILE = "gazetteer.json"
+GAZETTEER_VERSION = 1
+
+# How close a coordinate is to the place asked for. Geocoder hits are
+# "exact"; the gazetteer only ever answers with a centroid.
+PRECISION_EXACT = "exact"
+PRECISION_CITY = "city"
+PRECISION_DISTRICT = "district"
+PRECISION_STATE = "state"
+
+Place = namedtuple("Place", ["coords", "precision"])
+
+# A state centroid says nothing about which of a city's centres is nearer
+# (every centre and the user collapse onto one point at "0 km"), so only
+# these precisions are ever used for ranking. The bundled file only has
+# state centroids; districts and cities come from `build`, either derived
+# offline from a crawled snapshot (--from-snapshot) or geocoded, which
+# works without an API key through --geocoder nominatim.
+RANKABLE = frozenset({PRECISION_EXACT, PRECISION_CITY, PRECISION_DISTRICT})
+
+
+def rankable(place):
+    return place is not None and place.precision in RANKABLE
+
+
+def approximate(centre):
+    # True for centres placed at a gazetteer centroid rather than geocoded;
+    # centres without a precision (older snapshots) count as geocoded.
+    return getattr(centre, "precision", None) not in (None, PRECISION_EXACT)
+
+
+def _norm(s):
+    return " ".join((s or "").replace(".", " ").split()).lower()
+
+
+def city_id(district_id, city):
+    return f"{district_id}/{city}"
+
+
+class Gazetteer:
+    # Offline (state, district, city) -> centroid table. Coordinates come
+    # from gazetteer.json: state centroids are bundled, district and city
+    # centroids are filled in by `build` or `derive`. Lookups fall back to the most
+    # precise level known, so every place in locations.json resolves to at
+    # least its state's centroid.
+
+    def __init__(self, catalog, states=None, districts=None, cities=None):
+        self.catalog = catalog
+        self.states = states or {}
+        self.districts = districts or {}
+        self.cities = cities or {}
+        self.state_by_name = {}
+        self.districts_by_name = {}
+        self.cities_by_name = {}
+        for sid in catalog.state_ids():
+            self.state_by_name[_norm(catalog.state_name(sid))] = sid
+            for d in catalog.districts_of(sid):
+                self.districts_by_name.setdefault(_norm(d.name), []).append(d)
+                for city in d.cities:
+                    self.cities_by_name.setdefault(_norm(city), []).append((d, city))
+
+    @classmethod
+    def load(cls, path=GAZETTEER_FILE, catalog=None):
+        if catalog is None:
+            catalog = LocationCatalog.load(LOCATIONS_FILE) if os.path.exists(LOCATIONS_FILE) else LocationCatalog()
+        data = {}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") != GAZETTEER_VERSION:
+                instrument.event("gazetteer_ignored", f"⚠️ Ignoring gazetteer '{path}' with unsupported version {data.get('version')}",
+                                 level="warning", path=path)
+                data = {}
+        coords = lambda table: {k: (v["lat"], v["lon"]) for k, v in data.get(table, {}).items()}
+        return cls(catalog, coords("states"), coords("districts"), coords("cities"))
+
+    def save(self, path=GAZETTEER_FILE):
+        entry = lambda coords, **extra: dict(extra, lat=coords[0], lon=coords[1])
+        payload = {
+            "version": GAZETTEER_VERSION,
+            "states": {sid: entry(c, name=self.catalog.state_name(sid)) for sid, c in self.states.items()},
+            "districts": {did: entry(c) for did, c in self.districts.items()},
+            "cities": {cid: entry(c) for cid, c in self.cities.items()},
+        }
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(payload, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, path)
+
+    def resolve(self, state_id, district_id=None, city=None):
+        # Most precise centroid known for the given IDs, or None.
+        if district_id is not None and city:
+            coords = self.cities.get(city_id(district_id, city))
+            if coords:
+                return Place(coords, PRECISION_CITY)
+        if district_id is not None:
+            coords = self.districts.get(str(district_id))
+            if coords:
+                return Place(coords, PRECISION_DISTRICT)
+            if state_id is None:
+                district = self.catalog.district(str(district_id))
+                state_id = district.state_id if district else None
+        coords = self.states.get(str(state_id)) if state_id is not None else None
+        return Place(coords, PRECISION_STATE) if coords else None
+
+    def resolve_names(self, state_name, district_name=None, city=None):
+        sid = self.state_by_name.get(_norm(state_name))
+        district = None
+        for d in self.districts_by_name.get(_norm(district_name), ()):
+            if sid is None or d.state_id == sid:
+                district = d
+                break
+        if district is None:
+            return self.resolve(sid) if sid else None
+        name = self.catalog.match_city(district.district_id, city) if city else None
+        return self.resolve(district.state_id, district.district_id, name)
+
+    def locate(self, address):
+        # Best effort for free text such as "12 MG Road, Indore, Madhya
+        # Pradesh": comma-separated parts are matched against state, district
+        # and city names, and the most specific consistent match wins.
+        parts = [_norm(p) for p in (address or "").split(",")]
+        parts = [p for p in parts if p and p != "india"]
+        sid = next((self.state_by_name[p] for p in reversed(parts) if p in self.state_by_name), None)
+        in_state = lambda d: sid is None or d.state_id == sid
+
+        for p in reversed(parts):
+            hits = [(d, c) for d, c in self.cities_by_name.get(p, ()) if in_state(d)]
+            districts = {d.district_id for d, _c in hits}
+            # An ambiguous city name is narrowed by a district named elsewhere.
+            named = {d.district_id for q in parts for d in self.districts_by_name.get(q, ()) if in_state(d)}
+            if len(districts) > 1 and districts & named:
+                hits = [(d, c) for d, c in hits if d.district_id in named]
+                districts &= named
+            if len(districts) == 1:
+                d, c = hits[0]
+                return self.resolve(d.state_id, d.district_id, c)
+        for p in reversed(parts):
+            hits = [d for d in self.districts_by_name.get(p, ()) if in_state(d)]
+            if len(hits) == 1:
+                return self.resolve(hits[0].state_id, hits[0].district_id)
+        return self.resolve(sid) if sid else None
+
+
+_default = None
+_default_lock = threading.Lock()
+
+
+def default():
+    # Process-wide gazetteer, loaded on first use.
+    global _default
+    with _default_lock:
+        if _default is None:
+            _default = Gazetteer.load()
+        return _default
+
+
+def build(gazetteer, cache, levels=("district", "city"), **kwargs):
+    # Fills in district and city centroids by geocoding "CITY, DISTRICT,
+    # STATE, India" style names through the usual cached, rate-limited path.
+    # Places already present are kept, so an interrupted build resumes.
+    from utils import geocode_many
+
+    catalog = gazetteer.catalog
+    todo = []
+    for did, d in catalog.districts.items():
+        state = catalog.state_name(d.state_id)
+        if "district" in levels and did not in gazetteer.districts:
+            todo.append((gazetteer.districts, did, f"{d.name}, {state}, India"))
+        if "city" in levels:
+            for city in d.cities:
+                cid = city_id(did, city)
+                if cid not in gazetteer.cities:
+                    todo.append((gazetteer.cities, cid, f"{city}, {d.name}, {state}, India"))
+    instrument.event("gazetteer_build", f"🌐 Geocoding {len(todo)} places ...", places=len(todo))
+    results = geocode_many([addr for _t, _k, addr in todo], cache, **kwargs)
+    found = 0
+    for (table, key, _addr), coords in zip(todo, results):
+        if coords:
+            table[key] = tuple(coords)
+            found += 1
+    return found, len(todo)
+
+
+def derive(gazetteer, cities, levels=("district", "city")):
+    # Fills in district and city centroids without a geocoder, as the mean
+    # of the geocoded centres in each (`cities` maps city_key -> centres, as
+    # in a snapshot). Centres placed at a centroid are left out, and places
+    # already present are kept. Returns how many places were added.
+    sums = {}
+
+    def add(table, key, coords):
+        entry = sums.setdefault((id(table), key), [table, 0.0, 0.0, 0])
+        entry[1] += coords[0]
+        entry[2] += coords[1]
+        entry[3] += 1
+
+    for (_state_id, district_id, city), centres in cities.items():
+        for c in centres:
+            if not getattr(c, "coords", None) or approximate(c):
+                continue
+            if "district" in levels and str(district_id) not in gazetteer.districts:
+                add(gazetteer.districts, str(district_id), c.coords)
+            if "city" in levels and city_id(district_id, city) not in gazetteer.cities:
+                add(gazetteer.cities, city_id(district_id, city), c.coords)
+    for (_table_id, key), (table, lat, lon, n) in sums.items():
+        table[key] = (round(lat / n, 6), round(lon / n, 6))
+    return len(sums)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or query the offline gazetteer.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    b = sub.add_parser("build", help="geocode district/city centroids into the gazetteer file")
+    b.add_argument("--levels", default="district,city")
+    b.add_argument("--from-snapshot", metavar="PATH",
+                   help="derive centroids from a crawled snapshot's centres instead of geocoding")
+    b.add_argument("--geocoder", default=None,
+                   help="geocoder backend, e.g. nominatim (no API key); default $GEOCODER_BACKEND or google")
+    q = sub.add_parser("locate", help="resolve an address offline")
+    q.add_argument("address")
+    parser.add_argument("--path", default=GAZETTEER_FILE)
+    args = parser.parse_args()
+
+    gazetteer = Gazetteer.load(args.path)
+    if args.command == "locate":
+        place = gazetteer.locate(args.address)
+        print(f"📍 {place.coords} ({place.precision})" if place else "No match.")
+        return
+
+    levels = tuple(args.levels.split(","))
+    if args.from_snapshot:
+        from snapshot import load_snapshot
+        cities = load_snapshot(args.from_snapshot)
+        if not cities:
+            print(f"❌ No usable snapshot at '{args.from_snapshot}'.")
+            return
+        added = derive(gazetteer, cities, levels)
+        gazetteer.save(args.path)
+        print(f"✅ {added} places derived from '{args.from_snapshot}' into '{args.path}'.")
+        return
+
+    import geocode
+    from utils import load_geocode_cache
+    options = {}
+    if args.geocoder:
+        geocode.set_backend(args.geocoder)
+        if args.geocoder == "nominatim":
+            options["rate"] = geocode.NOMINATIM_RATE
+    found, total = build(gazetteer, load_geocode_cache(), levels=levels, **options)
+    gazetteer.save(args.path)
+    print(f"✅ {found}/{total} places geocoded into '{args.path}'.")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,29 +1,191 @@
 import os
-from geopy.geocoders import GoogleV3
-from geopy.exc import GeocoderTimedOut, GeocoderServiceError
+import threading
+import time
 
-# Replace YOUR_API_KEY with your actual Google Maps API key
-geolocator = GoogleV3(api_key=os.getenv("API_KEY"), timeout=10)
+import instrument
 
-def geocode_address(address: str):
+# Replace YOUR_API_KEY with your actual Google Maps API key. Without one,
+# every Google lookup fails as transient and callers fall back to the
+# gazetteer.
+API_KEY = os.getenv("API_KEY")
+GEOCODER_BACKEND = os.getenv("GEOCODER_BACKEND", "google")
+NOMINATIM_USER_AGENT = os.getenv("NOMINATIM_USER_AGENT", "IAPT-Centre-Finder/1.0")
+NOMINATIM_RATE = 1.0  # requests per second
+
+
+class TransientGeocodeError(Exception):
+    # Raised for failures worth retrying later (timeouts, quota, outages),
+    # as opposed to an address Google simply could not find.
+    pass
+
+
+# Backends turn an address into (lat, lon), return None when the place is
+# unknown, and raise TransientGeocodeError for failures worth retrying.
+# They are registered by name and picked with GEOCODER_BACKEND or
+# set_backend(); `lookup` always goes through the active one.
+
+BACKENDS = {}
+
+
+def register(name):
+    def decorator(factory):
+        BACKENDS[name] = factory
+        return factory
+    return decorator
+
+
+@register("google")
+class GoogleBackend:
+    name = "google"
+
+    def __init__(self, api_key=None, timeout=10):
+        self.api_key = api_key or API_KEY
+        self.timeout = timeout
+        self.client = None
+        self.lock = threading.Lock()
+
+    def geolocator(self):
+        # Built on first use, so selecting another backend never needs a key
+        # and geopy is only imported once Google is actually called.
+        with self.lock:
+            if self.client is None:
+                if not self.api_key:
+                    raise TransientGeocodeError("API_KEY is not set")
+                from geopy.geocoders import GoogleV3
+                self.client = GoogleV3(api_key=self.api_key, timeout=self.timeout)
+            return self.client
+
+    def lookup(self, address):
+        geolocator = self.geolocator()
+        from geopy.exc import GeocoderTimedOut, GeocoderServiceError
+        try:
+            location = geolocator.geocode(address)
+        except GeocoderTimedOut as e:
+            raise TransientGeocodeError(f"Geocoding timed out for address: {address}") from e
+        except GeocoderServiceError as e:
+            raise TransientGeocodeError(f"Geocoder service error: {e}") from e
+
+        if location:
+            instrument.event("geocode_found", f"Found: {location.address}", address=address)
+            return (location.latitude, location.longitude)
+        else:
+            instrument.event("geocode_not_found", f"No result found for address: '{address}'", address=address)
+            return None
+
+
+@register("nominatim")
+class NominatimBackend(GoogleBackend):
+    # OpenStreetMap's public geocoder: needs no key, but its usage policy
+    # allows one request per second (NOMINATIM_RATE), so it suits one-off
+    # jobs such as `gazetteer.py build` rather than live lookups.
+    name = "nominatim"
+
+    def __init__(self, user_agent=NOMINATIM_USER_AGENT, timeout=10):
+        self.user_agent = user_agent
+        self.timeout = timeout
+        self.client = None
+        self.lock = threading.Lock()
+
+    def geolocator(self):
+        with self.lock:
+            if self.client is None:
+                from geopy.geocoders import Nominatim
+                self.client = Nominatim(user_agent=self.user_agent, timeout=self.timeout)
+            return self.client
+
+
+@register("gazetteer")
+class GazetteerBackend:
+    # Offline centroids only; see gazetteer.py. A state centroid counts as
+    # not found: backends return bare coordinates, which callers treat as
+    # exact, and every address in the state would land on one point.
+    name = "gazetteer"
+
+    def lookup(self, address):
+        import gazetteer
+        place = gazetteer.default().locate(address)
+        return place.coords if gazetteer.rankable(place) else None
+
+
+@register("fake")
+class FakeBackend:
+    # Deterministic stand-in for benchmarks: every address maps to a fixed
+    # point inside India derived from a hash of (seed, address), and the
+    # same addresses fail or go unfound on every run. Latency is slept per
+    # call, so concurrency and rate limits behave as with a real service.
+    name = "fake"
+
+    def __init__(self, latency=None, failure_rate=None, not_found_rate=None, seed=None):
+        env = lambda name, default: float(os.getenv(f"FAKE_GEOCODER_{name}", default))
+        self.latency = env("LATENCY", "0.05") if latency is None else latency
+        self.failure_rate = env("FAILURE_RATE", "0") if failure_rate is None else failure_rate
+        self.not_found_rate = env("NOT_FOUND_RATE", "0") if not_found_rate is None else not_found_rate
+        self.seed = os.getenv("FAKE_GEOCODER_SEED", "0") if seed is None else str(seed)
+        self.calls = 0
+        self.lock = threading.Lock()  # lookup() runs on geocode_many's worker threads
+
+    def _draws(self, address):
+        import hashlib
+        digest = hashlib.blake2b(f"{self.seed}\0{address}".encode("utf-8"), digest_size=16).digest()
+        return [int.from_bytes(digest[i:i + 4], "big") / 2**32 for i in range(0, 16, 4)]
+
+    def lookup(self, address):
+        with self.lock:
+            self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        fail, missing, lat, lon = self._draws(address.strip().lower())
+        if fail < self.failure_rate:
+            raise TransientGeocodeError(f"Fake geocoder failure for address: {address}")
+        if missing < self.not_found_rate:
+            return None
+        return (round(8.0 + lat * 27.0, 6), round(69.0 + lon * 27.0, 6))
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def set_backend(backend=None, **options):
+    # Accepts a registered name or a ready-made backend object.
+    global _backend
+    if backend is None or isinstance(backend, str):
+        name = backend or GEOCODER_BACKEND
+        if name not in BACKENDS:
+            raise ValueError(f"Unknown geocoder backend {name!r}; choose from {sorted(BACKENDS)}")
+        backend = BACKENDS[name](**options)
+    with _backend_lock:
+        _backend = backend
+    return backend
+
+
+def get_backend():
+    with _backend_lock:
+        backend = _backend
+    return backend or set_backend()
+
+
+def lookup(address: str):
     if not address or address.strip() == "":
         return None
+    backend = get_backend()
+    name = getattr(backend, "name", "custom")
     try:
-        location = geolocator.geocode(address)
-    except GeocoderTimedOut:
-        print(f"Geocoding timed out for address: {address}")
-        return None
-    except GeocoderServiceError as e:
-        print(f"Geocoder service error: {e}")
+        with instrument.timer("geocode_lookup", backend=name):
+            coords = backend.lookup(address)
+    except Exception:
+        instrument.count("geocode_lookups", backend=name, result="error")
+        raise
+    instrument.count("geocode_lookups", backend=name, result="found" if coords else "not_found")
+    return coords
+
+
+def geocode_address(address: str):
+    try:
+        return lookup(address)
+    except TransientGeocodeError as e:
+        instrument.event("geocode_failed", str(e), level="warning", address=address)
         return None
     except Exception as e:
-        print(f"Unexpected error: {e}")
+        instrument.event("geocode_failed", f"Unexpected error: {e}", level="error", address=address)
         return None
-
-    if location:
-        print(f"Found: {location.address}")
-        return (location.latitude, location.longitude)
-    else:
-        print(f"No result found for address: '{address}'")
-        return None
-
@@ -0,0 +1,203 @@
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+import instrument
+
+GEOCODE_CACHE_DB = "geocode_cache.sqlite"
+
+STATUS_OK = "ok"
+STATUS_NOT_FOUND = "not_found"
+STATUS_ERROR = "error"
+
+NOT_FOUND_TTL = float(os.getenv("GEOCODE_NOT_FOUND_TTL", str(30 * 24 * 3600)))
+ERROR_TTL = float(os.getenv("GEOCODE_ERROR_TTL", "3600"))
+MEMORY_ENTRIES = int(os.getenv("GEOCODE_MEMORY_ENTRIES", "10000"))
+
+CacheEntry = namedtuple("CacheEntry", ["coords", "status", "updated_at"])
+
+
+class GeocodeCache:
+    # Dict-like geocode cache backed by SQLite in WAL mode. Entries are read
+    # lazily on lookup and every assignment is committed straight away, so a
+    # crash mid-batch only loses the lookup in flight. WAL lets the CLI and the
+    # GUI read concurrently while one of them writes.
+    #
+    # Each entry records whether the lookup succeeded, found nothing, or failed
+    # transiently. Negative and failed entries expire after their own TTL so
+    # they get retried; recently used entries are kept in a bounded LRU.
+
+    def __init__(self, path=GEOCODE_CACHE_DB, not_found_ttl=NOT_FOUND_TTL,
+                 error_ttl=ERROR_TTL, ok_ttl=None, memory_entries=MEMORY_ENTRIES):
+        self.path = path
+        self.ttls = {
+            STATUS_OK: ok_ttl,
+            STATUS_NOT_FOUND: not_found_ttl,
+            STATUS_ERROR: error_ttl,
+        }
+        self.memory_entries = memory_entries
+        self.memo = OrderedDict()
+        self.counters = {"hits": 0, "misses": 0, "expired": 0, "evictions": 0, "writes": 0}
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS geocode ("
+            " key TEXT PRIMARY KEY,"
+            " lat REAL,"
+            " lon REAL,"
+            " updated_at REAL NOT NULL)"
+        )
+        columns = [row[1] for row in self.conn.execute("PRAGMA table_info(geocode)")]
+        if "status" not in columns:
+            self.conn.execute(f"ALTER TABLE geocode ADD COLUMN status TEXT NOT NULL DEFAULT '{STATUS_OK}'")
+            self.conn.execute("UPDATE geocode SET status = ? WHERE lat IS NULL", (STATUS_NOT_FOUND,))
+        self.conn.commit()
+
+    def _expired(self, entry, now=None):
+        ttl = self.ttls.get(entry.status)
+        if ttl is None:
+            return False
+        return (now or time.time()) - entry.updated_at > ttl
+
+    def _remember(self, key, entry):
+        self.memo[key] = entry
+        self.memo.move_to_end(key)
+        while len(self.memo) > self.memory_entries:
+            self.memo.popitem(last=False)
+            self.counters["evictions"] += 1
+
+    def entry(self, key, count=True):
+        # Returns the live CacheEntry for `key`, or None if absent or expired.
+        # count=False leaves the hit/miss counters alone (internal probes).
+        with self.lock:
+            entry = self.memo.get(key)
+            if entry is not None:
+                self.memo.move_to_end(key)
+            else:
+                row = self.conn.execute(
+                    "SELECT lat, lon, status, updated_at FROM geocode WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None:
+                    coords = (row[0], row[1]) if row[0] is not None else None
+                    entry = CacheEntry(coords, row[2], row[3])
+                    self._remember(key, entry)
+            if entry is None:
+                if count:
+                    self.counters["misses"] += 1
+                return None
+            if self._expired(entry):
+                if count:
+                    self.counters["expired"] += 1
+                    self.counters["misses"] += 1
+                self.memo.pop(key, None)
+                return None
+            if count:
+                self.counters["hits"] += 1
+            return entry
+
+    def __contains__(self, key):
+        return self.entry(key) is not None
+
+    def __getitem__(self, key):
+        entry = self.entry(key)
+        if entry is None:
+            raise KeyError(key)
+        return entry.coords
+
+    def get(self, key, default=None):
+        entry = self.entry(key)
+        return default if entry is None else entry.coords
+
+    def put(self, key, coords, status=None, updated_at=None):
+        # `updated_at` keeps a copied entry's age, so it expires on schedule.
+        if status is None:
+            status = STATUS_OK if coords else STATUS_NOT_FOUND
+        coords = tuple(coords) if coords else None
+        lat, lon = coords if coords else (None, None)
+        entry = CacheEntry(coords, status, updated_at or time.time())
+        with self.lock, instrument.timer("cache_save", cache="geocode"):
+            self.conn.execute(
+                "INSERT OR REPLACE INTO geocode (key, lat, lon, status, updated_at) VALUES (?, ?, ?, ?, ?)",
+                (key, lat, lon, status, entry.updated_at),
+            )
+            self.conn.commit()
+            self.counters["writes"] += 1
+            self._remember(key, entry)
+
+    def __setitem__(self, key, coords):
+        self.put(key, coords)
+
+    def update(self, entries, missing_status=STATUS_NOT_FOUND):
+        # `missing_status` is recorded for entries whose coords are None.
+        rows = []
+        now = time.time()
+        for key, coords in entries.items():
+            lat, lon = coords if coords else (None, None)
+            status = STATUS_OK if coords else missing_status
+            rows.append((key, lat, lon, status, now))
+        with self.lock, instrument.timer("cache_save", cache="geocode"):
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO geocode (key, lat, lon, status, updated_at) VALUES (?, ?, ?, ?, ?)",
+                rows,
+            )
+            self.conn.commit()
+            self.counters["writes"] += len(rows)
+            self.memo.clear()
+
+    def prune(self):
+        # Drops expired negative and failed entries from disk.
+        now = time.time()
+        removed = 0
+        with self.lock:
+            for status, ttl in self.ttls.items():
+                if ttl is None:
+                    continue
+                cur = self.conn.execute(
+                    "DELETE FROM geocode WHERE status = ? AND updated_at < ?", (status, now - ttl)
+                )
+                removed += cur.rowcount
+            self.conn.commit()
+            self.memo.clear()
+        return removed
+
+    def stats(self):
+        with self.lock:
+            stats = dict(self.counters)
+            stats["memory_entries"] = len(self.memo)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
+
+    def __len__(self):
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM geocode").fetchone()[0]
+
+    def keys(self):
+        with self.lock:
+            return [row[0] for row in self.conn.execute("SELECT key FROM geocode")]
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+def migrate_pickle_cache(cache, pickle_path):
+    # One-shot import of the old geocode_cache.pkl dict. The pickle is renamed
+    # afterwards so the migration never runs twice. The old code cached
+    # exceptions as None just like misses, so a None is imported as an
+    # error (retried after ERROR_TTL) rather than pinned as not found for
+    # NOT_FOUND_TTL; true misses cost one more lookup each.
+    if not os.path.exists(pickle_path):
+        return 0
+    import pickle
+    with open(pickle_path, "rb") as f:
+        entries = pickle.load(f)
+    cache.update(entries, missing_status=STATUS_ERROR)
+    os.replace(pickle_path, pickle_path + ".migrated")
+    instrument.event("geocode_cache_migrated", f"Migrated {len(entries)} geocode cache entries from '{pickle_path}'.",
+                     entries=len(entries), path=pickle_path)
+    return len(entries)
@@ -1,16 +1,19 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
-import json
-from api import fetch_centres
+import centre_cache
+import instrument
+from background import BackgroundRunner
+from catalog import LocationCatalog
+from snapshot import city_key, load_snapshot
+from gazetteer import PRECISION_EXACT
 from utils import (
-    simplify_address,
     load_geocode_cache,
-    save_geocode_cache,
-    normalize,
-    geocode_with_cache,
-    find_nearest_centres,
+    locate,
+    GeocodedCentres,
 )
 
+PROGRESS_INTERVAL = 0.2  # seconds between streamed partial results
+
 class CentreFinderApp(tk.Tk):
     def __init__(self):
         super().__init__()
@@ -19,11 +22,12 @@ class CentreFinderApp(tk.Tk):
         self.resizable(False, False)
 
         # Load locations
-        with open("locations.json", "r", encoding="utf-8") as f:
-            self.states = json.load(f)
+        self.catalog = LocationCatalog.load()
 
         self.geocode_cache = load_geocode_cache()
+        self.snapshot = load_snapshot()
         self.centres = []
+        self.located = None
         self.state_id = None
         self.district = None
         self.city = None
@@ -31,12 +35,20 @@ class CentreFinderApp(tk.Tk):
         # UI Elements
         self.create_widgets()
 
+        # Fetching and geocoding run off the Tk thread. A locations refresh
+        # has its own runner: it rewrites locations.json, so its result must
+        # reach the catalog even when a selection cancels the current job.
+        self.runner = BackgroundRunner(self)
+        self.refresher = BackgroundRunner(self, workers=1)
+        self.refreshing = False
+        self.protocol("WM_DELETE_WINDOW", self.on_close)
+
     def create_widgets(self):
         # State selection
         tk.Label(self, text="Select State:").grid(row=0, column=0, sticky="w", padx=10, pady=5)
         self.state_var = tk.StringVar()
         self.state_combo = ttk.Combobox(self, textvariable=self.state_var, state="readonly")
-        self.state_combo['values'] = [f"{sid}: {s['state_name']}" for sid, s in self.states.items()]
+        self.state_combo['values'] = self.state_choices()
         self.state_combo.grid(row=0, column=1, sticky="ew", padx=10, pady=5)
         self.state_combo.bind("<<ComboboxSelected>>", self.on_state_selected)
 
@@ -50,8 +62,10 @@ class CentreFinderApp(tk.Tk):
         # City selection
         tk.Label(self, text="Select City:").grid(row=2, column=0, sticky="w", padx=10, pady=5)
         self.city_var = tk.StringVar()
-        self.city_combo = ttk.Combobox(self, textvariable=self.city_var, state="readonly")
+        self.city_combo = ttk.Combobox(self, textvariable=self.city_var)
         self.city_combo.grid(row=2, column=1, sticky="ew", padx=10, pady=5)
+        self.city_combo.bind("<KeyRelease>", self.on_city_typed)
+        self.city_combo.bind("<<ComboboxSelected>>", lambda event: self.cancel_pending())
 
         # Fetch Centres Button
         self.fetch_btn = tk.Button(self, text="Fetch Centres", command=self.fetch_centres_gui)
@@ -70,15 +84,23 @@ class CentreFinderApp(tk.Tk):
         self.results_text = tk.Text(self, height=20, width=95, state="disabled")
         self.results_text.grid(row=6, column=0, columnspan=2, padx=10, pady=10)
 
+        # Refresh locations.json
+        self.refresh_btn = tk.Button(self, text="Refresh Locations", command=self.refresh_locations_gui)
+        self.refresh_btn.grid(row=7, column=0, columnspan=2, pady=5)
+
+    def state_choices(self):
+        return [f"{sid}: {self.catalog.state_name(sid)}" for sid in self.catalog.state_ids()]
+
     def on_state_selected(self, event=None):
         state_sel = self.state_combo.get()
         if not state_sel:
             return
         sid = state_sel.split(":")[0].strip()
+        self.cancel_pending()
+        self.centres = []
         self.state_id = sid
-        state = self.states[sid]
-        districts = state.get("districts", [])
-        self.district_combo['values'] = [f"{d['DistrictId']}: {d['DistrictName']}" for d in districts]
+        districts = self.catalog.districts_of(sid)
+        self.district_combo['values'] = [f"{d.district_id}: {d.name}" for d in districts]
         self.district_combo.set("")
         self.city_combo.set("")
         self.city_combo['values'] = []
@@ -90,35 +112,113 @@ class CentreFinderApp(tk.Tk):
         if not district_sel or not self.state_id:
             return
         did = district_sel.split(":")[0].strip()
-        state = self.states[self.state_id]
-        districts = state.get("districts", [])
-        for d in districts:
-            if d["DistrictId"] == did:
-                self.district = d
-                break
-        cities = self.district.get("cities", [])
-        self.city_combo['values'] = cities
+        self.cancel_pending()
+        self.centres = []
+        self.district = self.catalog.district(did)
+        self.city_combo['values'] = list(self.district.cities)
         self.city_combo.set("")
         self.city = None
 
+    def on_city_typed(self, event=None):
+        # Type-ahead: narrow the dropdown to fuzzy matches in the district.
+        if not self.district or event is None or event.keysym in ("Up", "Down", "Return", "Escape"):
+            return
+        text = self.city_combo.get()
+        if not text.strip():
+            self.city_combo['values'] = list(self.district.cities)
+            return
+        matches = self.catalog.suggest(text, limit=10, district_id=self.district.district_id)
+        self.city_combo['values'] = [m.city for m in matches]
+
+    def resolve_city(self):
+        text = self.city_combo.get()
+        city = self.catalog.match_city(self.district.district_id, text)
+        if city is None:
+            matches = self.catalog.suggest(text, limit=1, district_id=self.district.district_id)
+            city = matches[0].city if matches else None
+        if city:
+            self.city_combo.set(city)
+        return city
+
+    def refresh_locations_gui(self):
+        # refresh_locations pulls in asyncio and the HTTP stack; imported
+        # here so it costs nothing until the button is used.
+        import refresh_locations
+        if self.refreshing:
+            return
+        self.refreshing = True
+        self.show_text("Refreshing locations ...\n")
+        self.refresher.submit(lambda job: refresh_locations.refresh(),
+                              on_done=self.on_locations_refreshed, on_error=self.on_refresh_error)
+
+    def on_refresh_error(self, error):
+        self.refreshing = False
+        self.on_job_error(error)
+
+    def on_locations_refreshed(self, result):
+        self.refreshing = False
+        if result is None:
+            messagebox.showerror("Error", "Refreshing locations failed; try again to resume.")
+            return
+        import refresh_locations
+        new_states, diff = result
+        self.apply_location_diff(new_states, diff)
+        changed = refresh_locations.changed_states(diff)
+        self.show_text(f"{len(changed)} state(s) updated.\n" if changed else "Locations are up to date.\n")
+
+    def apply_location_diff(self, new_states, diff):
+        # Swap in only the state subtrees that changed.
+        import refresh_locations
+        changed = refresh_locations.changed_states(diff)
+        if not changed:
+            return
+        self.catalog.replace_states(new_states, changed)
+        self.state_combo['values'] = self.state_choices()
+        if self.state_id in changed:
+            self.state_combo.set("")
+            self.district_combo.set("")
+            self.district_combo['values'] = []
+            self.city_combo.set("")
+            self.city_combo['values'] = []
+            self.state_id = None
+            self.district = None
+            self.city = None
+
     def fetch_centres_gui(self):
         if not self.state_id or not self.district_combo.get() or not self.city_combo.get():
             messagebox.showerror("Error", "Please select state, district, and city.")
             return
-        city = self.city_combo.get()
+        city = self.resolve_city()
+        if not city:
+            messagebox.showerror("Error", "City not recognized.")
+            return
         self.city = city
-        self.results_text.config(state="normal")
-        self.results_text.delete(1.0, tk.END)
-        self.results_text.insert(tk.END, f"Fetching centres for {self.states[self.state_id]['state_name']} / {self.district['DistrictName']} / {city} ...\n")
-        self.results_text.update()
-        centres = fetch_centres(self.state_id, self.district["DistrictId"], city, length=100)
+        self.cancel_pending()
+        self.centres = []
+        header = f"Fetching centres for {self.catalog.state_name(self.state_id)} / {self.district.name} / {city} ...\n"
+        self.show_text(header)
+        key = city_key(self.state_id, self.district.district_id, city)
+        self.runner.submit(self.fetch_job, key, header, on_done=self.on_centres_fetched, on_error=self.on_job_error)
+
+    def fetch_job(self, job, key, header):
+        if self.snapshot and key in self.snapshot:
+            return self.snapshot[key]
+        # Pages of a large city are reported as they arrive.
+        return centre_cache.default().get(*key, progress=lambda received, total: job.post(
+            self.show_text, f"{header}Received {received}/{total} centres ...\n"))
+
+    def on_centres_fetched(self, centres):
         if not centres:
-            self.results_text.insert(tk.END, "No centres found.\n")
-            self.results_text.config(state="disabled")
+            self.append_text("No centres found.\n")
             return
         self.centres = centres
-        self.results_text.insert(tk.END, f"Total centres fetched: {len(centres)}\n")
-        self.results_text.config(state="disabled")
+        # Resolve centre coordinates once, now, rather than on every query.
+        self.located = self.geocode_centres()
+        self.append_text(f"Total centres fetched: {len(centres)}\n")
+
+    def geocode_centres(self):
+        state_name = self.catalog.state_name(self.state_id)
+        return GeocodedCentres(self.centres, self.city, self.district.name, state_name, self.geocode_cache).start()
 
     def find_nearest_gui(self):
         if not self.centres:
@@ -128,36 +228,68 @@ class CentreFinderApp(tk.Tk):
         if not user_addr:
             messagebox.showerror("Error", "Please enter your address.")
             return
-        # Geocode all centres 
-        state_name = self.states[self.state_id]["state_name"]
-        district_name = self.district["DistrictName"]
-        city = self.city
-        valid_count = 0
-        for c in self.centres:
-            addr = getattr(c, "address", None)
-            if not addr or not addr.strip():
-                c.coords = None
-                continue
-            clean = simplify_address(addr)
-            full_addr = f"{clean}, {city}, {district_name}, {state_name}, India"
-            coords = geocode_with_cache(full_addr, self.geocode_cache)
-            if coords:
-                valid_count += 1
-            c.coords = coords
-        save_geocode_cache(self.geocode_cache)
-        # Geocode user address
-        user_coords = geocode_with_cache(user_addr, self.geocode_cache)
-        if not user_coords:
-            messagebox.showerror("Error", "Could not geocode your location.")
-            return
-        save_geocode_cache(self.geocode_cache)
-        nearest = find_nearest_centres(user_coords, self.centres, top_k=3)
+        if self.located is None:
+            # cancel_pending() stopped the pass for the loaded centres
+            # (e.g. the city box changed without a new fetch); start over.
+            self.located = self.geocode_centres()
+        self.show_text("Locating your address ...\n")
+        self.runner.submit(self.nearest_job, user_addr, self.located,
+                           on_done=self.on_nearest_done, on_error=self.on_job_error)
+
+    def nearest_job(self, job, user_addr, located):
+        # Only the user address is geocoded here; centre coordinates come from
+        # the background pass started at fetch time. While that is still
+        # running, partial rankings are streamed.
+        place = locate(user_addr, self.geocode_cache, located.state_name, located.district_name, located.city)
+        if not place:
+            raise LookupError("Could not geocode your location.")
+        user_coords = place.coords
+        while not located.wait(PROGRESS_INTERVAL):
+            if job.cancelled:
+                return [], place
+            job.post(self.render_nearest, located.nearest(user_coords), f"Geocoded {located.done}/{located.total} centres ...")
+        return located.nearest(user_coords), place
+
+    def on_nearest_done(self, result):
+        nearest, place = result
+        header = "Nearest IAPT Centre(s):"
+        if place.precision != PRECISION_EXACT:
+            header = f"Could not geocode your address; distances are from its {place.precision} centre.\n{header}"
+        self.render_nearest(nearest, header)
+
+    def on_job_error(self, error):
+        self.append_text(f"{error}\n")
+        messagebox.showerror("Error", str(error))
+
+    def cancel_pending(self):
+        self.runner.cancel()
+        if self.located is not None:
+            self.located.cancel()
+            self.located = None
+
+    def on_close(self):
+        self.runner.shutdown()
+        self.refresher.shutdown()
+        self.destroy()
+
+    def show_text(self, text):
+        self.results_text.config(state="normal")
+        self.results_text.delete(1.0, tk.END)
+        self.results_text.insert(tk.END, text)
+        self.results_text.config(state="disabled")
+
+    def append_text(self, text):
+        self.results_text.config(state="normal")
+        self.results_text.insert(tk.END, text)
+        self.results_text.config(state="disabled")
+
+    def render_nearest(self, nearest, header):
         self.results_text.config(state="normal")
         self.results_text.delete(1.0, tk.END)
         if not nearest:
-            self.results_text.insert(tk.END, "No centres with valid coordinates.\n")
+            self.results_text.insert(tk.END, f"{header}\nNo centres with valid coordinates.\n")
         else:
-            self.results_text.insert(tk.END, "Nearest IAPT Centre(s):\n")
+            self.results_text.insert(tk.END, f"{header}\n")
             for idx, (c, dist) in enumerate(nearest, start=1):
                 self.results_text.insert(tk.END, f"\n#{idx}\n")
                 self.results_text.insert(tk.END, f"  Code: {getattr(c, 'code', 'N/A')}\n")
@@ -165,8 +297,13 @@ class CentreFinderApp(tk.Tk):
                 self.results_text.insert(tk.END, f"  Address: {getattr(c, 'address', 'N/A')}\n")
                 self.results_text.insert(tk.END, f"  Coordinator: {getattr(c, 'coordinator_name', 'N/A')}\n")
                 self.results_text.insert(tk.END, f"  Distance: {dist:.2f} km\n")
+                if getattr(c, "precision", PRECISION_EXACT) not in (None, PRECISION_EXACT):
+                    self.results_text.insert(tk.END, f"  (approximate: located at its {c.precision} centre)\n")
         self.results_text.config(state="disabled")
 
 if __name__ == "__main__":
-    app = CentreFinderApp()
-    app.mainloop()
\ No newline at end of file
+    # INSTRUMENT=1 / INSTRUMENT_OUTPUT and INSTRUMENT_PROFILE configure
+    # metrics and profiling (see instrument.py).
+    with instrument.profiling():
+        app = CentreFinderApp()
+        app.mainloop()
\ No newline at end of file
@@ -0,0 +1,130 @@
+import os
+import random
+import threading
+import time
+from urllib.parse import urlparse
+
+import instrument
+
+# requests (and urllib3, charset detection, certifi) is imported on first
+# use: it is most of the import time of api, cli and gui, and an
+# interactive session may never touch the network.
+
+CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", "20"))
+MAX_RETRIES = int(os.getenv("HTTP_MAX_RETRIES", "4"))
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 30.0
+POOL_SIZE = 16
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+_session = None
+_session_lock = threading.Lock()
+_stats_lock = threading.Lock()
+_stats = {}
+
+
+def session():
+    # One keep-alive session for the whole process, so repeated calls to the
+    # same host reuse TCP+TLS connections instead of handshaking every time.
+    global _session
+    with _session_lock:
+        if _session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+            s = requests.Session()
+            adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE, max_retries=0)
+            s.mount("https://", adapter)
+            s.mount("http://", adapter)
+            _session = s
+        return _session
+
+
+def _record(path, latency=None, retried=False, failed=False):
+    if latency is not None:
+        instrument.observe("http_request", latency, path=path)
+    if retried:
+        instrument.count("http_retries", path=path)
+    if failed:
+        instrument.count("http_failures", path=path)
+    with _stats_lock:
+        entry = _stats.setdefault(path, {"requests": 0, "retries": 0, "failures": 0,
+                                         "latency_total": 0.0, "latency_max": 0.0})
+        if latency is not None:
+            entry["requests"] += 1
+            entry["latency_total"] += latency
+            entry["latency_max"] = max(entry["latency_max"], latency)
+        if retried:
+            entry["retries"] += 1
+        if failed:
+            entry["failures"] += 1
+
+
+def stats():
+    # Per-endpoint counters: requests, retries, failures and latency (seconds).
+    with _stats_lock:
+        out = {}
+        for path, entry in _stats.items():
+            entry = dict(entry)
+            entry["latency_mean"] = entry["latency_total"] / entry["requests"] if entry["requests"] else 0.0
+            out[path] = entry
+        return out
+
+
+def retry_after(response):
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    from email.utils import parsedate_to_datetime
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff(attempt):
+    # Exponential backoff with full jitter.
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+
+
+def get(url, params=None, headers=None, query=None, timeout=None, retries=MAX_RETRIES):
+    # GET with pooling, timeouts and retries on 429/5xx and connection errors.
+    # `query` is an already-encoded query string prepended to `params`, for
+    # large constant parameter sets that should only be built once. Returns
+    # the last response; raises only if every attempt failed to connect.
+    import requests
+    if query:
+        url = f"{url}?{query}"
+    path = urlparse(url).path
+    timeout = timeout or (CONNECT_TIMEOUT, READ_TIMEOUT)
+    attempt = 0
+    while True:
+        start = time.perf_counter()
+        try:
+            response = session().get(url, params=params, headers=headers, timeout=timeout)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            _record(path, time.perf_counter() - start)
+            if attempt >= retries:
+                _record(path, failed=True)
+                raise
+            instrument.event("http_retry", f"⚠️ {e.__class__.__name__} on {path}, retrying ({attempt + 1}/{retries})",
+                             level="warning", path=path, error=e.__class__.__name__, attempt=attempt + 1)
+            _record(path, retried=True)
+            time.sleep(backoff(attempt))
+            attempt += 1
+            continue
+
+        _record(path, time.perf_counter() - start)
+        instrument.count("http_responses", path=path, status=response.status_code)
+        if response.status_code not in RETRY_STATUSES or attempt >= retries:
+            if response.status_code >= 400:
+                _record(path, failed=True)
+            return response
+        delay = retry_after(response)
+        _record(path, retried=True)
+        time.sleep(min(BACKOFF_MAX, delay) if delay is not None else backoff(attempt))
+        attempt += 1
@@ -0,0 +1,253 @@
+import atexit
+import json
+import os
+import sys
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager, nullcontext
+
+# Process-wide timers, counters and structured events. Disabled by default:
+# timer() then hands back a shared no-op context manager and count()
+# returns straight away, so the hooks can sit on hot paths. Enable with
+# INSTRUMENT=1 (or enable()); INSTRUMENT_OUTPUT names a JSON summary
+# written at exit, and the HTTP service exposes prometheus() on /metrics.
+#
+# event() replaces ad-hoc print diagnostics: the message is still printed
+# when its level reaches INSTRUMENT_LOG_LEVEL, and while enabled the event
+# is also counted and kept (the last MAX_EVENTS) with its fields.
+
+ENABLED = os.getenv("INSTRUMENT", "0") != "0"
+OUTPUT = os.getenv("INSTRUMENT_OUTPUT")
+LOG_LEVEL = os.getenv("INSTRUMENT_LOG_LEVEL", "info")
+PROFILE = os.getenv("INSTRUMENT_PROFILE")  # "cprofile" or "tracemalloc"
+PROFILE_OUTPUT = os.getenv("INSTRUMENT_PROFILE_OUTPUT")
+PROFILE_TOP = 25
+MAX_EVENTS = 1000
+METRIC_PREFIX = "iapt_"
+
+LEVELS = {"debug": 10, "info": 20, "warning": 30, "error": 40}
+PROFILE_MODES = ("cprofile", "tracemalloc")
+
+_enabled = False
+_threshold = LEVELS.get(LOG_LEVEL, LEVELS["info"])
+_lock = threading.Lock()
+_counters = {}
+_timers = {}  # key -> [count, total, max]
+_events = deque(maxlen=MAX_EVENTS)
+_started = time.time()
+_exit_outputs = set()
+_NOOP = nullcontext()
+
+
+def _key(name, labels):
+    return (name, tuple(sorted((k, str(v)) for k, v in labels.items())))
+
+
+class _Timer:
+    __slots__ = ("key", "start")
+
+    def __init__(self, key):
+        self.key = key
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        _observe(self.key, time.perf_counter() - self.start)
+        return False
+
+
+def _observe(key, seconds):
+    with _lock:
+        stat = _timers.get(key)
+        if stat is None:
+            _timers[key] = [1, seconds, seconds]
+        else:
+            stat[0] += 1
+            stat[1] += seconds
+            if seconds > stat[2]:
+                stat[2] = seconds
+
+
+def enabled():
+    return _enabled
+
+
+def enable(output=None):
+    # `output`: JSON summary path written at interpreter exit.
+    global _enabled
+    _enabled = True
+    if output and output not in _exit_outputs:
+        _exit_outputs.add(output)
+        atexit.register(write_json, output)
+
+
+def disable():
+    global _enabled
+    _enabled = False
+
+
+def reset():
+    global _started
+    with _lock:
+        _counters.clear()
+        _timers.clear()
+        _events.clear()
+        _started = time.time()
+
+
+def set_log_level(level):
+    global _threshold
+    if level not in LEVELS:
+        raise ValueError(f"Unknown log level {level!r}; choose from {sorted(LEVELS, key=LEVELS.get)}")
+    _threshold = LEVELS[level]
+
+
+def timer(name, **labels):
+    # with timer("geocode_lookup", backend="google"): ...
+    if not _enabled:
+        return _NOOP
+    return _Timer(_key(name, labels))
+
+
+def observe(name, seconds, **labels):
+    if _enabled:
+        _observe(_key(name, labels), seconds)
+
+
+def count(name, n=1, **labels):
+    if not _enabled:
+        return
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + n
+
+
+def event(name, message=None, level="info", **fields):
+    if message is not None and LEVELS.get(level, 0) >= _threshold:
+        print(message)
+    if not _enabled:
+        return
+    record = {"ts": round(time.time(), 3), "event": name, "level": level}
+    if message is not None:
+        record["message"] = message
+    record.update(fields)
+    key = _key("events", {"event": name, "level": level})
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + 1
+        _events.append(record)
+
+
+def snapshot():
+    with _lock:
+        counters = [{"name": n, "labels": dict(l), "value": v} for (n, l), v in sorted(_counters.items())]
+        timers = [
+            {"name": n, "labels": dict(l), "count": c, "total_s": round(t, 6),
+             "mean_s": round(t / c, 6), "max_s": round(m, 6)}
+            for (n, l), (c, t, m) in sorted(_timers.items())
+        ]
+        events = list(_events)
+    return {
+        "started_at": _started,
+        "uptime_s": round(time.time() - _started, 3),
+        "counters": counters,
+        "timers": timers,
+        "events": events,
+    }
+
+
+def write_json(path):
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(snapshot(), f, ensure_ascii=False, indent=2)
+    os.replace(tmp, path)
+
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels) + "}"
+
+
+def prometheus():
+    # Prometheus text exposition format (0.0.4): counters as <name>_total,
+    # timers as summaries (<name>_seconds_count/_sum) plus a _max gauge.
+    with _lock:
+        counters = sorted(_counters.items())
+        timers = sorted(_timers.items())
+    lines = []
+    typed = set()
+    for (name, labels), value in counters:
+        metric = f"{METRIC_PREFIX}{name}_total"
+        if metric not in typed:
+            typed.add(metric)
+            lines.append(f"# TYPE {metric} counter")
+        lines.append(f"{metric}{_labels(labels)} {value}")
+    # Each family's samples must be contiguous, so the _max gauges follow
+    # their summary rather than being interleaved with it.
+    families = {}
+    for (name, labels), stat in timers:
+        families.setdefault(name, []).append((labels, stat))
+    for name, samples in families.items():
+        metric = f"{METRIC_PREFIX}{name}_seconds"
+        lines.append(f"# TYPE {metric} summary")
+        for labels, (n, total, _peak) in samples:
+            lines.append(f"{metric}_count{_labels(labels)} {n}")
+            lines.append(f"{metric}_sum{_labels(labels)} {total:.6f}")
+        lines.append(f"# TYPE {metric}_max gauge")
+        for labels, (_n, _total, peak) in samples:
+            lines.append(f"{metric}_max{_labels(labels)} {peak:.6f}")
+    return "\n".join(lines) + "\n"
+
+
+@contextmanager
+def profiling(mode=PROFILE, output=PROFILE_OUTPUT):
+    # Wraps an entry point. "cprofile" dumps pstats to `output` (default
+    # profile.pstats) and prints the top functions by cumulative time; it
+    # only sees the calling thread, so work done in background pools shows
+    # up as time spent waiting on it. "tracemalloc" prints the top
+    # allocation sites and the peak, and dumps the snapshot to `output` if
+    # given. No mode: does nothing.
+    if not mode:
+        yield
+        return
+    if mode not in PROFILE_MODES:
+        raise ValueError(f"Unknown profile mode {mode!r}; choose from {PROFILE_MODES}")
+    if mode == "cprofile":
+        import cProfile
+        import pstats
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            path = output or "profile.pstats"
+            profiler.dump_stats(path)
+            pstats.Stats(profiler, stream=sys.stderr).sort_stats("cumulative").print_stats(PROFILE_TOP)
+            print(f"📍 cProfile stats written to '{path}'", file=sys.stderr)
+    else:
+        import tracemalloc
+        tracemalloc.start(25)
+        try:
+            yield
+        finally:
+            snap = tracemalloc.take_snapshot()
+            current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            print(f"📍 tracemalloc: {current / 2**20:.1f} MB live, {peak / 2**20:.1f} MB peak", file=sys.stderr)
+            for stat in snap.statistics("lineno")[:PROFILE_TOP]:
+                print(f"  {stat}", file=sys.stderr)
+            if output:
+                snap.dump(output)
+                print(f"📍 tracemalloc snapshot written to '{output}'", file=sys.stderr)
+
+
+if ENABLED:
+    enable(OUTPUT)
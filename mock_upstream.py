@@ -0,0 +1,165 @@
+import argparse
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# Local stand-in for the IAPT endpoints: deterministic synthetic centres, and
+# districts/cities taken from locations.json. Point the project at it with
+# IAPT_BASE_URL.
+
+LOCATIONS_FILE = "locations.json"
+
+
+def synthetic_centres(state_id, district_id, city, count):
+    rng = random.Random(f"{state_id}/{district_id}/{city}")
+    # Codes identify centres (models.Centre equality), so they must be unique
+    # across cities: a hash of the city, and separators so that state 1 /
+    # district 23 and state 12 / district 3 cannot meet.
+    city_tag = hashlib.blake2b(city.encode("utf-8"), digest_size=4).hexdigest().upper()
+    return [
+        {
+            "Code": f"{state_id}-{district_id}-{city_tag}-{i:04d}",
+            "Name": f"{city} CENTRE {i}",
+            "Address": f"{rng.randint(1, 999)} MAIN ROAD NEAR BUS STAND, WARD {rng.randint(1, 40)}",
+            "CoordinatorName": f"COORDINATOR {i}",
+            "Subject": rng.choice(["PHYSICS", "CHEMISTRY", "BIOLOGY", "ASTRONOMY"]),
+        }
+        for i in range(count)
+    ]
+
+
+class MockUpstream:
+    def __init__(self, centres_per_city=5, latency=0.0, failure_rate=0.0, seed=0, locations=LOCATIONS_FILE,
+                 max_length=None):
+        self.centres_per_city = centres_per_city
+        self.max_length = max_length  # like servers that cap DataTables' `length`
+        self.states = {}
+        if locations and os.path.exists(locations):
+            with open(locations, "r", encoding="utf-8") as f:
+                self.states = json.load(f)
+        self.districts = {
+            d["DistrictId"]: d for state in self.states.values() for d in state.get("districts", [])
+        }
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.not_modified = 0
+
+    def should_fail(self):
+        with self.lock:
+            self.requests += 1
+            return self.rng.random() < self.failure_rate
+
+    def completed_centres(self, query):
+        arg = lambda name, default="": query.get(name, [default])[0]
+        rows = synthetic_centres(arg("StateId"), arg("DistrictId"), arg("CityId"), self.centres_per_city)
+        start = int(arg("start", "0"))
+        length = int(arg("length", "100"))
+        if self.max_length:
+            length = min(length, self.max_length)
+        return {
+            "draw": int(arg("draw", "1")),
+            "recordsTotal": len(rows),
+            "recordsFiltered": len(rows),
+            "data": rows[start:start + length],
+        }
+
+    def centre_districts(self, query):
+        state = self.states.get(query.get("stateId", [""])[0], {})
+        return [{"Value": d["DistrictId"], "Text": d["DistrictName"]} for d in state.get("districts", [])]
+
+    def centre_cities(self, query):
+        district = self.districts.get(query.get("districtId", [""])[0], {})
+        return [{"Value": c, "Text": c} for c in district.get("cities", [])]
+
+
+def make_handler(upstream):
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            url = urlparse(self.path)
+            query = parse_qs(url.query, keep_blank_values=True)
+            if upstream.latency:
+                time.sleep(upstream.latency)
+            if upstream.should_fail():
+                self.send_error(503)
+                return
+            if url.path == "/Centre/Centre/GetCompletedCentres":
+                self.reply(upstream.completed_centres(query), conditional=True)
+            elif url.path == "/Centre/Centre/GetCentreDistricts":
+                self.reply(upstream.centre_districts(query))
+            elif url.path == "/Centre/Home/GetCentreCities":
+                self.reply(upstream.centre_cities(query))
+            else:
+                self.send_error(404)
+
+        def reply(self, payload, conditional=False):
+            body = json.dumps(payload).encode("utf-8")
+            if conditional:
+                # Synthetic data never changes, so the body hash is a valid
+                # ETag and If-None-Match revalidation can be exercised.
+                etag = '"%s"' % hashlib.sha1(body).hexdigest()
+                if self.headers.get("If-None-Match") == etag:
+                    with upstream.lock:
+                        upstream.not_modified += 1
+                    self.send_response(304)
+                    self.send_header("ETag", etag)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+            self.send_response(200)
+            if conditional:
+                self.send_header("ETag", etag)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def make_server(port=0, **options):
+    upstream = MockUpstream(**options)
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(upstream))
+    server.upstream = upstream
+    return server
+
+
+def start_in_background(**options):
+    # Returns (server, base_url); call server.shutdown() when done.
+    server = make_server(**options)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    host, port = server.server_address
+    return server, f"http://{host}:{port}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve mock IAPT centre endpoints locally.")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--centres-per-city", type=int, default=5)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every response")
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--max-length", type=int, default=None, help="cap on rows per page, whatever is asked")
+    args = parser.parse_args()
+    server = make_server(
+        port=args.port,
+        centres_per_city=args.centres_per_city,
+        latency=args.latency,
+        failure_rate=args.failure_rate,
+        max_length=args.max_length,
+    )
+    print(f"Mock upstream on http://127.0.0.1:{args.port} (set IAPT_BASE_URL to use it)")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
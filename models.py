@@ -1,17 +1,199 @@
 # models.py
+import sys
+from array import array
+from math import isnan
+
+NAN = float("nan")
+
 
 class Centre:
-    def __init__(self, code, name, address, coordinator_name, subject, coords=None):
+    __slots__ = ("code", "name", "address", "coordinator_name", "subject", "coords", "precision")
+
+    def __init__(self, code, name, address, coordinator_name, subject, coords=None, precision=None):
         self.code = code
         self.name = name
         self.address = address
         self.coordinator_name = coordinator_name
         self.subject = subject
         self.coords = coords  # tuple (lat, lon)
+        self.precision = precision  # gazetteer.PRECISION_*, None if unknown
+
+    def to_dict(self):
+        lat, lon = self.coords if self.coords else (None, None)
+        return {
+            "code": self.code,
+            "name": self.name,
+            "address": self.address,
+            "coordinator_name": self.coordinator_name,
+            "subject": self.subject,
+            "lat": lat,
+            "lon": lon,
+            "precision": self.precision,
+        }
+
+    @classmethod
+    def from_dict(cls, d):
+        coords = (d["lat"], d["lon"]) if d.get("lat") is not None else None
+        return cls(
+            code=d.get("code"),
+            name=d.get("name"),
+            address=d.get("address"),
+            coordinator_name=d.get("coordinator_name"),
+            subject=d.get("subject"),
+            coords=coords,
+            precision=d.get("precision"),
+        )
 
     def __repr__(self):
         return f"Centre(code={self.code}, name={self.name})"
 
+    # Centres are identified by their code.
+    def __eq__(self, other):
+        if not isinstance(other, (Centre, CentreView)):
+            return NotImplemented
+        return self.code == other.code
+
+    def __hash__(self):
+        return hash(self.code)
+
     def __lt__(self, other):
         # For sorting, example by name (can change as needed)
         return self.name < other.name
+
+
+class CentreView:
+    # A row of a CentreTable that reads and writes through to its columns,
+    # so code written against Centre (e.g. find_nearest_centres) works as is.
+    __slots__ = ("table", "row")
+
+    def __init__(self, table, row):
+        self.table = table
+        self.row = row
+
+    code = property(lambda self: self.table.code[self.row])
+    name = property(lambda self: self.table.name[self.row])
+    address = property(lambda self: self.table.address[self.row])
+    coordinator_name = property(lambda self: self.table.coordinator_name[self.row])
+    subject = property(lambda self: self.table.subject[self.row])
+    city = property(lambda self: self.table.city_of(self.row)[2])
+
+    @property
+    def coords(self):
+        lat = self.table.lat[self.row]
+        return None if isnan(lat) else (lat, self.table.lon[self.row])
+
+    @coords.setter
+    def coords(self, coords):
+        lat, lon = coords if coords else (NAN, NAN)
+        self.table.lat[self.row] = lat
+        self.table.lon[self.row] = lon
+
+    @property
+    def precision(self):
+        return self.table.precision[self.row]
+
+    @precision.setter
+    def precision(self, precision):
+        self.table.precision[self.row] = precision
+
+    def to_centre(self):
+        return Centre(self.code, self.name, self.address, self.coordinator_name, self.subject, self.coords,
+                      self.precision)
+
+    def __copy__(self):
+        # A detached Centre: a second view of the row would write through.
+        return self.to_centre()
+
+    def to_dict(self):
+        return self.to_centre().to_dict()
+
+    def __repr__(self):
+        return f"Centre(code={self.code}, name={self.name})"
+
+    def __eq__(self, other):
+        if not isinstance(other, (Centre, CentreView)):
+            return NotImplemented
+        return self.code == other.code
+
+    def __hash__(self):
+        return hash(self.code)
+
+    def __lt__(self, other):
+        return self.name < other.name
+
+
+class CentreTable:
+    # Column-wise store for large numbers of centres (e.g. a nationwide
+    # snapshot). Coordinates live in packed float64 arrays (NaN = unknown),
+    # subjects are interned, each row's (state_id, district_id, city) is a
+    # small integer into `groups`, and rows are exposed as CentreView objects.
+
+    def __init__(self):
+        self.code = []
+        self.name = []
+        self.address = []
+        self.coordinator_name = []
+        self.subject = []
+        self.lat = array("d")
+        self.lon = array("d")
+        self.precision = []
+        self.group = array("I")
+        self.groups = []
+        self.group_ids = {}
+        self.group_rows = []
+
+    def __len__(self):
+        return len(self.code)
+
+    def __getitem__(self, row):
+        if row < 0:
+            row += len(self)
+        if not 0 <= row < len(self):
+            raise IndexError(row)
+        return CentreView(self, row)
+
+    def __iter__(self):
+        return (CentreView(self, row) for row in range(len(self)))
+
+    def _group_id(self, state_id, district_id, city):
+        key = (str(state_id), str(district_id), city or "")
+        gid = self.group_ids.get(key)
+        if gid is None:
+            gid = self.group_ids[key] = len(self.groups)
+            self.groups.append(tuple(map(sys.intern, key)))
+            self.group_rows.append(array("I"))
+        return gid
+
+    def append(self, centre, state_id="", district_id="", city=""):
+        gid = self._group_id(state_id, district_id, city)
+        self.group_rows[gid].append(len(self.code))
+        self.group.append(gid)
+        self.code.append(centre.code)
+        self.name.append(centre.name)
+        self.address.append(centre.address)
+        self.coordinator_name.append(centre.coordinator_name)
+        self.subject.append(sys.intern(centre.subject) if centre.subject else centre.subject)
+        lat, lon = centre.coords if centre.coords else (NAN, NAN)
+        self.lat.append(lat)
+        self.lon.append(lon)
+        self.precision.append(getattr(centre, "precision", None))
+
+    def extend(self, centres, state_id="", district_id="", city=""):
+        for c in centres:
+            self.append(c, state_id, district_id, city)
+
+    def city_of(self, row):
+        return self.groups[self.group[row]]
+
+    def for_city(self, state_id, district_id, city):
+        gid = self.group_ids.get((str(state_id), str(district_id), city))
+        return [] if gid is None else [CentreView(self, row) for row in self.group_rows[gid]]
+
+    @classmethod
+    def from_snapshot(cls, cities):
+        # `cities` is the {(state_id, district_id, city): [Centre]} mapping
+        # returned by snapshot.load_snapshot.
+        table = cls()
+        for (state_id, district_id, city), centres in cities.items():
+            table.extend(centres, state_id, district_id, city)
+        return table
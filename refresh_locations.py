@@ -0,0 +1,183 @@
+import argparse
+import asyncio
+import difflib
+import json
+import os
+import time
+
+import fetch_state_district_city_mapping as mapping
+import instrument
+
+LOCATIONS_FILE = "locations.json"
+MAX_AGE = 7 * 24 * 3600  # seconds before a district's city list is refetched
+
+
+def meta_file(path):
+    return path + ".meta.json"
+
+
+def load_meta(path):
+    if not os.path.exists(meta_file(path)):
+        return {"districts": {}}
+    with open(meta_file(path), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _write_json(path, data, **kwargs):
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, **kwargs)
+    os.replace(tmp, path)
+
+
+def _pair_renames(removed, added, cutoff=0.8):
+    # Treats a removed/added pair with near-identical names as a rename.
+    renamed = []
+    added = list(added)
+    for old in list(removed):
+        match = difflib.get_close_matches(old, added, n=1, cutoff=cutoff)
+        if match:
+            renamed.append((old, match[0]))
+            removed.remove(old)
+            added.remove(match[0])
+    return removed, added, renamed
+
+
+def diff_locations(old, new):
+    diff = {
+        "states": {"added": [], "removed": [], "renamed": []},
+        "districts": {"added": [], "removed": [], "renamed": []},
+        "cities": {"added": [], "removed": [], "renamed": []},
+    }
+    for sid in new.keys() - old.keys():
+        diff["states"]["added"].append(sid)
+    for sid in old.keys() - new.keys():
+        diff["states"]["removed"].append(sid)
+
+    for sid in old.keys() & new.keys():
+        if old[sid]["state_name"] != new[sid]["state_name"]:
+            diff["states"]["renamed"].append((sid, old[sid]["state_name"], new[sid]["state_name"]))
+        old_d = {d["DistrictId"]: d for d in old[sid].get("districts", [])}
+        new_d = {d["DistrictId"]: d for d in new[sid].get("districts", [])}
+        for did in new_d.keys() - old_d.keys():
+            diff["districts"]["added"].append((sid, did))
+        for did in old_d.keys() - new_d.keys():
+            diff["districts"]["removed"].append((sid, did))
+        for did in old_d.keys() & new_d.keys():
+            if old_d[did]["DistrictName"] != new_d[did]["DistrictName"]:
+                diff["districts"]["renamed"].append((sid, did, old_d[did]["DistrictName"], new_d[did]["DistrictName"]))
+            old_c = set(old_d[did].get("cities", []))
+            new_c = set(new_d[did].get("cities", []))
+            removed, added, renamed = _pair_renames(sorted(old_c - new_c), sorted(new_c - old_c))
+            diff["cities"]["added"] += [(sid, did, c) for c in added]
+            diff["cities"]["removed"] += [(sid, did, c) for c in removed]
+            diff["cities"]["renamed"] += [(sid, did, a, b) for a, b in renamed]
+    return diff
+
+
+def changed_states(diff):
+    # State IDs whose subtree differs, so consumers can reload just those.
+    ids = set(diff["states"]["added"]) | set(diff["states"]["removed"])
+    ids |= {entry[0] for entry in diff["states"]["renamed"]}
+    for section in ("districts", "cities"):
+        for kind in ("added", "removed", "renamed"):
+            ids |= {entry[0] for entry in diff[section][kind]}
+    return ids
+
+
+def is_empty(diff):
+    return not changed_states(diff)
+
+
+def probe(states):
+    # Cheap staleness check: one districts request per state. Districts that
+    # appeared or changed name are flagged stale. Returns {state_id: [raw]}.
+    probed = {}
+    for sid in states:
+        districts = mapping.fetch_districts(sid)
+        if districts:
+            probed[sid] = districts
+    return probed
+
+
+def refresh(path=LOCATIONS_FILE, max_age=MAX_AGE, use_probe=False, concurrency=mapping.CONCURRENCY, rate=mapping.RATE):
+    # Refetches only stale districts, writes the new file atomically and
+    # returns (new_states, diff), or None if some requests failed.
+    with open(path, "r", encoding="utf-8") as f:
+        old = json.load(f)
+    meta = load_meta(path)
+    now = time.time()
+
+    crawler = mapping.MappingCrawler(mapping.checkpoint_file(path), concurrency, rate)
+    probed = probe(old) if use_probe else {}
+    stale = set()
+    fresh = set()
+    for sid, state in old.items():
+        known = {d["DistrictId"]: d["DistrictName"] for d in state.get("districts", [])}
+        if sid in probed:
+            crawler.districts.setdefault(sid, probed[sid])
+            for d in probed[sid]:
+                did = str(d.get("Value"))
+                if known.get(did) != d.get("Text"):
+                    stale.add(did)
+        else:
+            crawler.districts.setdefault(sid, [
+                {"Value": d["DistrictId"], "Text": d["DistrictName"]} for d in state.get("districts", [])
+            ])
+        for d in state.get("districts", []):
+            did = d["DistrictId"]
+            fetched_at = meta["districts"].get(did, {}).get("fetched_at", 0)
+            if now - fetched_at > max_age:
+                stale.add(did)
+            if did not in stale and did not in crawler.cities:
+                crawler.cities[did] = d.get("cities", [])
+                fresh.add(did)
+
+    pending = sum(
+        1 for districts in crawler.districts.values() for d in districts
+        if str(d.get("Value")) not in crawler.cities
+    )
+    instrument.event("refresh_started", f"🔄 {pending} stale districts to refetch", stale=pending)
+    states = {sid: old[sid]["state_name"] for sid in old}
+    asyncio.run(crawler.run(states))
+    if crawler.failures:
+        instrument.event("refresh_incomplete", f"⚠️ {crawler.failures} requests failed; run again to resume.",
+                         level="warning", failures=crawler.failures)
+        return None
+
+    new = crawler.mapping(states)
+    diff = diff_locations(old, new)
+    for did in set(crawler.cities) - fresh:
+        meta["districts"][did] = {"fetched_at": now}
+    if not is_empty(diff):
+        _write_json(path, new, indent=2)
+    _write_json(meta_file(path), meta)
+    os.remove(mapping.checkpoint_file(path))
+    return new, diff
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Incrementally refresh locations.json.")
+    parser.add_argument("--locations", default=LOCATIONS_FILE)
+    parser.add_argument("--max-age", type=float, default=MAX_AGE, help="seconds before a district is refetched")
+    parser.add_argument("--probe", action="store_true", help="also flag districts whose name/ID changed upstream")
+    parser.add_argument("--concurrency", type=int, default=mapping.CONCURRENCY)
+    parser.add_argument("--rate", type=float, default=mapping.RATE)
+    parser.add_argument("--base-url", default=None)
+    args = parser.parse_args()
+    if args.base_url:
+        mapping.BASE_URL = args.base_url
+
+    result = refresh(args.locations, args.max_age, args.probe, args.concurrency, args.rate)
+    if result is None:
+        return
+    _new, diff = result
+    print(json.dumps(diff, indent=2, ensure_ascii=False))
+    if is_empty(diff):
+        print("✅ No changes.")
+    else:
+        print(f"✅ Updated '{args.locations}' ({len(changed_states(diff))} states changed).")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,313 @@
+import argparse
+import copy
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import api
+import geocode
+import instrument
+from catalog import LocationCatalog, LOCATIONS_FILE
+from centre_cache import CentreCache
+import gazetteer
+from gazetteer import PRECISION_EXACT
+from geocode_cache import ERROR_TTL
+from snapshot import SNAPSHOT_FILE, city_key, load_snapshot
+from spatial import CentreIndex
+from utils import (
+    centre_arrays,
+    load_geocode_cache,
+    locate,
+    geocode_centres,
+    find_nearest_centres,
+)
+
+HOST = "127.0.0.1"
+PORT = 8080
+MAX_K = 50
+ROUTES = ("/health", "/centres", "/nearest", "/metrics")
+
+
+class ServiceError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class CentreService:
+    # Long-running state behind the HTTP endpoints: the location catalog,
+    # every city's centres fetched so far (seeded from the snapshot) and the
+    # geocode cache stay in memory. Each city is fetched and geocoded at most
+    # once, even under concurrent requests, and geocoded centres go into one
+    # nationwide CentreIndex for /nearest queries without a city.
+
+    def __init__(self, catalog, cities=None, cache=None, geocode=True, centre_cache=None):
+        self.catalog = catalog
+        self.cache = cache if cache is not None else {}
+        self.centre_cache = centre_cache
+        self.geocode = geocode
+        self.cities = {}
+        self.arrays = {}  # city key -> (centres, utils.centre_arrays(centres))
+        self.geocoded = {}  # city key -> monotonic time of its last geocode pass
+        self.index = CentreIndex()
+        self.lock = threading.Lock()
+        self.city_locks = {}
+        for key, centres in (cities or {}).items():
+            self._add_city(key, centres)
+            if all(c.coords and not gazetteer.approximate(c) for c in centres):
+                self.geocoded[key] = time.monotonic()
+
+    def _add_city(self, key, centres):
+        # Swaps in the city's centres, replacing any it had in the index.
+        with self.lock:
+            for c in self.cities.get(key, ()):
+                self.index.remove(c)
+            self.cities[key] = centres
+            for c in centres:
+                self.index.insert(c)
+
+    def _needs_geocode(self, key, centres):
+        # Once per city, then again only for centres left unplaced or at a
+        # gazetteer centroid, and no sooner than a failed lookup's cache
+        # entry expires (until then the cache would just repeat the error).
+        if not self.geocode:
+            return False
+        last = self.geocoded.get(key)
+        if last is None:
+            return True
+        return (time.monotonic() - last >= ERROR_TTL
+                and any(not c.coords or gazetteer.approximate(c) for c in centres))
+
+    def _city_lock(self, key):
+        with self.lock:
+            return self.city_locks.setdefault(key, threading.Lock())
+
+    def resolve(self, state_id, district_id, city_text):
+        district = self.catalog.district(district_id)
+        if district is None or district.state_id != state_id:
+            raise ServiceError(404, f"Unknown district {district_id!r} in state {state_id!r}")
+        city = self.catalog.match_city(district_id, city_text)
+        if not city:
+            suggestions = [m.city for m in self.catalog.suggest(city_text, district_id=district_id)]
+            raise ServiceError(404, f"Unknown city {city_text!r}; did you mean {suggestions}?")
+        return district, city
+
+    def centres(self, state_id, district_id, city_text):
+        district, city = self.resolve(state_id, district_id, city_text)
+        key = city_key(state_id, district.district_id, city)
+        # Centres the geocoder cannot place stay without coordinates (or at
+        # a centroid) between passes instead of triggering one per request.
+        centres = self.cities.get(key)
+        if centres is not None and not self._needs_geocode(key, centres):
+            return district, city, centres
+
+        with self._city_lock(key):
+            centres = self.cities.get(key)
+            if centres is None:
+                try:
+                    if self.centre_cache is not None:
+                        centres = self.centre_cache.fetch(state_id, district.district_id, city)
+                    else:
+                        centres = list(api.iter_centres(state_id, district.district_id, city))
+                except api.CentreFetchError as e:
+                    raise ServiceError(502, str(e))
+            if self._needs_geocode(key, centres):
+                # Geocoded on copies: the originals may be in the index (or
+                # the centre cache), and a concurrent nationwide /nearest
+                # must not walk the tree while their coordinates change.
+                centres = [copy.copy(c) for c in centres]
+                state_name = self.catalog.state_name(state_id)
+                geocode_centres(centres, city, district.name, state_name, self.cache)
+                self.geocoded[key] = time.monotonic()
+            self._add_city(key, centres)
+        return district, city, centres
+
+    def _arrays(self, key, centres):
+        # Ranking arrays per city list. _add_city swaps in a new list rather
+        # than moving centres in place, so a list's arrays stay valid.
+        with self.lock:
+            cached = self.arrays.get(key)
+        if cached is None or cached[0] is not centres:
+            cached = (centres, centre_arrays(centres))
+            with self.lock:
+                if self.cities.get(key) is centres:
+                    self.arrays[key] = cached
+        return cached[1]
+
+    def nearest(self, user_coords, top_k=3, state_id=None, district_id=None, city_text=None):
+        if city_text:
+            district, city, centres = self.centres(state_id, district_id, city_text)
+            arrays = self._arrays(city_key(state_id, district.district_id, city), centres)
+            return find_nearest_centres(user_coords, centres, top_k=top_k, arrays=arrays)
+        with self.lock:
+            return self.index.nearest(user_coords, top_k)
+
+    def locate(self, address):
+        place = locate(address, self.cache)
+        if not place:
+            raise ServiceError(404, f"Could not geocode {address!r}")
+        return place
+
+    def health(self):
+        with self.lock:
+            body = {"status": "ok", "cities": len(self.cities), "indexed": len(self.index)}
+        if hasattr(self.cache, "stats"):
+            body["geocode_cache"] = self.cache.stats()
+        if self.centre_cache is not None:
+            body["centre_cache"] = self.centre_cache.stats()
+        return body
+
+
+def _arg(query, name, default=None):
+    return query.get(name, [default])[0]
+
+
+def _float(query, name):
+    value = _arg(query, name)
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        raise ServiceError(400, f"'{name}' must be a number")
+
+
+def make_handler(service):
+    class Handler(BaseHTTPRequestHandler):
+        # HTTP/1.1 so clients can keep connections alive between queries;
+        # without TCP_NODELAY the separate header and body writes stall on
+        # delayed ACKs (~40 ms per request).
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            with instrument.timer("server_request", route=url.path if url.path in ROUTES else "other"):
+                self.route(url)
+
+        def route(self, url):
+            query = parse_qs(url.query)
+            try:
+                if url.path == "/metrics":
+                    self.reply_text(200, instrument.prometheus(), "text/plain; version=0.0.4; charset=utf-8")
+                elif url.path == "/health":
+                    self.reply(200, service.health())
+                elif url.path == "/centres":
+                    self.reply(200, self.centres(query))
+                elif url.path == "/nearest":
+                    self.reply(200, self.nearest(query))
+                else:
+                    raise ServiceError(404, f"No route for {url.path}")
+            except ServiceError as e:
+                self.reply(e.status, {"error": str(e)})
+            except Exception as e:
+                self.reply(500, {"error": f"{type(e).__name__}: {e}"})
+
+        def scope(self, query):
+            state_id, district_id, city = (_arg(query, n) for n in ("state", "district", "city"))
+            if city and not (state_id and district_id):
+                raise ServiceError(400, "'city' needs 'state' and 'district'")
+            if (state_id or district_id) and not city:
+                # Only a city scope is supported; ignoring the others would
+                # silently answer for the whole country.
+                raise ServiceError(400, "'state' and 'district' need 'city'")
+            return state_id, district_id, city
+
+        def centres(self, query):
+            state_id, district_id, city = self.scope(query)
+            if not city:
+                raise ServiceError(400, "'state', 'district' and 'city' are required")
+            district, city, centres = service.centres(state_id, district_id, city)
+            return {
+                "state": service.catalog.state_name(state_id),
+                "district": district.name,
+                "city": city,
+                "centres": [c.to_dict() for c in centres],
+            }
+
+        def nearest(self, query):
+            precision = PRECISION_EXACT
+            if _arg(query, "address"):
+                user_coords, precision = service.locate(_arg(query, "address"))
+            else:
+                user_coords = (_float(query, "lat"), _float(query, "lon"))
+            try:
+                top_k = max(1, min(MAX_K, int(_arg(query, "k", "3"))))
+            except ValueError:
+                raise ServiceError(400, "'k' must be an integer")
+            results = service.nearest(user_coords, top_k, *self.scope(query))
+            return {
+                "lat": user_coords[0],
+                "lon": user_coords[1],
+                "precision": precision,
+                "results": [dict(c.to_dict(), distance_km=round(d, 3)) for c, d in results],
+            }
+
+        def reply(self, status, payload):
+            self.reply_text(status, json.dumps(payload, ensure_ascii=False), "application/json; charset=utf-8")
+
+        def reply_text(self, status, text, content_type):
+            body = text.encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def make_server(service, host=HOST, port=PORT):
+    server = ThreadingHTTPServer((host, port), make_handler(service))
+    server.daemon_threads = True
+    server.service = service
+    return server
+
+
+def start_in_background(service, host=HOST, port=0):
+    # Returns (server, base_url); call server.shutdown() when done.
+    server = make_server(service, host, port)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    host, port = server.server_address[:2]
+    return server, f"http://{host}:{port}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve nearest-centre queries over HTTP/JSON.")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--locations", default=LOCATIONS_FILE)
+    parser.add_argument("--snapshot", default=SNAPSHOT_FILE)
+    parser.add_argument("--base-url", default=None, help="override the IAPT host, e.g. a mock_upstream server")
+    parser.add_argument("--no-geocode", action="store_true", help="serve centres without geocoding them")
+    parser.add_argument("--geocoder", choices=sorted(geocode.BACKENDS), default=None,
+                        help="geocoder backend (default: $GEOCODER_BACKEND or google)")
+    args = parser.parse_args()
+    if args.geocoder:
+        geocode.set_backend(args.geocoder)
+    # /metrics is only useful with collection on; it costs a lock per sample.
+    instrument.enable(instrument.OUTPUT)
+
+    if args.base_url:
+        api.BASE_URL = args.base_url
+    catalog = LocationCatalog.load(args.locations)
+    cities = load_snapshot(args.snapshot) or {}
+    service = CentreService(catalog, cities, load_geocode_cache(), geocode=not args.no_geocode,
+                            centre_cache=CentreCache())
+    server = make_server(service, args.host, args.port)
+    print(f"📍 Serving {len(service.index)} geocoded centres from {len(cities)} cities on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if hasattr(service.cache, "close"):
+            service.cache.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,238 @@
+import argparse
+import csv
+import json
+import os
+from array import array
+from math import ceil, cos, radians
+
+import instrument
+from catalog import LocationCatalog, LOCATIONS_FILE
+from gazetteer import GAZETTEER_FILE, Gazetteer, city_id
+from snapshot import SNAPSHOT_FILE, load_snapshot
+from spatial import CentreIndex
+from utils import haversine
+
+STEP_DEG = float(os.getenv("SERVICE_AREA_STEP", "0.02"))  # ~2.2 km of latitude per cell
+GAP_KM = float(os.getenv("SERVICE_AREA_GAP_KM", "25"))  # farther than this from any centre is a gap
+MARGIN_KM = float(os.getenv("SERVICE_AREA_MARGIN_KM", "0"))  # optional padding around a district's extent
+KM_PER_DEG = 111.195  # along a meridian, for a 6371 km sphere
+
+
+def bounding_box(points, margin_km=MARGIN_KM):
+    # (south, west, north, east) around the points, padded by margin_km.
+    lats, lons = zip(*points)
+    dlat = margin_km / KM_PER_DEG
+    dlon = margin_km / (KM_PER_DEG * max(0.01, cos(radians(max(map(abs, lats))))))
+    return (max(-90.0, min(lats) - dlat), max(-180.0, min(lons) - dlon),
+            min(90.0, max(lats) + dlat), min(180.0, max(lons) + dlon))
+
+
+class NearestGrid:
+    # Precomputed nearest-centre assignment over a bounding box: the box is
+    # cut into step x step degree cells and each cell keeps the centre
+    # nearest its midpoint and that distance, so a point lookup is an index
+    # calculation rather than a search. Assignments are exact at midpoints;
+    # a point within half a cell of a Voronoi boundary may get the
+    # neighbouring centre, off by at most one cell diagonal.
+    #
+    # `centres` is an iterable of geocoded centres or a ready CentreIndex
+    # (then `bbox` is required), so many grids can share one index.
+
+    def __init__(self, centres, bbox=None, step=STEP_DEG):
+        if isinstance(centres, CentreIndex):
+            if bbox is None:
+                raise ValueError("bbox is required when passing a CentreIndex")
+            index = centres
+        else:
+            centres = [c for c in centres if getattr(c, "coords", None)]
+            if bbox is None:
+                if not centres:
+                    raise ValueError("no geocoded centres to bound the grid")
+                bbox = bounding_box([c.coords for c in centres])
+            index = CentreIndex(centres)
+        self.south, self.west, north, east = bbox
+        self.step = step
+        self.rows = max(1, ceil((north - self.south) / step))
+        self.cols = max(1, ceil((east - self.west) / step))
+        self.owner = [None] * (self.rows * self.cols)
+        self.dist = array("f", bytes(4 * self.rows * self.cols))
+        if len(index):
+            self._build(index)
+
+    def _build(self, index):
+        with instrument.timer("service_area_build"):
+            i = 0
+            for r in range(self.rows):
+                lat = self.south + (r + 0.5) * self.step
+                for c in range(self.cols):
+                    found = index.nearest((lat, self.west + (c + 0.5) * self.step), 1)
+                    if found:
+                        self.owner[i], self.dist[i] = found[0]
+                    i += 1
+
+    def __len__(self):
+        return len(self.owner)
+
+    def cell(self, coords):
+        # Cell index for (lat, lon), or None outside the box.
+        r = int((coords[0] - self.south) // self.step)
+        c = int((coords[1] - self.west) // self.step)
+        if 0 <= r < self.rows and 0 <= c < self.cols:
+            return r * self.cols + c
+        return None
+
+    def midpoint(self, i):
+        r, c = divmod(i, self.cols)
+        return (self.south + (r + 0.5) * self.step, self.west + (c + 0.5) * self.step)
+
+    def cell_area_km2(self, i):
+        side = self.step * KM_PER_DEG
+        return side * side * cos(radians(self.midpoint(i)[0]))
+
+    def nearest(self, coords):
+        # O(1): (centre, km from coords) for the cell's centre, or None
+        # outside the box.
+        i = self.cell(coords)
+        if i is None or self.owner[i] is None:
+            return None
+        centre = self.owner[i]
+        return centre, haversine(coords, centre.coords)
+
+    def catchments(self):
+        # Area (km^2) of the box each centre is nearest to, largest first.
+        areas = {}
+        for i, centre in enumerate(self.owner):
+            if centre is not None:
+                areas[centre] = areas.get(centre, 0.0) + self.cell_area_km2(i)
+        return sorted(areas.items(), key=lambda item: item[1], reverse=True)
+
+    def stats(self, gap_km=GAP_KM):
+        # Distance from cell midpoints to their nearest centre. The mean is
+        # area-weighted (cells shrink towards the poles); gap_share is the
+        # share of the area farther than gap_km from every centre.
+        total = weighted = gap = 0.0
+        worst, worst_at = 0.0, None
+        for i, centre in enumerate(self.owner):
+            if centre is None:
+                continue
+            d = self.dist[i]
+            area = self.cell_area_km2(i)
+            total += area
+            weighted += d * area
+            if d > gap_km:
+                gap += area
+            if d > worst:
+                worst, worst_at = d, i
+        return {
+            "cells": len(self.owner),
+            "area_km2": round(total, 1),
+            "mean_km": round(weighted / total, 3) if total else None,
+            "max_km": round(worst, 3) if worst_at is not None else None,
+            "max_at": [round(v, 5) for v in self.midpoint(worst_at)] if worst_at is not None else None,
+            "gap_share": round(gap / total, 4) if total else None,
+        }
+
+
+def district_extent(district, centres, places=None):
+    # Points that bound a district: its geocoded centres plus the
+    # gazetteer's centroids for the district and each of its cities, so
+    # towns without a centre widen the box. Returns (points, source), with
+    # source "gazetteer" when any centroid was known, else "centres".
+    points = [c.coords for c in centres]
+    known = []
+    if places is not None and district is not None:
+        did = district.district_id
+        known = [places.cities[cid] for cid in (city_id(did, city) for city in district.cities) if cid in places.cities]
+        if did in places.districts:
+            known.append(places.districts[did])
+    return points + known, "gazetteer" if known else "centres"
+
+
+def district_stats(cities, catalog=None, step=STEP_DEG, margin_km=MARGIN_KM, gap_km=GAP_KM, progress=None,
+                   places=None):
+    # One grid per district over its extent (district_extent, plus
+    # margin_km), assigning each cell to the nearest centre anywhere, since
+    # people can cross district lines. `cities` maps city_key -> centres, as
+    # in a snapshot; `places` is a Gazetteer. District outlines are not
+    # known, so the box stands in for the district. Without gazetteer
+    # centroids (extent "centres") it is just the centres' own box, where
+    # gaps at the edges cannot show.
+    by_district = {}
+    for (state_id, district_id, _city), centres in cities.items():
+        by_district.setdefault((state_id, district_id), []).extend(c for c in centres if c.coords)
+    index = CentreIndex(c for centres in by_district.values() for c in centres)
+    rows = []
+    for n, ((state_id, district_id), centres) in enumerate(sorted(by_district.items()), start=1):
+        if not centres:
+            continue
+        district = catalog.district(district_id) if catalog else None
+        points, extent = district_extent(district, centres, places)
+        grid = NearestGrid(index, bounding_box(points, margin_km), step)
+        rows.append(dict(
+            state_id=state_id,
+            state=catalog.state_name(state_id) if catalog else None,
+            district_id=district_id,
+            district=district.name if district else None,
+            centres=len(centres),
+            extent=extent,
+            margin_km=margin_km,
+            **grid.stats(gap_km),
+        ))
+        if progress:
+            progress(n, len(by_district), rows[-1])
+    return rows
+
+
+def write_rows(rows, path):
+    if path.lower().endswith(".json"):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(rows, f, ensure_ascii=False, indent=2)
+        return
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.DictWriter(f, list(rows[0]) if rows else ["district_id"])
+        writer.writeheader()
+        for row in rows:
+            writer.writerow(dict(row, max_at=" ".join(map(str, row["max_at"] or ()))))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-district distance to the nearest centre (coverage gaps).")
+    parser.add_argument("--snapshot", default=SNAPSHOT_FILE, help="geocoded centres, e.g. from crawl_centres.py")
+    parser.add_argument("--locations", default=LOCATIONS_FILE)
+    parser.add_argument("--step", type=float, default=STEP_DEG, help="cell size in degrees")
+    parser.add_argument("--gazetteer", default=GAZETTEER_FILE, help="district/city centroids that bound each district")
+    parser.add_argument("--margin-km", type=float, default=MARGIN_KM, help="padding around each district's extent")
+    parser.add_argument("--gap-km", type=float, default=GAP_KM, help="distance that counts as a coverage gap")
+    parser.add_argument("--output", help="CSV or JSON file (default: print a table)")
+    args = parser.parse_args()
+
+    cities = load_snapshot(args.snapshot)
+    if not cities:
+        print(f"❌ No usable snapshot at '{args.snapshot}'; run crawl_centres.py first.")
+        return
+    catalog = LocationCatalog.load(args.locations) if os.path.exists(args.locations) else None
+    places = Gazetteer.load(args.gazetteer, catalog) if catalog else None
+
+    def progress(done, total, row):
+        print(f"  ↳ [{done}/{total}] {row['district'] or row['district_id']}: "
+              f"mean {row['mean_km']} km, max {row['max_km']} km")
+
+    print(f"📍 Building nearest-centre grids at {args.step}° for {len(cities)} cities ...")
+    rows = district_stats(cities, catalog, args.step, args.margin_km, args.gap_km, progress, places)
+    rows.sort(key=lambda r: r["max_km"] or 0, reverse=True)
+    if args.output:
+        write_rows(rows, args.output)
+        print(f"✅ {len(rows)} districts written to '{args.output}'")
+        return
+    print(f"\nGaps are cells over {args.gap_km} km from every centre, as a share of a box around each "
+          f"district's centres and gazetteer centroids (district outlines are not known). Districts marked '*' "
+          f"have no centroids in '{args.gazetteer}', so their box is the centres' own and edge gaps cannot show.")
+    print(f"\n{'district':<28} {'centres':>7} {'mean km':>8} {'max km':>8} {'gap':>6}")
+    for row in rows:
+        name = (row['district'] or row['district_id'])[:27] + ("*" if row["extent"] == "centres" else "")
+        print(f"{name:<28} {row['centres']:>7} "
+              f"{row['mean_km']:>8.1f} {row['max_km']:>8.1f} {row['gap_share']:>6.1%}")
+
+
+if __name__ == "__main__":
+    main()
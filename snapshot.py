@@ -0,0 +1,58 @@
+import json
+import os
+from datetime import datetime, timezone
+
+import instrument
+from models import Centre, CentreTable
+
+SNAPSHOT_FILE = "centres_snapshot.json"
+SNAPSHOT_VERSION = 1
+
+
+def city_key(state_id, district_id, city):
+    return (str(state_id), str(district_id), city)
+
+
+def save_snapshot(cities, path=SNAPSHOT_FILE):
+    # `cities` maps city_key(...) -> list of Centre. Written to a temp file and
+    # swapped in, so readers never see a half-written snapshot.
+    records = []
+    for (state_id, district_id, city), centres in sorted(cities.items()):
+        records.append({
+            "state_id": state_id,
+            "district_id": district_id,
+            "city": city,
+            "centres": [c.to_dict() for c in centres],
+        })
+    payload = {
+        "version": SNAPSHOT_VERSION,
+        "generated_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "cities": records,
+    }
+    tmp = path + ".tmp"
+    with instrument.timer("cache_save", cache="snapshot"):
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(payload, f, ensure_ascii=False)
+        os.replace(tmp, path)
+
+
+def load_snapshot(path=SNAPSHOT_FILE):
+    # Returns {city_key: [CentreView, ...]}, or None when there is no usable
+    # snapshot so callers fall back to live fetches.
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        payload = json.load(f)
+    if payload.get("version") != SNAPSHOT_VERSION:
+        instrument.event("snapshot_ignored", f"⚠️ Ignoring snapshot '{path}' with unsupported version {payload.get('version')}",
+                         level="warning", path=path, version=payload.get("version"))
+        return None
+    # One CentreTable holds every centre column-wise; each city's list is
+    # made of row views into it.
+    table = CentreTable()
+    cities = {}
+    for r in payload.get("cities", []):
+        key = city_key(r["state_id"], r["district_id"], r["city"])
+        table.extend((Centre.from_dict(c) for c in r["centres"]), *key)
+        cities[key] = table.for_city(*key)
+    return cities
@@ -0,0 +1,169 @@
+import heapq
+from itertools import count
+from math import radians, sin, cos, asin
+
+import instrument
+from utils import haversine
+
+EARTH_RADIUS_KM = 6371.0
+LEAF_SIZE = 16
+# Slack for float round-off between the chord bound and haversine().
+_EPS_KM = 1e-9
+
+
+def _to_xyz(coords):
+    lat, lon = map(radians, coords)
+    return (cos(lat) * cos(lon), cos(lat) * sin(lon), sin(lat))
+
+
+def _chord_to_km(chord):
+    return 2 * EARTH_RADIUS_KM * asin(min(1.0, chord / 2))
+
+
+class _Node:
+    __slots__ = ("lo", "hi", "items", "axis", "split", "left", "right")
+
+    def __init__(self):
+        self.lo = [float("inf")] * 3
+        self.hi = [float("-inf")] * 3
+        self.items = []
+        self.axis = None
+        self.split = None
+        self.left = None
+        self.right = None
+
+    def expand(self, p):
+        for i in range(3):
+            if p[i] < self.lo[i]:
+                self.lo[i] = p[i]
+            if p[i] > self.hi[i]:
+                self.hi[i] = p[i]
+
+    def min_km(self, q):
+        # Lower bound on the great-circle distance from q to anything in the
+        # box: the straight-line (chord) distance to the box, mapped onto the
+        # sphere. Chord length is monotonic in arc length, so the bound is exact.
+        sq = 0.0
+        for i in range(3):
+            if q[i] < self.lo[i]:
+                sq += (self.lo[i] - q[i]) ** 2
+            elif q[i] > self.hi[i]:
+                sq += (q[i] - self.hi[i]) ** 2
+        return _chord_to_km(sq ** 0.5)
+
+
+class CentreIndex:
+    # Spatial index over geocoded centres: a bucketed k-d tree on unit-sphere
+    # (x, y, z) points. Distances reported are computed with utils.haversine,
+    # and ties are broken by insertion order, so results match
+    # utils.find_nearest_centres for the same input order.
+
+    def __init__(self, centres=()):
+        self.root = _Node()
+        self.seq = count()
+        self.leaves = {}
+        self.size = 0
+        for c in centres:
+            self.insert(c)
+
+    def __len__(self):
+        return self.size
+
+    def __contains__(self, centre):
+        return id(centre) in self.leaves
+
+    def insert(self, centre):
+        coords = getattr(centre, "coords", None)
+        if not coords or id(centre) in self.leaves:
+            return False
+        p = _to_xyz(coords)
+        item = (next(self.seq), centre, p)
+        node = self.root
+        while True:
+            node.expand(p)
+            if node.axis is None:
+                break
+            node = node.left if p[node.axis] <= node.split else node.right
+        node.items.append(item)
+        self.leaves[id(centre)] = node
+        self.size += 1
+        if len(node.items) > LEAF_SIZE:
+            self._split(node)
+        return True
+
+    def _split(self, node):
+        # Split by position, not value, so duplicate coordinates can never
+        # leave one side empty. Points equal to `split` may then sit on
+        # either side; searches only use the children's boxes, and leaves
+        # records where each centre actually went.
+        spans = [node.hi[i] - node.lo[i] for i in range(3)]
+        axis = spans.index(max(spans))
+        node.items.sort(key=lambda item: item[2][axis])
+        mid = len(node.items) // 2
+        split = node.items[mid - 1][2][axis]
+        left, right = _Node(), _Node()
+        for child, items in ((left, node.items[:mid]), (right, node.items[mid:])):
+            for item in items:
+                child.items.append(item)
+                child.expand(item[2])
+                self.leaves[id(item[1])] = child
+        node.axis, node.split = axis, split
+        node.left, node.right = left, right
+        node.items = []
+
+    def remove(self, centre):
+        # Bounding boxes are left as they are; they stay valid (if loose)
+        # lower bounds after a removal.
+        node = self.leaves.pop(id(centre), None)
+        if node is None:
+            return False
+        node.items = [item for item in node.items if item[1] is not centre]
+        self.size -= 1
+        return True
+
+    def _search(self, user_coords, bound):
+        # Best-first walk; `bound()` returns the current pruning distance.
+        q = _to_xyz(user_coords)
+        heap = [(self.root.min_km(q), 0, self.root)]
+        tick = count(1)
+        while heap:
+            lower, _, node = heapq.heappop(heap)
+            if lower > bound() + _EPS_KM:
+                break
+            if node.axis is None:
+                for seq, centre, _p in node.items:
+                    yield seq, centre, haversine(user_coords, centre.coords)
+                continue
+            for child in (node.left, node.right):
+                if child.items or child.axis is not None:
+                    heapq.heappush(heap, (child.min_km(q), next(tick), child))
+
+    def nearest(self, user_coords, top_k=1):
+        if top_k <= 0:
+            return []
+        with instrument.timer("rank", path="index"):
+            return self._nearest(user_coords, top_k)
+
+    def _nearest(self, user_coords, top_k):
+        best = []  # max-heap of (-dist, -seq, centre)
+
+        def bound():
+            return -best[0][0] if len(best) >= top_k else float("inf")
+
+        for seq, centre, d in self._search(user_coords, bound):
+            key = (-d, -seq, centre)
+            if len(best) < top_k:
+                heapq.heappush(best, key)
+            elif (d, seq) < (-best[0][0], -best[0][1]):
+                heapq.heapreplace(best, key)
+        best.sort(key=lambda x: (-x[0], -x[1]))
+        return [(centre, -neg_d) for neg_d, _seq, centre in best]
+
+    def within(self, user_coords, radius_km):
+        found = [
+            (seq, centre, d)
+            for seq, centre, d in self._search(user_coords, lambda: radius_km)
+            if d <= radius_km
+        ]
+        found.sort(key=lambda x: (x[2], x[0]))
+        return [(centre, d) for _seq, centre, d in found]
@@ -0,0 +1,52 @@
+import geocode
+import gazetteer
+from catalog import LocationCatalog
+from models import Centre
+from snapshot import city_key
+from utils import geocode_centres, locate
+
+STATES = {
+    "27": {"state_name": "MAHARASHTRA", "districts": [
+        {"DistrictId": "490", "DistrictName": "PUNE", "cities": ["PUNE", "BARAMATI"]},
+    ]},
+}
+
+
+def offline(monkeypatch):
+    # A gazetteer with only a state centroid, filled in from "crawled"
+    # centres, and a geocoder that finds nothing.
+    catalog = LocationCatalog.from_states(STATES)
+    g = gazetteer.Gazetteer(catalog, states={"27": (19.66, 75.3)})
+    cities = {
+        city_key("27", "490", "PUNE"): [
+            Centre(1, "A", "1 FC Road", "", "", coords=(18.52, 73.84)),
+            Centre(2, "B", "2 MG Road", "", "", coords=(18.50, 73.88)),
+            Centre(3, "C", "3 JM Road", "", "", coords=(19.66, 75.3), precision=gazetteer.PRECISION_STATE),
+        ],
+        city_key("27", "490", "BARAMATI"): [Centre(4, "D", "4 Station Road", "", "", coords=(18.15, 74.58))],
+    }
+    assert gazetteer.derive(g, cities) == 3
+    monkeypatch.setattr(gazetteer, "_default", g)
+    monkeypatch.setattr(geocode, "_backend", geocode.FakeBackend(latency=0, not_found_rate=1.0))
+    return g
+
+
+def test_derive_averages_geocoded_centres_only(monkeypatch):
+    g = offline(monkeypatch)
+    assert g.cities[gazetteer.city_id("490", "PUNE")] == (18.51, 73.86)
+    assert g.districts["490"] == (round((18.52 + 18.50 + 18.15) / 3, 6), round((73.84 + 73.88 + 74.58) / 3, 6))
+
+
+def test_unresolvable_address_falls_back_to_city_or_district_centroid(monkeypatch):
+    g = offline(monkeypatch)
+    place = locate("Flat 9, Nowhere Lane, Kothrud", {}, "Maharashtra", "Pune", "Pune")
+    assert place == gazetteer.Place(g.cities[gazetteer.city_id("490", "PUNE")], gazetteer.PRECISION_CITY)
+    # A city without centroid of its own gets the district's.
+    place = locate("Flat 9, Nowhere Lane", {}, "Maharashtra", "Pune", "Bhor")
+    assert place == gazetteer.Place(g.districts["490"], gazetteer.PRECISION_DISTRICT)
+    # The state centroid alone is never used.
+    assert locate("Flat 9, Nowhere Lane", {}, "Maharashtra") is None
+
+    centres = [Centre(5, "E", "5 Unknown Road", "", "")]
+    geocode_centres(centres, "BARAMATI", "PUNE", "MAHARASHTRA", {}, rate=0)
+    assert (centres[0].coords, centres[0].precision) == ((18.15, 74.58), gazetteer.PRECISION_CITY)
@@ -0,0 +1,57 @@
+import random
+
+from models import Centre
+from spatial import CentreIndex
+from utils import find_nearest_centres, haversine
+
+
+def brute_within(user, centres, radius):
+    found = [(c, haversine(user, c.coords)) for c in centres]
+    return sorted([(c, d) for c, d in found if d <= radius], key=lambda x: x[1])
+
+
+def check(index, live, rng):
+    assert len(index) == len(live)
+    for _ in range(20):
+        user = (rng.uniform(8, 35), rng.uniform(69, 96))
+        k = rng.randint(1, 8)
+        got = index.nearest(user, k)
+        want = find_nearest_centres(user, live, top_k=k, vectorize=False)
+        assert [c for c, _ in got] == [c for c, _ in want]
+        assert [d for _, d in got] == [d for _, d in want]
+        radius = rng.uniform(0, 800)
+        assert index.within(user, radius) == brute_within(user, live, radius)
+
+
+def test_matches_brute_force_with_duplicates_and_removals():
+    # A few hot spots so many centres share exact coordinates (leaves that
+    # cannot be split by value), interleaved with random removals.
+    rng = random.Random(0)
+    spots = [(rng.uniform(8, 35), rng.uniform(69, 96)) for _ in range(5)]
+    index = CentreIndex()
+    live = []
+    for n in range(600):
+        coords = rng.choice(spots) if rng.random() < 0.6 else (rng.uniform(8, 35), rng.uniform(69, 96))
+        centre = Centre(n, f"Centre {n}", "", "", "", coords=coords)
+        assert index.insert(centre)
+        live.append(centre)
+        if live and rng.random() < 0.3:
+            gone = live.pop(rng.randrange(len(live)))
+            assert index.remove(gone)
+            assert not index.remove(gone)
+        if n % 100 == 99:
+            check(index, live, rng)
+    check(index, live, rng)
+
+
+def test_removing_every_duplicate_empties_the_index():
+    same = (19.07, 72.88)
+    for other in ((28.6, 77.2), (8.5, 70.0)):
+        centres = [Centre(n, f"Centre {n}", "", "", "", coords=same) for n in range(16)]
+        centres.append(Centre(16, "Other", "", "", "", coords=other))
+        index = CentreIndex(centres)
+        for c in centres:
+            assert index.remove(c)
+        assert len(index) == 0
+        assert index.nearest(same, 3) == []
+        assert index.within(same, 10_000) == []
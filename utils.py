@@ -1,29 +1,63 @@
 import os
-import pickle
-from geocode import geocode_address
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import gazetteer
+import instrument
+from address import canonical_key
+from geocode import lookup, get_backend
+from geocode_cache import (
+    GeocodeCache,
+    GEOCODE_CACHE_DB,
+    STATUS_OK,
+    STATUS_NOT_FOUND,
+    STATUS_ERROR,
+    migrate_pickle_cache,
+)
 from math import radians, sin, cos, sqrt, asin
+from models import CentreTable
 
 GEOCODE_CACHE_FILE = "geocode_cache.pkl"
+GEOCODE_WORKERS = int(os.getenv("GEOCODE_WORKERS", "8"))
+GEOCODE_RATE = float(os.getenv("GEOCODE_RATE", "10"))  # requests per second
+VECTORIZE_MIN = 512
+# Approximate centroids from the offline gazetteer for places the geocoder
+# could not resolve; set GEOCODE_FALLBACK=0 to leave them without coords.
+GEOCODE_FALLBACK = os.getenv("GEOCODE_FALLBACK", "1") != "0"
+
+_MISSING = object()
+_COMMA_SPACE = re.compile(r",\s+")
+_SPACES = re.compile(r"\s{2,}")
 
 def simplify_address(addr: str) -> str:
-    import re
     if not addr:
         return ""
     s = addr.strip()
     s = s.replace("NEAR", "")
-    s = re.sub(r",\s+", ", ", s)
-    s = re.sub(r"\s{2,}", " ", s)
+    s = _COMMA_SPACE.sub(", ", s)
+    s = _SPACES.sub(" ", s)
     return s.strip()
 
+def geocode_cache_path(backend=None):
+    # Each geocoder backend gets its own cache file, so fake or approximate
+    # results never leak into the Google cache.
+    name = getattr(backend or get_backend(), "name", "custom")
+    return GEOCODE_CACHE_DB if name == "google" else GEOCODE_CACHE_DB.replace(".sqlite", f".{name}.sqlite")
+
 def load_geocode_cache():
-    if os.path.exists(GEOCODE_CACHE_FILE):
-        with open(GEOCODE_CACHE_FILE, "rb") as f:
-            return pickle.load(f)
-    return {}
+    path = geocode_cache_path()
+    cache = GeocodeCache(path)
+    if path == GEOCODE_CACHE_DB:
+        migrate_pickle_cache(cache, GEOCODE_CACHE_FILE)
+    cache.prune()
+    return cache
 
 def save_geocode_cache(cache):
-    with open(GEOCODE_CACHE_FILE, "wb") as f:
-        pickle.dump(cache, f)
+    # GeocodeCache persists every entry as it is written; this only remains
+    # for callers that still hand in a plain dict.
+    if isinstance(cache, dict):
+        GeocodeCache(GEOCODE_CACHE_DB).update(cache)
 
 def haversine(coord1, coord2):
     R = 6371.0
@@ -37,23 +71,290 @@ def haversine(coord1, coord2):
 def normalize(s: str):
     return s.strip().lower()
 
-def geocode_with_cache(address: str, cache: dict):
-    key = normalize(address)
-    if key in cache:
-        return cache[key]
-    coords = None
+def _resolve(geocoder, address):
+    # Any exception from the geocoder counts as transient so the entry
+    # expires on the short error TTL instead of sticking as "not found".
     try:
-        coords = geocode_address(address)
+        coords = geocoder(address)
     except Exception as e:
-        print(f"Geocoding error for '{address}': {e}")
-    cache[key] = coords
+        instrument.event("geocode_error", f"Geocoding error for '{address}': {e}", level="warning", address=address)
+        return None, STATUS_ERROR
+    return coords, STATUS_OK if coords else STATUS_NOT_FOUND
+
+def _store(cache, key, coords, status):
+    if hasattr(cache, "put"):
+        cache.put(key, coords, status)
+    elif status != STATUS_ERROR:
+        cache[key] = coords
+
+def _cached(cache, key, address):
+    # Entries written before canonical keys were stored under
+    # normalize(address); those are found once and copied to the new key
+    # with their status and age. The legacy probe is not counted as a
+    # second miss.
+    cached = cache.get(key, _MISSING)
+    if cached is _MISSING:
+        legacy = normalize(address)
+        if legacy != key and hasattr(cache, "entry"):
+            entry = cache.entry(legacy, count=False)
+            if entry is not None:
+                cache.put(key, entry.coords, entry.status, entry.updated_at)
+                cached = entry.coords
+        elif legacy != key:
+            cached = cache.get(legacy, _MISSING)
+            if cached is not _MISSING:
+                cache[key] = cached
+    instrument.count("geocode_cache", result="miss" if cached is _MISSING else "hit")
+    return cached
+
+def geocode_with_cache(address: str, cache: dict, geocoder=None):
+    key = canonical_key(address)
+    if not key:
+        return None
+    cached = _cached(cache, key, address)
+    if cached is not _MISSING:
+        return cached
+    coords, status = _resolve(geocoder or lookup, address)
+    _store(cache, key, coords, status)
     return coords
 
-def find_nearest_centres(user_coords, centres, top_k=1):
-    results = []
-    for c in centres:
-        if hasattr(c, "coords") and c.coords:
-            d = haversine(user_coords, c.coords)
-            results.append((c, d))
-    results.sort(key=lambda x: x[1])
-    return results[:top_k]
+class TokenBucket:
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+def geocode_many(addresses, cache, workers=GEOCODE_WORKERS, rate=GEOCODE_RATE, geocoder=None,
+                 progress=None, cancel=None):
+    # Resolves cache misses concurrently; addresses with the same canonical
+    # key (address.canonical_key) are looked up once. Results come back in
+    # the same order as `addresses`.
+    # `progress(done, total, key, coords)` is called once per unique address
+    # (cached ones first); setting the `cancel` Event stops outstanding
+    # lookups, leaving their results as None. Lookups already running when
+    # it is set are still cached as they finish.
+    geocoder = geocoder or lookup
+    keys = [canonical_key(a) or None for a in addresses]
+    resolved = {}
+    pending = {}
+    for key, addr in zip(keys, addresses):
+        if not key or key in resolved or key in pending:
+            continue
+        cached = _cached(cache, key, addr)
+        if cached is _MISSING:
+            pending[key] = addr
+        else:
+            resolved[key] = cached
+
+    total = len(resolved) + len(pending)
+    if progress:
+        for done, (key, coords) in enumerate(list(resolved.items()), start=1):
+            progress(done, total, key, coords)
+
+    if pending:
+        bucket = TokenBucket(rate) if rate else None
+
+        def resolve(addr):
+            if cancel is not None and cancel.is_set():
+                return None, None
+            if bucket:
+                bucket.acquire()
+            return _resolve(geocoder, addr)
+
+        def store(key):
+            # A done-callback rather than the loop below, which stops
+            # waiting once cancelled.
+            def done(future):
+                if not future.cancelled() and future.exception() is None:
+                    coords, status = future.result()
+                    if status is not None:
+                        _store(cache, key, coords, status)
+            return done
+
+        pool = ThreadPoolExecutor(max_workers=max(1, workers))
+        try:
+            futures = {}
+            for key, addr in pending.items():
+                future = pool.submit(resolve, addr)
+                future.add_done_callback(store(key))
+                futures[future] = key
+            for future in as_completed(futures):
+                key = futures[future]
+                coords, status = future.result()
+                if status is None:
+                    continue
+                resolved[key] = coords
+                if progress:
+                    progress(len(resolved), total, key, coords)
+                if cancel is not None and cancel.is_set():
+                    break
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    return [resolved.get(key) if key else None for key in keys]
+
+def centre_address(centre, city, district_name, state_name):
+    addr = getattr(centre, "address", None)
+    if not addr or not addr.strip():
+        return None
+    clean = simplify_address(addr)
+    return f"{clean}, {city}, {district_name}, {state_name}, India"
+
+def locate(address, cache, state_name=None, district_name=None, city=None, fallback=GEOCODE_FALLBACK):
+    # Geocodes a user's address, falling back to the gazetteer (the address
+    # text, then the given place names). Returns a gazetteer.Place, or None
+    # when nothing finer than a state centroid is known.
+    coords = geocode_with_cache(address, cache)
+    if coords:
+        return gazetteer.Place(coords, gazetteer.PRECISION_EXACT)
+    if not fallback:
+        return None
+    place = gazetteer.default().locate(address)
+    if not gazetteer.rankable(place) and state_name:
+        place = gazetteer.default().resolve_names(state_name, district_name, city)
+    return place if gazetteer.rankable(place) else None
+
+def geocode_centres(centres, city, district_name, state_name, cache, progress=None, fallback=GEOCODE_FALLBACK,
+                    **kwargs):
+    # Centres that already carry geocoded coordinates (e.g. from a snapshot)
+    # are kept. Coordinates are assigned as each lookup lands, so
+    # `progress(done, total)` callers can rank the centres resolved so far.
+    # With `fallback`, centres the geocoder missed get the city's or
+    # district's gazetteer centroid (never a state's; see
+    # gazetteer.RANKABLE). Centres left at a centroid are looked up again on
+    # the next call, which the geocode cache answers until a failed lookup's
+    # error entry expires.
+    todo = [c for c in centres if not getattr(c, "coords", None) or gazetteer.approximate(c)]
+    addresses = [centre_address(c, city, district_name, state_name) for c in todo]
+    by_key = {}
+    for c, addr in zip(todo, addresses):
+        if addr:
+            by_key.setdefault(canonical_key(addr), []).append(c)
+
+    def on_result(done, total, key, coords):
+        # Misses keep whatever they had, so readers sharing these objects
+        # never see a centroid flip to None and back.
+        if coords:
+            for c in by_key.get(key, ()):
+                c.coords, c.precision = coords, gazetteer.PRECISION_EXACT
+        if progress:
+            progress(done, total)
+
+    results = geocode_many(addresses, cache, progress=on_result, **kwargs)
+    for c, coords in zip(todo, results):
+        if coords:
+            c.coords, c.precision = coords, gazetteer.PRECISION_EXACT
+    cancel = kwargs.get("cancel")
+    missed = [c for c in todo if not c.coords or gazetteer.approximate(c)]
+    if missed and not (cancel is not None and cancel.is_set()):
+        place = gazetteer.default().resolve_names(state_name, district_name, city) if fallback else None
+        for c in missed:
+            if gazetteer.rankable(place):
+                c.coords, c.precision = place
+            elif c.precision not in gazetteer.RANKABLE:
+                c.coords, c.precision = None, None
+    return sum(1 for c in centres if getattr(c, "coords", None))
+
+class GeocodedCentres:
+    # A fetched city's centres with their coordinates resolved once, in the
+    # background, right after the fetch. Nearest-centre queries then only
+    # cost a user geocode plus the ranking.
+
+    def __init__(self, centres, city, district_name, state_name, cache):
+        self.centres = centres
+        self.city = city
+        self.district_name = district_name
+        self.state_name = state_name
+        self.cache = cache
+        self.done = 0
+        self.total = len(centres)
+        self.valid = 0
+        self.ready = threading.Event()
+        self.cancel_event = threading.Event()
+        self.thread = None
+        self.arrays = _MISSING
+
+    def _progress(self, done, total):
+        self.done, self.total = done, total
+
+    def _run(self, kwargs):
+        try:
+            self.valid = geocode_centres(
+                self.centres, self.city, self.district_name, self.state_name, self.cache,
+                progress=self._progress, cancel=self.cancel_event, **kwargs
+            )
+        finally:
+            self.ready.set()
+
+    def start(self, **kwargs):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._run, args=(kwargs,), daemon=True)
+            self.thread.start()
+        return self
+
+    def wait(self, timeout=None):
+        return self.ready.wait(timeout)
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    def nearest(self, user_coords, top_k=3):
+        # Coordinates change until the pass is over; after that the ranking
+        # arrays are built once and reused.
+        if not self.ready.is_set():
+            return find_nearest_centres(user_coords, self.centres, top_k=top_k)
+        if self.arrays is _MISSING:
+            self.arrays = centre_arrays(self.centres)
+        return find_nearest_centres(user_coords, self.centres, top_k=top_k, arrays=self.arrays)
+
+def centre_arrays(centres):
+    # The distances.CentreArrays find_nearest_centres would build for
+    # `centres`, or None when they take the scalar path. For holders that
+    # rank the same centres many times: keep it until coordinates change.
+    if len(centres) < VECTORIZE_MIN:
+        return None
+    import distances
+    if not distances.available():
+        return None
+    if isinstance(centres, CentreTable):
+        return distances.CentreArrays.from_table(centres)
+    return distances.CentreArrays(centres)
+
+def find_nearest_centres(user_coords, centres, top_k=1, vectorize=None, arrays=None):
+    # Large lists go through the NumPy path when it is installed; the
+    # scalar loop below is the reference implementation and the fallback.
+    # `arrays` is a centre_arrays(centres) kept by the caller.
+    if arrays is not None:
+        with instrument.timer("rank", path="numpy"):
+            return arrays.nearest(user_coords, top_k)
+    if vectorize is None:
+        vectorize = len(centres) >= VECTORIZE_MIN
+    if vectorize:
+        import distances
+        if distances.available():
+            with instrument.timer("rank", path="numpy"):
+                if isinstance(centres, CentreTable):
+                    return distances.CentreArrays.from_table(centres).nearest(user_coords, top_k)
+                return distances.CentreArrays(centres).nearest(user_coords, top_k)
+    with instrument.timer("rank", path="scalar"):
+        results = []
+        for c in centres:
+            if hasattr(c, "coords") and c.coords:
+                d = haversine(user_coords, c.coords)
+                results.append((c, d))
+        results.sort(key=lambda x: x[1])
+        return results[:top_k]